@@ -0,0 +1,106 @@
+# benchmarks/compact_vectors_benchmark.py
+"""
+Compares the compact int8 vector index (RAG_COMPACT_COLLECTIONS) against a plain Chroma
+collection on a synthetic clustered corpus: recall@k against exact search, query latency
+and memory.
+
+Usage:
+    python benchmarks/compact_vectors_benchmark.py --docs 50000 --dim 384 --queries 200 --k 10
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "ava"))
+import rag_server  # noqa: E402
+import chromadb  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _rss_bytes() -> int:
+    return psutil.Process().memory_info().rss if psutil else 0
+
+
+def _make_corpus(docs: int, dim: int, queries: int, seed: int):
+    """Gaussian clusters, roughly how code-example embeddings bunch up by topic."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, docs // 200), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=docs)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(docs, dim)).astype(np.float32)
+    query_labels = rng.integers(0, len(centers), size=queries)
+    query_vectors = centers[query_labels] + 0.35 * rng.normal(size=(queries, dim)).astype(np.float32)
+    return vectors, query_vectors
+
+
+def _exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> list:
+    sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+    results = []
+    for query in queries:
+        distances = sq_norms - 2 * vectors @ query
+        top = np.argpartition(distances, k - 1)[:k]
+        results.append({f"d{i}" for i in top})
+    return results
+
+
+def _summarize(name: str, latencies: list, recalls: list, memory_bytes: int, rss_delta: int):
+    latencies_ms = np.array(latencies) * 1000
+    rss = f"{rss_delta / 2 ** 20:8.1f} MiB" if psutil else "   (install psutil)"
+    print(f"{name:<10} recall@k={np.mean(recalls):.4f}  p50={np.percentile(latencies_ms, 50):7.2f}ms  "
+          f"p95={np.percentile(latencies_ms, 95):7.2f}ms  vectors={memory_bytes / 2 ** 20:8.1f} MiB  "
+          f"rss_delta={rss}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    vectors, queries = _make_corpus(args.docs, args.dim, args.queries, args.seed)
+    ids = [f"d{i}" for i in range(args.docs)]
+    truth = _exact_top_k(vectors, queries, args.k)
+    print(f"Corpus: {args.docs} vectors x {args.dim} dims, {args.queries} queries, k={args.k}, "
+          f"rerank factor={rag_server.COMPACT_RERANK_FACTOR}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rss_before = _rss_bytes()
+        client = chromadb.PersistentClient(path=str(Path(tmp) / "chroma"))
+        collection = client.get_or_create_collection(name="benchmark")
+        for start in range(0, args.docs, 4096):
+            collection.add(ids=ids[start:start + 4096], embeddings=vectors[start:start + 4096].tolist(),
+                           documents=[""] * len(ids[start:start + 4096]))
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = collection.query(query_embeddings=[query.tolist()], n_results=args.k, include=[])['ids'][0]
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(expected & set(found)) / args.k)
+        _summarize("chroma", latencies, recalls, vectors.nbytes, _rss_bytes() - rss_before)
+
+        rss_before = _rss_bytes()
+        compact = rag_server.CompactVectorIndex(Path(tmp) / "compact", args.dim)
+        for start in range(0, args.docs, 4096):
+            compact.add(ids[start:start + 4096], vectors[start:start + 4096])
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = [doc_id for doc_id, _ in compact.search(query, args.k)]
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(expected & set(found)) / args.k)
+        _summarize("compact", latencies, recalls, compact.stats()["resident_bytes"], _rss_bytes() - rss_before)
+        compact.close()
+
+
+if __name__ == "__main__":
+    main()
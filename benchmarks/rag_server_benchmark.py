@@ -0,0 +1,242 @@
+# benchmarks/rag_server_benchmark.py
+"""
+End-to-end benchmark for rag_server.py. Runs the FastAPI app in-process through the ASGI
+test client (no network, no separate server), ingests a synthetic corpus of Python modules
+and Markdown docs with planted answers, then reports:
+
+  - startup time until the server reports ready (model load, warm-up)
+  - ingest throughput (files/s, chunks/s)
+  - query latency p50/p95/p99 per query mode
+  - resident memory before/after ingestion
+  - recall@k: how often the file holding a planted answer is among the hits
+
+Usage:
+    python benchmarks/rag_server_benchmark.py --files 500 --queries 100
+    python benchmarks/rag_server_benchmark.py --chunk-size 600 --json results.json
+
+The embedding and query caches are disabled by default so repeated runs are comparable.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+from tests._loader import load_module  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+WORDS = ("data value item node buffer cache record entry index table queue stream packet frame event handler "
+         "config option state result error message request response client server session token window layout "
+         "widget render player enemy score level world vector matrix sprite sound asset loader parser writer").split()
+# Made-up terms that appear only in the planted answers, so recall is unambiguous.
+SYLLABLES = "zor blax quin thar vel mop drax lum pre ski wob nur gal fen tik rho".split()
+
+
+def _rss_mib() -> float:
+    return psutil.Process().memory_info().rss / 2 ** 20 if psutil else float("nan")
+
+
+def _percentiles(latencies: list) -> dict:
+    values = np.array(latencies) * 1000
+    return {f"p{p}": float(np.percentile(values, p)) for p in (50, 95, 99)} if len(values) else {}
+
+
+def _unique_term(rng: random.Random, used: set) -> str:
+    while True:
+        term = "".join(rng.choice(SYLLABLES) for _ in range(3))
+        if term not in used:
+            used.add(term)
+            return term
+
+
+def _python_module(rng: random.Random, functions: int, planted: tuple = None) -> str:
+    lines = ["import os", "import json", ""]
+    slots = list(range(functions))
+    plant_at = rng.choice(slots) if planted else None
+    for i in slots:
+        if i == plant_at:
+            term, topic = planted
+            lines += [f"def compute_{term}_{topic}(values):",
+                      f'    """Computes the {term} {topic} used when rebalancing the {topic} table."""',
+                      f"    return sum(values) * len('{term}')", ""]
+            continue
+        a, b, c = rng.sample(WORDS, 3)
+        lines += [f"def {a}_{b}_{i}({c}):",
+                  f'    """Returns the {b} of the {c} {a}."""',
+                  f"    {a} = {c}.get('{b}')",
+                  f"    if {a} is None:",
+                  f"        return []",
+                  f"    return [{b} for {b} in {a} if {b}]", ""]
+        if rng.random() < 0.3:
+            cls = f"{a.title()}{b.title()}{i}"
+            lines += [f"class {cls}:", f"    def __init__(self, {c}):", f"        self.{c} = {c}", "",
+                      f"    def {c}_{a}(self):", f"        return self.{c}", ""]
+    return "\n".join(lines)
+
+
+def _markdown_doc(rng: random.Random, sections: int, planted: tuple = None) -> str:
+    lines = [f"# {rng.choice(WORDS).title()} guide", ""]
+    plant_at = rng.randrange(sections) if planted else None
+    for i in range(sections):
+        heading = " ".join(rng.sample(WORDS, 2)).title()
+        lines += [f"## {heading}", ""]
+        if i == plant_at:
+            term, topic = planted
+            lines += [f"The {term} {topic} must be refreshed before every {topic} export; "
+                      f"skipping the {term} step corrupts the output.", ""]
+        for _ in range(rng.randint(2, 5)):
+            lines.append(" ".join(rng.choices(WORDS, k=rng.randint(8, 16))).capitalize() + ".")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def build_corpus(root: Path, files: int, planted_count: int, seed: int) -> list:
+    """Writes the corpus under `root` and returns [(query_text, planted_file_path)]."""
+    rng = random.Random(seed)
+    used_terms = set()
+    planted_files = set(rng.sample(range(files), min(planted_count, files)))
+    questions = []
+    for i in range(files):
+        planted = None
+        if i in planted_files:
+            planted = (_unique_term(rng, used_terms), rng.choice(WORDS))
+        if i % 4 == 3:
+            path = root / "docs" / f"guide_{i}.md"
+            content = _markdown_doc(rng, rng.randint(3, 8), planted)
+            question = f"when should the {planted[0]} {planted[1]} be refreshed" if planted else None
+        else:
+            path = root / "src" / f"package_{i % 10}" / f"module_{i}.py"
+            content = _python_module(rng, rng.randint(4, 14), planted)
+            question = f"how do I compute the {planted[0]} {planted[1]}" if planted else None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        if question:
+            questions.append((question, str(path)))
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=300, help="Number of synthetic files in the corpus.")
+    parser.add_argument("--queries", type=int, default=50, help="Number of planted answers to query for.")
+    parser.add_argument("--n-results", type=int, default=5, help="k for recall@k.")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--batch-size", type=int, default=128, help="Chunks per /add request.")
+    parser.add_argument("--modes", default="vector,lexical,hybrid", help="Comma-separated /query modes.")
+    parser.add_argument("--model", default=None, help="Embedding model name (defaults to the server's).")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the embedding and query caches on.")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--keep", action="store_true", help="Keep the generated corpus and databases.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="rag_bench_"))
+    os.environ.setdefault("RAG_EMBEDDING_CACHE_DIR", str(work_dir / "embedding_cache"))
+    if not args.with_caches:
+        os.environ["RAG_EMBEDDING_CACHE_SIZE"] = "0"
+        os.environ["RAG_QUERY_CACHE_SIZE"] = "0"
+    os.environ.pop("GLOBAL_RAG_DB_PATH", None)
+
+    sys.path.insert(0, str(REPO_ROOT / "src" / "ava"))
+    import rag_server
+    from fastapi.testclient import TestClient
+    chunking = load_module("bench_chunking_service", "src/ava/services/chunking_service.py")
+    if args.model:
+        rag_server.MODEL_NAME = args.model
+
+    project_root = work_dir / "project"
+    questions = build_corpus(project_root, args.files, args.queries, args.seed)
+    corpus_files = sorted(p for p in project_root.rglob("*") if p.is_file())
+    results = {"files": len(corpus_files), "chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap,
+               "model": rag_server.MODEL_NAME}
+    print(f"Corpus: {len(corpus_files)} files, {len(questions)} planted answers, work dir {work_dir}")
+
+    rss_start = _rss_mib()
+    with TestClient(rag_server.rag_app) as client:
+        readiness = client.get("/wait_ready", params={"timeout": 300}).json()
+        if not readiness["ready"]:
+            sys.exit(f"RAG server did not become ready: {readiness}")
+        results["startup"] = readiness["timings"]
+        rss_model = _rss_mib()
+        client.post("/set_collection", json={"project_path": str(project_root)}).raise_for_status()
+
+        chunker = chunking.ChunkingService(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        started = time.perf_counter()
+        chunks = []
+        with contextlib.redirect_stdout(io.StringIO()):  # ChunkingService logs every file.
+            for path in corpus_files:
+                chunks.extend(chunker.chunk_document(path.read_text(encoding="utf-8"), str(path)))
+        chunk_seconds = time.perf_counter() - started
+        for start in range(0, len(chunks), args.batch_size):
+            response = client.post("/add", json={"documents": chunks[start:start + args.batch_size],
+                                                 "target_collection": "project"})
+            response.raise_for_status()
+        ingest_seconds = time.perf_counter() - started
+        rss_ingested = _rss_mib()
+        results["ingest"] = {
+            "chunks": len(chunks),
+            "seconds": ingest_seconds,
+            "chunking_seconds": chunk_seconds,
+            "files_per_sec": len(corpus_files) / ingest_seconds,
+            "chunks_per_sec": len(chunks) / ingest_seconds,
+        }
+
+        results["queries"] = {}
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            latencies, found = [], 0
+            # Warm up lazily built per-mode indexes so they don't skew the first latency.
+            client.post("/query", json={"query_text": "warm up", "n_results": 1, "mode": mode}).raise_for_status()
+            for question, expected_path in questions:
+                started = time.perf_counter()
+                response = client.post("/query", json={"query_text": question, "n_results": args.n_results,
+                                                       "target_collection": "project", "mode": mode})
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+                hit_paths = {Path(hit["source"]).name for hit in response.json()["hits"]}
+                found += Path(expected_path).name in hit_paths
+            results["queries"][mode] = {"recall_at_k": found / max(1, len(questions)), **_percentiles(latencies)}
+        results["memory_mib"] = {"start": rss_start, "after_model_load": rss_model, "after_ingest": rss_ingested,
+                                 "end": _rss_mib()}
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    startup = results["startup"]
+    print(f"\nStartup: ready in {startup['total_seconds']:.2f}s (model {startup['model_load_seconds']:.2f}s, "
+          f"warm-up {startup['warmup_seconds']:.2f}s)")
+    ingest = results["ingest"]
+    print(f"\nIngest: {ingest['chunks']} chunks in {ingest['seconds']:.2f}s "
+          f"({ingest['files_per_sec']:.1f} files/s, {ingest['chunks_per_sec']:.1f} chunks/s; "
+          f"chunking {ingest['chunking_seconds']:.2f}s)")
+    print(f"\n{'mode':<8} {'recall@' + str(args.n_results):>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for mode, stats in results["queries"].items():
+        print(f"{mode:<8} {stats['recall_at_k']:>9.3f} {stats.get('p50', 0):>9.2f} {stats.get('p95', 0):>9.2f} "
+              f"{stats.get('p99', 0):>9.2f}")
+    memory = results["memory_mib"]
+    if psutil:
+        print(f"\nRSS MiB: start {memory['start']:.0f}, model loaded {memory['after_model_load']:.0f}, "
+              f"after ingest {memory['after_ingest']:.0f}, end {memory['end']:.0f}")
+    else:
+        print("\nInstall psutil to report resident memory.")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
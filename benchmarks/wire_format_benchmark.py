@@ -0,0 +1,128 @@
+# benchmarks/wire_format_benchmark.py
+"""
+Measures the serialization overhead of the rag_server wire formats for large /add batches
+and /query responses: JSON (what every client sent before), msgpack with vectors as float
+lists, and msgpack with vectors as raw float32 buffers. Uses the real client encoder
+(RAGService) and server decoder (rag_server._parse_payload), without any network.
+
+Usage:
+    python benchmarks/wire_format_benchmark.py --chunks 10000 --dim 384
+    python benchmarks/wire_format_benchmark.py --chunks 10000 --no-embeddings
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "src" / "ava"))
+sys.path.insert(0, str(REPO_ROOT))
+import rag_server  # noqa: E402
+from tests._loader import load_module  # noqa: E402
+
+if rag_server.msgpack is None:
+    sys.exit("Install msgpack to compare wire formats: pip install msgpack")
+msgpack = rag_server.msgpack
+
+WORDS = ("def return self value index buffer cache record entry table queue stream packet frame event handler "
+         "config option state result error message request response client server session token").split()
+
+
+def _timed(function, repeats: int):
+    """Returns (median seconds, last result)."""
+    timings, result = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def _make_chunks(count: int, chars: int, seed: int) -> list:
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        text = " ".join(rng.choices(WORDS, k=chars // 6))[:chars]
+        rel_path = f"pkg_{i % 50}/module_{i % 400}.py"
+        chunks.append({"id": f"{rel_path}#{i:016x}", "content": text,
+                       "metadata": {"source": f"module_{i % 400}.py", "full_path": f"/project/{rel_path}",
+                                    "rel_path": rel_path, "directory": f"pkg_{i % 50}",
+                                    "top_directory": f"pkg_{i % 50}",
+                                    "language": "python", "kind": "function", "symbol": f"function_{i}",
+                                    "start_char": i * 10, "end_char": i * 10 + len(text), "start_line": i,
+                                    "end_line": i + 20, "imports": "os,sys,json"}})
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10000, help="Documents in the /add batch.")
+    parser.add_argument("--chars", type=int, default=800, help="Characters of text per chunk.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimensions.")
+    parser.add_argument("--no-embeddings", action="store_true",
+                        help="Send text only, as the desktop client does today.")
+    parser.add_argument("--hits", type=int, default=20, help="Hits in the /query response.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rag_service = load_module("bench_rag_service", "src/ava/services/rag_service.py")
+    chunks = _make_chunks(args.chunks, args.chars, args.seed)
+    embeddings = None if args.no_embeddings else \
+        np.random.default_rng(args.seed).normal(size=(args.chunks, args.dim)).astype(np.float32)
+    print(f"/add batch: {args.chunks} chunks x {args.chars} chars"
+          + ("" if embeddings is None else f", {args.dim}-dim float32 embeddings"))
+
+    def add_payload(vectors):
+        payload = {"documents": chunks, "target_collection": "project"}
+        if vectors is not None:
+            payload["embeddings"] = vectors
+        return payload
+
+    formats = {
+        "json": (lambda: json.dumps(add_payload(None if embeddings is None else embeddings.tolist())).encode(),
+                 "application/json"),
+        "msgpack/lists": (lambda: msgpack.packb(add_payload(None if embeddings is None else embeddings.tolist()),
+                                                use_bin_type=True), rag_service.MSGPACK_MEDIA_TYPE),
+    }
+    if embeddings is not None:
+        formats["msgpack/float32"] = (lambda: msgpack.packb(add_payload(rag_service.pack_float32(embeddings)),
+                                                            use_bin_type=True), rag_service.MSGPACK_MEDIA_TYPE)
+
+    def decode(body: bytes, content_type: str):
+        request = rag_server._parse_payload(body, content_type, rag_server.AddRequest)
+        if request.embeddings is not None:
+            rag_server._unpack_matrix(request.embeddings, args.dim)
+        return request
+
+    print(f"\n{'format':<16} {'size MiB':>9} {'encode ms':>10} {'decode ms':>10} {'total ms':>9}")
+    for name, (encode, content_type) in formats.items():
+        encode_seconds, body = _timed(encode, args.repeats)
+        decode_seconds, _ = _timed(lambda: decode(body, content_type), args.repeats)
+        print(f"{name:<16} {len(body) / 2 ** 20:>9.2f} {encode_seconds * 1000:>10.1f} {decode_seconds * 1000:>10.1f} "
+              f"{(encode_seconds + decode_seconds) * 1000:>9.1f}")
+
+    hits = [rag_server.QueryHit(id=chunk["id"], source=chunk["metadata"]["source"], distance=0.5, text=chunk["content"],
+                                char_start=chunk["metadata"]["start_char"], char_end=chunk["metadata"]["end_char"])
+            for chunk in chunks[:args.hits]]
+    response = rag_server.QueryResponse(context=rag_server._format_context(hits, "project"),
+                                        source_collection="project", hits=hits)
+    print(f"\n/query response: {args.hits} hits")
+    print(f"{'format':<16} {'size KiB':>9} {'encode ms':>10} {'decode ms':>10} {'total ms':>9}")
+    for name, encode, decode_body in (
+            ("json", lambda: response.model_dump_json().encode(), json.loads),
+            ("msgpack", lambda: msgpack.packb(response.model_dump(), use_bin_type=True),
+             lambda body: msgpack.unpackb(body, raw=False))):
+        encode_seconds, body = _timed(encode, args.repeats * 20)
+        decode_seconds, _ = _timed(lambda: decode_body(body), args.repeats * 20)
+        print(f"{name:<16} {len(body) / 1024:>9.1f} {encode_seconds * 1000:>10.3f} {decode_seconds * 1000:>10.3f} "
+              f"{(encode_seconds + decode_seconds) * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
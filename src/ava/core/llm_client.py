@@ -3,6 +3,8 @@ import os
 import json
 import base64
 import sys
+import time
+from collections import deque
 from typing import Dict, Optional, Any, List
 
 import aiohttp
@@ -13,9 +15,21 @@ class LLMClient:
     """
     A lightweight client that communicates with the local LLM and RAG server processes.
     It does NOT load any heavy AI libraries itself.
+
+    All requests go through one keep-alive session, so back-to-back coder and reviewer
+    calls reuse a connection to the LLM server instead of opening a new one each time.
     """
+    MAX_CONNECTIONS = 16
+    KEEPALIVE_SECONDS = 120
+    RECENT_CALLS = 200
+    CHARS_PER_TOKEN = 4
+
     def __init__(self, project_root: Path, llm_server_url="http://127.0.0.1:8002"):
         self.llm_server_url = llm_server_url
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.connection_stats = {"requests": 0, "new_connections": 0}
+        # Client-side timings of recent stream_chat calls; the server keeps the full history at /metrics.
+        self.recent_calls: "deque[Dict[str, Any]]" = deque(maxlen=self.RECENT_CALLS)
         self.project_root = project_root
         self.config_dir = project_root / "ava" / "config"
         self.config_dir.mkdir(exist_ok=True, parents=True)
@@ -47,6 +61,31 @@ class LLMClient:
             if role not in self.role_temperatures:
                 self.role_temperatures[role] = default_temperatures.get(role, 0.7)
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared session, creating it lazily on the running event loop."""
+        if self._session is None or self._session.closed:
+            async def on_request_start(session, context, params):
+                self.connection_stats["requests"] += 1
+
+            async def on_connection_create_end(session, context, params):
+                self.connection_stats["new_connections"] += 1
+
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(on_request_start)
+            trace_config.on_connection_create_end.append(on_connection_create_end)
+            connector = aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS, keepalive_timeout=self.KEEPALIVE_SECONDS)
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+        return self._session
+
+    async def close(self):
+        """Closes the shared session."""
+        if self._session and not self._session.closed:
+            stats = self.connection_stats
+            print(f"[LLMClient] Closing session: {stats['requests']} requests over "
+                  f"{stats['new_connections']} connections.")
+            await self._session.close()
+        self._session = None
+
     def save_assignments(self):
         config_data = {
             "role_assignments": self.role_assignments,
@@ -58,17 +97,47 @@ class LLMClient:
     async def get_available_models(self) -> dict:
         """Fetches the list of available models from the LLM server."""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.llm_server_url}/get_available_models", timeout=5) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        print(f"[LLMClient] Error getting models from server: {response.status}")
-                        return {}
+            async with self._get_session().get(f"{self.llm_server_url}/get_available_models",
+                                               timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    print(f"[LLMClient] Error getting models from server: {response.status}")
+                    return {}
         except Exception as e:
             print(f"[LLMClient] Could not connect to LLM server to get models: {e}")
             return {}
 
+    async def get_metrics(self, role: Optional[str] = None, since_seconds: Optional[float] = None) -> dict:
+        """Fetches the per role and model call summary from the LLM server."""
+        params = {key: value for key, value in (("role", role), ("since_seconds", since_seconds)) if value}
+        try:
+            async with self._get_session().get(f"{self.llm_server_url}/metrics", params=params,
+                                               timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status == 200:
+                    return await response.json()
+                print(f"[LLMClient] Error getting metrics from server: {response.status}")
+        except Exception as e:
+            print(f"[LLMClient] Could not connect to LLM server to get metrics: {e}")
+        return {}
+
+    def _record_call(self, role: Optional[str], provider: str, model: str, started: float,
+                     first_chunk_at: Optional[float], completion_chars: int, error: Optional[str]):
+        total_seconds = time.perf_counter() - started
+        ttft_seconds = first_chunk_at - started if first_chunk_at is not None else None
+        completion_tokens = -(-completion_chars // self.CHARS_PER_TOKEN)
+        streaming_seconds = total_seconds - (ttft_seconds or 0.0)
+        call = {
+            "role": role or "unknown", "model": f"{provider}/{model}", "error": error,
+            "ttft_seconds": ttft_seconds, "total_seconds": total_seconds, "completion_tokens": completion_tokens,
+            "tokens_per_second": completion_tokens / streaming_seconds if streaming_seconds > 0 else None,
+        }
+        self.recent_calls.append(call)
+        first_token = f"{ttft_seconds:.2f}s" if ttft_seconds is not None else "n/a"
+        print(f"[LLMClient] {call['role']} call to {call['model']}: first token {first_token}, "
+              f"total {total_seconds:.2f}s, ~{completion_tokens} tokens"
+              + (f", error: {error}" if error else ""))
+
     def get_role_assignments(self) -> dict:
         return self.role_assignments.copy()
 
@@ -104,18 +173,31 @@ class LLMClient:
             "temperature": temperature,
             "image_b64": image_b64,
             "media_type": image_media_type,
-            "history": history or []
+            "history": history or [],
+            "role": role
         }
 
+        started = time.perf_counter()
+        first_chunk_at, completion_chars, error = None, 0, None
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.llm_server_url}/stream_chat", json=payload, timeout=300) as response:
-                    if response.status == 200:
-                        async for line in response.content:
-                            if line:
-                                yield line.decode('utf-8')
-                    else:
-                        error_text = await response.text()
-                        yield f"LLM_API_ERROR: Failed to stream from server. Status: {response.status}, Details: {error_text}"
+            async with self._get_session().post(f"{self.llm_server_url}/stream_chat", json=payload,
+                                                timeout=aiohttp.ClientTimeout(total=300)) as response:
+                if response.status == 200:
+                    async for line in response.content:
+                        if line:
+                            text = line.decode('utf-8')
+                            if first_chunk_at is None:
+                                first_chunk_at = time.perf_counter()
+                            completion_chars += len(text)
+                            if text.startswith("SERVER_ERROR:"):
+                                error = text.strip()
+                            yield text
+                else:
+                    error_text = await response.text()
+                    error = f"HTTP {response.status}"
+                    yield f"LLM_API_ERROR: Failed to stream from server. Status: {response.status}, Details: {error_text}"
         except Exception as e:
-            yield f"LLM_API_ERROR: Could not connect to LLM server. Is it running? Details: {e}"
\ No newline at end of file
+            error = str(e)
+            yield f"LLM_API_ERROR: Could not connect to LLM server. Is it running? Details: {e}"
+        finally:
+            self._record_call(role, provider, model, started, first_chunk_at, completion_chars, error)
\ No newline at end of file
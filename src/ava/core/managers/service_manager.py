@@ -208,6 +208,8 @@ class ServiceManager:
                     )
                 pid = self.rag_server_process.pid if self.rag_server_process else 'N/A'
                 self.log_to_event_bus("info", f"RAG Server process started with PID: {pid}")
+                if self.rag_manager:
+                    asyncio.create_task(self._report_rag_readiness())
             except Exception as e:
                 self.log_to_event_bus("error", f"Failed to launch RAG server: {e}\n{traceback.format_exc()}")
 
@@ -231,6 +233,21 @@ class ServiceManager:
             except Exception as e:
                 self.log_to_event_bus("error", f"Failed to launch LSP server: {e}\n{traceback.format_exc()}")
 
+    async def _report_rag_readiness(self):
+        """Waits for the RAG server to finish warming up and logs how long each phase took."""
+        rag_service = self.rag_manager.rag_service
+        if await rag_service.wait_until_ready(timeout=300.0):
+            timings = rag_service.readiness.get("timings") or {}
+            if timings.get("total_seconds") is not None:
+                self.log_to_event_bus("info", f"RAG Server ready in {timings['total_seconds']:.1f}s "
+                                              f"(model load {timings['model_load_seconds']:.1f}s, "
+                                              f"warm-up {timings['warmup_seconds']:.1f}s).")
+            else:
+                self.log_to_event_bus("info", "RAG Server ready.")
+        else:
+            error = rag_service.readiness.get("error")
+            self.log_to_event_bus("warning", f"RAG Server not ready: {error or 'timed out waiting for warm-up'}")
+
     def terminate_background_servers(self):
         """Terminates all managed background server processes."""
         self.log_to_event_bus("info", "[ServiceManager] Terminating background servers...")
@@ -259,6 +276,10 @@ class ServiceManager:
         self.log_to_event_bus("info", "[ServiceManager] Shutting down services...")
         if self.lsp_client_service:
             await self.lsp_client_service.shutdown()
+        if self.rag_manager:
+            await self.rag_manager.close()
+        if self.llm_client:
+            await self.llm_client.close()
         self.terminate_background_servers()
         if self.plugin_manager and hasattr(self.plugin_manager, 'shutdown'):
             try:
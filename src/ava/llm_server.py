@@ -3,7 +3,14 @@ import os
 import sys
 import base64
 import asyncio
+import hashlib
 import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from typing import Dict, Optional, Any, List
 from contextlib import asynccontextmanager
@@ -34,10 +41,36 @@ try:
     import aiohttp
 except ImportError:
     aiohttp = None
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    import h2  # noqa: F401  # Lets httpx negotiate HTTP/2 with the provider APIs.
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 # --- Configuration ---
 HOST = "127.0.0.1"
 PORT = 8002
+# Provider connection pool, opened once per server lifetime. The OpenAI-compatible and Anthropic
+# SDKs share one httpx client; Ollama requests share one aiohttp session.
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "120"))
+HTTP2_ENABLED = os.getenv("LLM_HTTP2", "1") != "0" and HTTP2_AVAILABLE
+# Opt-in cache of complete responses for low-temperature calls (coder, reviewer, architect re-runs).
+RESPONSE_CACHE_ENABLED = os.getenv("LLM_RESPONSE_CACHE", "0") == "1"
+_server_dir = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
+RESPONSE_CACHE_PATH = Path(os.getenv("LLM_RESPONSE_CACHE_PATH", str(_server_dir / "llm_response_cache.sqlite3")))
+RESPONSE_CACHE_MAX_MB = float(os.getenv("LLM_RESPONSE_CACHE_MAX_MB", "256"))
+# Calls above this temperature are sampled on purpose and never cached.
+RESPONSE_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_RESPONSE_CACHE_MAX_TEMPERATURE", "0.3"))
+# Per-call telemetry, appended as JSON lines to a rotating file and summarized at /metrics.
+METRICS_PATH = Path(os.getenv("LLM_METRICS_PATH", str(_server_dir / "llm_metrics.jsonl")))
+METRICS_MAX_MB = float(os.getenv("LLM_METRICS_MAX_MB", "5"))
+# Rough average used when a provider doesn't report token usage.
+CHARS_PER_TOKEN = 4
 
 
 # --- FastAPI Models ---
@@ -49,6 +82,294 @@ class StreamChatRequest(BaseModel):
     image_b64: Optional[str] = None
     media_type: Optional[str] = None
     history: Optional[List[Dict[str, Any]]] = None
+    # Lets a caller force a fresh generation even when the response cache is on.
+    use_cache: bool = True
+    # The app role making the call (architect, coder, reviewer, chat), for telemetry only.
+    role: Optional[str] = None
+
+
+# --- Connection Pooling ---
+class ConnectionStats:
+    """Counts requests and newly opened connections per transport, so pool reuse is visible."""
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def record(self, transport: str, event: str):
+        counters = self.counters.setdefault(transport, {"requests": 0, "new_connections": 0})
+        counters[event] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        snapshot = {}
+        for transport, counters in self.counters.items():
+            # With HTTP/2 several requests share one connection, so this counts reused streams too.
+            reused = max(0, counters["requests"] - counters["new_connections"])
+            snapshot[transport] = {**counters, "reused": reused,
+                                   "reuse_ratio": reused / counters["requests"] if counters["requests"] else 0.0}
+        return snapshot
+
+
+def _create_http_client(stats: ConnectionStats) -> "httpx.AsyncClient":
+    """Shared httpx client for the provider SDKs, with keep-alive and HTTP/2 when available."""
+
+    async def trace(event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            stats.record("httpx", "new_connections")
+        elif event_name.endswith(".send_request_headers.started"):
+            stats.record("httpx", "requests")
+
+    async def attach_trace(request):
+        request.extensions["trace"] = trace
+
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                          keepalive_expiry=KEEPALIVE_SECONDS)
+    return httpx.AsyncClient(http2=HTTP2_ENABLED, limits=limits, follow_redirects=True,
+                             timeout=httpx.Timeout(600.0, connect=10.0), event_hooks={"request": [attach_trace]})
+
+
+def _create_aiohttp_session(stats: ConnectionStats) -> "aiohttp.ClientSession":
+    """Shared aiohttp session for Ollama, with keep-alive."""
+
+    async def on_request_start(session, context, params):
+        stats.record("aiohttp", "requests")
+
+    async def on_connection_create_end(session, context, params):
+        stats.record("aiohttp", "new_connections")
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=KEEPALIVE_SECONDS)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+
+# --- Response Cache ---
+class ResponseCache:
+    """
+    Disk-backed cache of complete streamed responses in SQLite, keyed by provider, model,
+    temperature and a hash of the normalized prompt, history and image. The chunks are
+    stored as they were streamed so a hit replays with the same chunking. The least
+    recently used entries are evicted once the stored text exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, max_temperature: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, chunks TEXT NOT NULL, "
+                           "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def _normalize(text: Optional[str]) -> str:
+        """Ignores line-ending and trailing-whitespace differences that don't change the request."""
+        lines = (text or "").replace("\r\n", "\n").split("\n")
+        return "\n".join(line.rstrip() for line in lines).strip()
+
+    @staticmethod
+    def _image_hash(image_b64: Optional[str]) -> Optional[str]:
+        return hashlib.sha256(image_b64.encode("ascii", errors="ignore")).hexdigest() if image_b64 else None
+
+    def accepts(self, request: StreamChatRequest) -> bool:
+        return request.use_cache and request.temperature <= self.max_temperature
+
+    def key_for(self, request: StreamChatRequest) -> str:
+        history = [{"role": msg.get("role"), "text": self._normalize(msg.get("text") or msg.get("content")),
+                    "image": self._image_hash(msg.get("image_b64"))} for msg in request.history or []]
+        material = {"prompt": self._normalize(request.prompt), "history": history,
+                    "image": self._image_hash(request.image_b64), "media_type": request.media_type}
+        digest = hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{request.provider}/{request.model}@{request.temperature:g}:{digest}"
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            row = self._conn.execute("SELECT chunks FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, chunks: List[str]):
+        payload = json.dumps(chunks)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, chunks, size, created, last_used) "
+                               "VALUES (?, ?, ?, ?, ?)", (key, payload, size, now, now))
+            self._total_bytes += size - (previous[0] if previous else 0)
+            while self._total_bytes > self.max_bytes:
+                oldest = self._conn.execute("SELECT key, size FROM responses WHERE key != ? "
+                                            "ORDER BY last_used LIMIT 1", (key,)).fetchone()
+                if oldest is None:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (oldest[0],))
+                self._total_bytes -= oldest[1]
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"enabled": True, "entries": entries, "bytes": self._total_bytes, "max_bytes": self.max_bytes,
+                "max_temperature": self.max_temperature, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Telemetry ---
+def _estimate_tokens(text: Optional[str]) -> int:
+    return -(-len(text or "") // CHARS_PER_TOKEN)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class CallMetrics:
+    """Timing and token counts of one /stream_chat call while it streams."""
+
+    def __init__(self, request: StreamChatRequest, cached: bool = False):
+        self.request = request
+        self.cached = cached
+        self.started = time.perf_counter()
+        self.first_chunk_at: Optional[float] = None
+        self.completion_chars = 0
+        # Filled by the _stream_* functions when the provider reports token usage.
+        self.usage: Dict[str, int] = {}
+
+    def on_chunk(self, chunk: str):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self.completion_chars += len(chunk)
+
+    def to_record(self, status: str, error: Optional[str] = None) -> Dict[str, Any]:
+        request = self.request
+        total_seconds = time.perf_counter() - self.started
+        ttft_seconds = self.first_chunk_at - self.started if self.first_chunk_at is not None else None
+        if "prompt_tokens" in self.usage and "completion_tokens" in self.usage:
+            prompt_tokens, completion_tokens = self.usage["prompt_tokens"], self.usage["completion_tokens"]
+            token_source = "provider"
+        else:
+            prompt_tokens = _estimate_tokens(request.prompt)
+            for msg in request.history or []:
+                text = msg.get("text") or msg.get("content")
+                if isinstance(text, str):
+                    prompt_tokens += _estimate_tokens(text)
+            completion_tokens = -(-self.completion_chars // CHARS_PER_TOKEN)
+            token_source = "estimate"
+        # Throughput over the generation itself, after the first token arrived.
+        streaming_seconds = total_seconds - (ttft_seconds or 0.0)
+        return {
+            "time": time.time(), "role": request.role or "unknown", "provider": request.provider,
+            "model": request.model, "status": status, "error": error, "cached": self.cached,
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "token_source": token_source,
+            "ttft_seconds": ttft_seconds, "total_seconds": total_seconds,
+            "tokens_per_second": completion_tokens / streaming_seconds if streaming_seconds > 0 else None,
+        }
+
+
+class LLMTelemetry:
+    """
+    Keeps per-call metrics for every role and model. Each finished call is appended to a
+    rotating JSON-lines file, and the most recent calls (including those from earlier runs
+    still in the file) are kept in memory for the /metrics summary.
+    """
+    RECENT_CALLS = 5000
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = path
+        self.recent: "deque[Dict[str, Any]]" = deque(maxlen=self.RECENT_CALLS)
+        self._logger = logging.getLogger("LLMServer.metrics")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._handler = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._load_recent()
+            self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=2, encoding='utf-8')
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(self._handler)
+        except OSError as e:
+            print(f"[LLMServer] Metrics file unavailable, keeping metrics in memory only: {e}", file=sys.stderr)
+
+    def _load_recent(self):
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.recent.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+    def record(self, call: CallMetrics, status: str, error: Optional[str] = None):
+        record = call.to_record(status, error)
+        self.recent.append(record)
+        self._logger.info(json.dumps(record))
+
+    def summary(self, role: Optional[str] = None, model: Optional[str] = None,
+                since_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Aggregates the recent calls per role and provider/model."""
+        cutoff = time.time() - since_seconds if since_seconds else None
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for record in self.recent:
+            if role and record["role"] != role:
+                continue
+            if model and model not in (record["model"], f"{record['provider']}/{record['model']}"):
+                continue
+            if cutoff and record["time"] < cutoff:
+                continue
+            groups.setdefault((record["role"], record["provider"], record["model"]), []).append(record)
+
+        summary = []
+        for (group_role, provider, group_model), records in sorted(groups.items()):
+            live = [r for r in records if not r["cached"] and r["status"] == "ok"]
+            ttfts = [r["ttft_seconds"] for r in live if r["ttft_seconds"] is not None]
+            totals = [r["total_seconds"] for r in live]
+            rates = [r["tokens_per_second"] for r in live if r["tokens_per_second"] is not None]
+            summary.append({
+                "role": group_role, "model": f"{provider}/{group_model}", "calls": len(records),
+                "errors": sum(r["status"] == "error" for r in records),
+                "cancelled": sum(r["status"] == "cancelled" for r in records),
+                "cached": sum(bool(r["cached"]) for r in records),
+                "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+                "completion_tokens": sum(r["completion_tokens"] for r in records),
+                "ttft_p50_seconds": _percentile(ttfts, 50), "ttft_p95_seconds": _percentile(ttfts, 95),
+                "total_p50_seconds": _percentile(totals, 50), "total_p95_seconds": _percentile(totals, 95),
+                "tokens_per_second_mean": sum(rates) / len(rates) if rates else None,
+                "last_error": next((r["error"] for r in reversed(records) if r["error"]), None),
+            })
+        return summary
+
+    def close(self):
+        if self._handler:
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
 
 
 # --- Global State ---
@@ -67,13 +388,24 @@ async def lifespan(app: FastAPI):
             load_dotenv(dotenv_path=dotenv_path)
             print(f"[LLMServer] Loaded .env file from: {dotenv_path}")
 
+    stats = ConnectionStats()
+    app_state["connection_stats"] = stats
+    app_state["telemetry"] = LLMTelemetry(METRICS_PATH, int(METRICS_MAX_MB * 2 ** 20))
+    # None lets each SDK fall back to its own (per-client) connection pool.
+    http_client = _create_http_client(stats) if httpx else None
+    app_state["http_client"] = http_client
+    if http_client:
+        print(f"[LLMServer] Shared provider connection pool ready "
+              f"(max {MAX_CONNECTIONS} connections, HTTP/2 {'on' if HTTP2_ENABLED else 'off'}).")
+
     # Configure clients from environment variables
     if openai:
         if key := os.getenv("OPENAI_API_KEY"):
-            app_state["clients"]["openai"] = openai.AsyncOpenAI(api_key=key)
+            app_state["clients"]["openai"] = openai.AsyncOpenAI(api_key=key, http_client=http_client)
             print("[LLMServer] OpenAI client configured.")
         if key := os.getenv("DEEPSEEK_API_KEY"):
-            app_state["clients"]["deepseek"] = openai.AsyncOpenAI(api_key=key, base_url="https://api.deepseek.com/v1")
+            app_state["clients"]["deepseek"] = openai.AsyncOpenAI(api_key=key, base_url="https://api.deepseek.com/v1",
+                                                                  http_client=http_client)
             print("[LLMServer] DeepSeek client configured.")
     if genai:
         if key := os.getenv("GEMINI_API_KEY"):
@@ -82,15 +414,33 @@ async def lifespan(app: FastAPI):
             print("[LLMServer] Google Gemini client configured.")
     if anthropic:
         if key := os.getenv("ANTHROPIC_API_KEY"):
-            app_state["clients"]["anthropic"] = anthropic.AsyncAnthropic(api_key=key)
+            app_state["clients"]["anthropic"] = anthropic.AsyncAnthropic(api_key=key, http_client=http_client)
             print("[LLMServer] Anthropic client configured.")
 
-    app_state["clients"]["ollama"] = "configured"
-    print("[LLMServer] Ollama client configured.")
+    if aiohttp:
+        app_state["clients"]["ollama"] = _create_aiohttp_session(stats)
+        print("[LLMServer] Ollama client configured.")
+
+    if RESPONSE_CACHE_ENABLED:
+        try:
+            app_state["response_cache"] = ResponseCache(RESPONSE_CACHE_PATH, int(RESPONSE_CACHE_MAX_MB * 2 ** 20),
+                                                        RESPONSE_CACHE_MAX_TEMPERATURE)
+            print(f"[LLMServer] Response cache enabled at {RESPONSE_CACHE_PATH} "
+                  f"(temperature <= {RESPONSE_CACHE_MAX_TEMPERATURE:g}).")
+        except Exception as e:
+            print(f"[LLMServer] Response cache unavailable: {e}", file=sys.stderr)
     print(f"[LLMServer] Ready and listening on http://{HOST}:{PORT}")
     yield
     # --- Shutdown ---
     print("[LLMServer] Shutting down.")
+    print(f"[LLMServer] Connection reuse: {stats.snapshot()}")
+    if ollama_session := app_state["clients"].get("ollama"):
+        await ollama_session.close()
+    if http_client:
+        await http_client.aclose()
+    if response_cache := app_state.get("response_cache"):
+        response_cache.close()
+    app_state["telemetry"].close()
     app_state.clear()
 
 
@@ -153,18 +503,25 @@ def _prepare_openai_messages(history: List[Dict[str, Any]], prompt: str, image_b
     return messages
 
 
-async def _stream_openai_compatible(client, model, prompt, temp, image_b64, media_type, history, provider: str):
+async def _stream_openai_compatible(client, model, prompt, temp, image_b64, media_type, history, provider: str,
+                                    usage: Optional[Dict[str, int]] = None):
     messages = _prepare_openai_messages(history, prompt, image_b64, media_type)
 
     stream = await client.chat.completions.create(
-        model=model, messages=messages, stream=True, temperature=temp, max_tokens=4096
+        model=model, messages=messages, stream=True, temperature=temp, max_tokens=4096,
+        stream_options={"include_usage": True}
     )
     async for chunk in stream:
         if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
             yield chunk.choices[0].delta.content
+        # The final chunk carries the usage for the whole call and has no choices.
+        if usage is not None and getattr(chunk, "usage", None):
+            usage["prompt_tokens"] = chunk.usage.prompt_tokens
+            usage["completion_tokens"] = chunk.usage.completion_tokens
 
 
-async def _stream_google(client, model, prompt, temp, image_b64, media_type, history):
+async def _stream_google(client, model, prompt, temp, image_b64, media_type, history,
+                         usage: Optional[Dict[str, int]] = None):
     model_instance = genai.GenerativeModel(f'models/{model}')
     # Note: Google's history format is different. This would need a specific prep function if used.
     chat_session = model_instance.start_chat(history=[])
@@ -177,9 +534,13 @@ async def _stream_google(client, model, prompt, temp, image_b64, media_type, his
                                                                 temperature=temp))
     async for chunk in response_stream:
         if chunk.text: yield chunk.text
+        if usage is not None and getattr(chunk, "usage_metadata", None):
+            usage["prompt_tokens"] = chunk.usage_metadata.prompt_token_count
+            usage["completion_tokens"] = chunk.usage_metadata.candidates_token_count
 
 
-async def _stream_anthropic(client, model, prompt, temp, image_b64, media_type, history):
+async def _stream_anthropic(client, model, prompt, temp, image_b64, media_type, history,
+                            usage: Optional[Dict[str, int]] = None):
     openai_messages = _prepare_openai_messages(history, prompt, image_b64, media_type)
     anthropic_messages = []
     for msg in openai_messages:
@@ -211,9 +572,14 @@ async def _stream_anthropic(client, model, prompt, temp, image_b64, media_type,
         async for event in stream:
             if event.type == "content_block_delta" and event.delta.type == "text_delta":
                 yield event.delta.text
+            elif usage is not None and event.type == "message_start":
+                usage["prompt_tokens"] = event.message.usage.input_tokens
+            elif usage is not None and event.type == "message_delta":
+                usage["completion_tokens"] = event.usage.output_tokens
 
 
-async def _stream_ollama(client, model, prompt, temp, image_b64, media_type, history):
+async def _stream_ollama(client, model, prompt, temp, image_b64, media_type, history,
+                         usage: Optional[Dict[str, int]] = None):
     messages = []
     if history:
         for msg in history[:-1]:
@@ -227,13 +593,15 @@ async def _stream_ollama(client, model, prompt, temp, image_b64, media_type, his
     ollama_url = os.getenv("OLLAMA_API_BASE", "http://127.0.0.1:11434") + "/api/chat"
     payload = {"model": model, "messages": messages, "stream": True, "options": {"temperature": temp}}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(ollama_url, json=payload) as resp:
-            async for line in resp.content:
-                if line:
-                    chunk_json = json.loads(line.decode('utf-8'))
-                    if content := chunk_json.get("message", {}).get("content"):
-                        yield content
+    async with client.post(ollama_url, json=payload) as resp:
+        async for line in resp.content:
+            if line:
+                chunk_json = json.loads(line.decode('utf-8'))
+                if content := chunk_json.get("message", {}).get("content"):
+                    yield content
+                if usage is not None and chunk_json.get("done") and "eval_count" in chunk_json:
+                    usage["prompt_tokens"] = chunk_json.get("prompt_eval_count", 0)
+                    usage["completion_tokens"] = chunk_json["eval_count"]
 
 
 # --- API Endpoints ---
@@ -242,6 +610,13 @@ def read_root():
     return {"status": "Avakin LLM Server is running"}
 
 
+@app.get("/connection_stats")
+def connection_stats():
+    """How often provider requests reused a pooled connection instead of opening a new one."""
+    return {"http2": HTTP2_ENABLED, "max_connections": MAX_CONNECTIONS,
+            "transports": app_state["connection_stats"].snapshot()}
+
+
 @app.post("/stream_chat")
 async def stream_chat_endpoint(request: StreamChatRequest):
     router = {
@@ -254,23 +629,90 @@ async def stream_chat_endpoint(request: StreamChatRequest):
     if not client or not stream_func:
         raise HTTPException(status_code=400, detail=f"Provider '{request.provider}' not configured or supported.")
 
+    telemetry: LLMTelemetry = app_state["telemetry"]
+    call = CallMetrics(request)
+    cache: Optional[ResponseCache] = app_state.get("response_cache")
+    cache_key = cache.key_for(request) if cache and cache.accepts(request) else None
+    if cache_key:
+        cached_chunks = await asyncio.to_thread(cache.get, cache_key)
+        if cached_chunks is not None:
+            call.cached = True
+
+            async def replay():
+                status = "cancelled"
+                try:
+                    for chunk in cached_chunks:
+                        call.on_chunk(chunk)
+                        yield chunk
+                    status = "ok"
+                finally:
+                    telemetry.record(call, status)
+
+            return StreamingResponse(replay(), media_type="text/plain", headers={"X-Response-Cache": "hit"})
+
     async def generator():
+        chunks = []
+        status, error = "cancelled", None
         try:
             # Pass the provider to the stream function for specific handling
             if request.provider in ["openai", "deepseek"]:
                 async for chunk in stream_func(client, request.model, request.prompt, request.temperature,
                                                request.image_b64, request.media_type, request.history,
-                                               request.provider):
+                                               request.provider, usage=call.usage):
+                    call.on_chunk(chunk)
+                    chunks.append(chunk)
                     yield chunk
             else:
                 async for chunk in stream_func(client, request.model, request.prompt, request.temperature,
-                                               request.image_b64, request.media_type, request.history):
+                                               request.image_b64, request.media_type, request.history,
+                                               usage=call.usage):
+                    call.on_chunk(chunk)
+                    chunks.append(chunk)
                     yield chunk
+            status = "ok"
         except Exception as e:
+            status, error = "error", str(e)
             print(f"Error streaming from {request.provider}: {e}", file=sys.stderr)
             yield f"SERVER_ERROR: {e}"
+            return
+        finally:
+            # Also runs when the client disconnects mid-stream, which is recorded as cancelled.
+            telemetry.record(call, status, error)
+        # Only complete, successful streams are cached; a disconnected client never gets here.
+        if cache_key and chunks:
+            await asyncio.to_thread(cache.put, cache_key, chunks)
+
+    headers = {"X-Response-Cache": "miss"} if cache_key else None
+    return StreamingResponse(generator(), media_type="text/plain", headers=headers)
+
+
+@app.get("/metrics")
+def metrics(role: Optional[str] = None, model: Optional[str] = None, since_seconds: Optional[float] = None,
+            recent: int = 0):
+    """
+    Per role and model summary of recent calls: token counts, time to first token, total
+    stream time, tokens/s and errors. `recent` also returns that many raw call records.
+    """
+    telemetry: LLMTelemetry = app_state["telemetry"]
+    response = {"metrics_file": str(telemetry.path), "summary": telemetry.summary(role, model, since_seconds)}
+    if recent > 0:
+        response["recent"] = list(telemetry.recent)[-recent:]
+    return response
+
+
+@app.get("/response_cache")
+def response_cache_stats():
+    cache = app_state.get("response_cache")
+    return cache.stats() if cache else {"enabled": False}
+
 
-    return StreamingResponse(generator(), media_type="text/plain")
+@app.delete("/response_cache")
+def clear_response_cache():
+    cache = app_state.get("response_cache")
+    if not cache:
+        raise HTTPException(status_code=404, detail="Response cache is not enabled.")
+    cache.clear()
+    return {"status": "success", "message": "Response cache cleared."}
 
 
 @app.get("/get_available_models")
@@ -294,13 +736,12 @@ async def get_available_models_endpoint():
     ollama_url = os.getenv("OLLAMA_API_BASE", "http://127.0.0.1:11434") + "/api/tags"
     try:
         timeout = aiohttp.ClientTimeout(total=2.0)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(ollama_url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    for model_info in data.get("models", []):
-                        if model_name := model_info.get("name"):
-                            models[f"ollama/{model_name}"] = f"Ollama: {model_name}"
+        async with app_state["clients"]["ollama"].get(ollama_url, timeout=timeout) as response:
+            if response.status == 200:
+                data = await response.json()
+                for model_info in data.get("models", []):
+                    if model_name := model_info.get("name"):
+                        models[f"ollama/{model_name}"] = f"Ollama: {model_name}"
     except Exception:
         print("[LLMServer] Could not connect to Ollama to get local models.")
 
@@ -18,7 +18,7 @@ CODER_PROMPT = textwrap.dedent(f"""
       ```json
       {{file_plan_json}}
       ```
-    - **Full Code of Other Project Files:** This is the complete source code for other files in the project. Use this code as the absolute source of truth for how to integrate with them.
+    - **Code of Other Project Files:** This is the source code of the other project files most relevant to yours; less relevant files are given as signatures only (marked as such). Use this code as the absolute source of truth for how to integrate with them.
       ```json
       {{code_context_json}}
       ```
@@ -31,7 +31,7 @@ CODER_PROMPT = textwrap.dedent(f"""
     - You can **ONLY** import from three sources:
         1. Standard Python libraries (e.g., `os`, `sys`, `json`).
         2. External packages explicitly listed as dependencies in the project plan.
-        3. Other project files that are present in the **Project Symbol Index** and for which you have the full code in the **Full Code of Other Project Files** section.
+        3. Other project files that are present in the **Project Symbol Index** and in the **Code of Other Project Files** section.
     - If a file or class is NOT in your provided context, it **DOES NOT EXIST**. You are forbidden from importing it.
 
     {LOGGING_RULE}
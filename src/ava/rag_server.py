@@ -1,16 +1,29 @@
 # rag_server.py
 
 import os
+import re
 import sys
+import json
+import hashlib
+import time
+import asyncio
 import logging
+import heapq
+import math
+import shutil
+import itertools
+import threading
+import multiprocessing
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from contextlib import asynccontextmanager
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
 
 # --- Setup Logging First ---
-log_file_path = Path(sys.executable).parent / "rag_server_debug.log" if getattr(sys, 'frozen', False) else Path(
-    __file__).parent / "rag_server_debug.log"
+_server_dir = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
+log_file_path = Path(os.getenv("RAG_LOG_PATH", str(_server_dir / "rag_server_debug.log")))
 rag_logger = logging.getLogger("RAGServer")
 rag_logger.setLevel(logging.DEBUG)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
@@ -39,15 +52,22 @@ rag_logger.info(f"RAG Server logging initialized. Log file: {log_file_path}")
 
 # --- Import Third-Party Libraries ---
 try:
-    from fastapi import FastAPI, HTTPException
-    from pydantic import BaseModel, Field
+    from fastapi import Depends, FastAPI, HTTPException, Request, Response
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.exceptions import RequestValidationError
+    from pydantic import BaseModel, Field, ValidationError
     import chromadb
-    from sentence_transformers import SentenceTransformer
+    import numpy as np
     import uvicorn
 except ImportError as e:
     rag_logger.critical(f"Failed to import a critical third-party library: {e}", exc_info=True)
     sys.exit(1)
 
+try:
+    import msgpack  # Optional: binary bodies with raw float32 vectors for /add and /query.
+except ImportError:
+    msgpack = None
+
 # --- Configuration ---
 PERSIST_DIRECTORY_NAME = "rag_db"
 MODEL_NAME = 'all-miniLM-L6-v2'
@@ -55,18 +75,110 @@ PROJECT_COLLECTION_NAME = "kintsugi_project_kb"
 GLOBAL_COLLECTION_NAME = "kintsugi_global_python_kb"
 HOST = "127.0.0.1"
 PORT = 8001
+# Hits overlapping a better-ranked hit from the same file by more than this fraction are dropped.
+DEDUPE_OVERLAP_RATIO = 0.5
+# Reciprocal-rank-fusion constant for hybrid (vector + BM25) ranking.
+RRF_K = 60
+QUERY_MODES = ("vector", "lexical", "hybrid")
+# Candidates ranked per requested result when boosts may reorder them.
+BOOST_OVERFETCH_FACTOR = 3
+# Documents are embedded and written to Chroma in slices of this size. A large /add only
+# queues one slice per embedding worker (plus one) ahead of the slice being written, so
+# the embeddings it holds in memory stay bounded however many documents it carries.
+ADD_EMBED_BATCH_SIZE = int(os.getenv("RAG_ADD_EMBED_BATCH_SIZE", "64"))
+# Persistent embedding cache. Set RAG_EMBEDDING_CACHE_SIZE=0 to disable it.
+EMBEDDING_CACHE_DIR = Path(os.getenv("RAG_EMBEDDING_CACHE_DIR", str(_server_dir / "rag_embedding_cache")))
+EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "100000"))
+# Embedding backend: "sentence-transformers" (torch) or "onnx" (onnxruntime + tokenizers,
+# much lighter to start on CPU-only hosts). ONNX falls back to sentence-transformers if unavailable.
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "sentence-transformers")
+# Directory holding model.onnx and tokenizer.json; downloaded from the Hugging Face hub if missing.
+ONNX_MODEL_DIR = os.getenv("RAG_ONNX_MODEL_DIR")
+ONNX_MAX_SEQ_LENGTH = int(os.getenv("RAG_ONNX_MAX_SEQ_LENGTH", "256"))
+ONNX_THREADS = int(os.getenv("RAG_ONNX_THREADS", "0"))  # 0 lets onnxruntime decide
+# Number of CPU embedding worker processes. 0 embeds in this process on a single background thread.
+EMBEDDING_WORKERS = int(os.getenv("RAG_EMBEDDING_WORKERS", "0"))
+# Lower values are served first by the embedding pool.
+QUERY_PRIORITY = 0
+BULK_PRIORITY = 1
+# Entries in the in-memory query-result LRU. Set RAG_QUERY_CACHE_SIZE=0 to disable it.
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "256"))
+# Collections ("global", "project") whose vector queries are served from a compact int8
+# index with float re-ranking instead of Chroma's float32 HNSW index, e.g. "global".
+COMPACT_COLLECTIONS = {name.strip() for name in os.getenv("RAG_COMPACT_COLLECTIONS", "").split(",") if name.strip()}
+# Candidates scored on int8 codes per requested result, before exact float re-ranking.
+COMPACT_RERANK_FACTOR = int(os.getenv("RAG_COMPACT_RERANK_FACTOR", "4"))
+COMPACT_INDEX_DIRECTORY_NAME = "compact_index"
+# Open per-project Chroma clients kept for fast project switching, and how long an
+# inactive one may sit idle before it is closed.
+PROJECT_CLIENT_CACHE_SIZE = max(1, int(os.getenv("RAG_PROJECT_CLIENT_CACHE_SIZE", "4")))
+PROJECT_CLIENT_IDLE_SECONDS = float(os.getenv("RAG_PROJECT_CLIENT_IDLE_SECONDS", "1800"))
 
 
 # --- Data Models for FastAPI ---
+class QueryBoost(BaseModel):
+    # Chunk metadata field ("kind", "language", "directory", ...), or "path_prefix" to match `rel_path`.
+    field: str
+    value: Any
+    # A matching hit ranks as if its relevance were (1 + weight) times higher.
+    weight: float = 0.5
+
+
 class QueryRequest(BaseModel):
     query_text: str
     n_results: int = 5
     target_collection: Optional[str] = "project"
+    # Drop hits that overlap an already returned chunk of the same file or repeat its text.
+    dedupe: bool = True
+    # Optional budget for the combined snippet text; lower-ranked hits are dropped or truncated.
+    max_chars: Optional[int] = None
+    # "vector" (embeddings), "lexical" (BM25 over identifiers, no embedding call) or "hybrid" (fused).
+    mode: str = "vector"
+    # Metadata filters, all combined. `where` is a raw Chroma where clause; `path_prefix` matches the
+    # ingest-relative path ("game/" or "game/physics.py"); `language` and `kind` take one value or a list.
+    where: Optional[Dict[str, Any]] = None
+    path_prefix: Optional[str] = None
+    language: Optional[Union[str, List[str]]] = None
+    kind: Optional[Union[str, List[str]]] = None
+    # Favour, rather than require, hits with matching metadata.
+    boosts: List[QueryBoost] = Field(default_factory=list)
+    # Optional client-computed query vector, used instead of embedding `query_text` (see `_unpack_matrix`).
+    query_embedding: Optional[Any] = None
+
+
+class QueryHit(BaseModel):
+    id: str
+    source: str
+    distance: Optional[float] = None
+    score: Optional[float] = None
+    text: str
+    char_start: Optional[int] = None
+    char_end: Optional[int] = None
 
 
 class QueryResponse(BaseModel):
     context: str
     source_collection: str
+    hits: List[QueryHit] = Field(default_factory=list)
+
+
+class BatchQueryRequest(BaseModel):
+    query_texts: List[str]
+    n_results: int = 5
+    target_collections: List[str] = Field(default_factory=lambda: ["project", "global"])
+    dedupe: bool = True
+    max_chars: Optional[int] = None
+
+
+class BatchQueryResult(BaseModel):
+    query_text: str
+    context: str
+    source_collection: str
+    hits: List[QueryHit] = Field(default_factory=list)
+
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult]
 
 
 class Document(BaseModel):
@@ -78,59 +190,1180 @@ class Document(BaseModel):
 class AddRequest(BaseModel):
     documents: List[Document]
     target_collection: Optional[str] = "project"
+    # Optional client-computed vectors, one row per document (see `_unpack_matrix`).
+    embeddings: Optional[Any] = None
+
+
+class DeleteRequest(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+    # Chroma where clause; every chunk it matches is deleted along with `ids`.
+    where: Optional[Dict[str, Any]] = None
+    target_collection: Optional[str] = "project"
 
 
 class SetCollectionRequest(BaseModel):
     project_path: str
 
 
+# --- Embedding Cache ---
+class EmbeddingCache:
+    """
+    Persistent LRU cache of embeddings keyed by the SHA-256 of the text.
+    Vectors live in a fixed-capacity float32 memory-mapped file, one file per model, with
+    each slot's key digest in a parallel memmap so a hit is only served from a slot that
+    still holds that key. The key -> slot index is an append-only log next to it, so a
+    flush writes only the slots assigned since the last one; it is compacted once it grows
+    past a few times the capacity. Flushes do blocking I/O and are run off the event loop.
+    """
+    FLUSH_EVERY = 256
+    COMPACT_FACTOR = 3
+    KEY_BYTES = 32
+
+    def __init__(self, cache_dir: Path, model_name: str, dim: int, capacity: int):
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = capacity
+        safe_model_name = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+        self.vectors_path = cache_dir / f"{safe_model_name}_{dim}.f32"
+        self.index_path = cache_dir / f"{safe_model_name}_{dim}.index.log"
+        self.keys_path = cache_dir / f"{safe_model_name}_{dim}.keys"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free_slots: List[int] = []
+        self._pending: List[Tuple[str, int]] = []
+        self._log_entries = 0
+        # False until the log on disk is known to match this model, so the first flush rewrites it.
+        self._index_valid = False
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        reuse = (self.vectors_path.exists() and self.vectors_path.stat().st_size == capacity * dim * 4
+                 and self.keys_path.exists() and self.keys_path.stat().st_size == capacity * self.KEY_BYTES)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+" if reuse else "w+",
+                                  shape=(capacity, dim))
+        self._keys = np.memmap(self.keys_path, dtype=np.uint8, mode="r+" if reuse else "w+",
+                               shape=(capacity, self.KEY_BYTES))
+        if reuse:
+            self._load_index()
+        used_slots = set(self._slots.values())
+        self._free_slots = [slot for slot in range(capacity - 1, -1, -1) if slot not in used_slots]
+        rag_logger.info(f"Embedding cache ready at {self.vectors_path} ({len(self._slots)}/{capacity} entries).")
+
+    @staticmethod
+    def key_for(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+    def _header(self) -> str:
+        return json.dumps({"model": self.model_name, "dim": self.dim}) + "\n"
+
+    def _load_index(self):
+        """Replays the slot log; a later entry for a slot replaces the key it held before."""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                if f.readline() != self._header():
+                    return
+                self._index_valid = True
+                key_by_slot: Dict[int, str] = {}
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2:
+                        continue  # A torn last line after a crash
+                    key, slot = parts[0], int(parts[1])
+                    if not 0 <= slot < self.capacity:
+                        continue
+                    previous_key = key_by_slot.get(slot)
+                    if previous_key is not None and previous_key != key:
+                        self._slots.pop(previous_key, None)
+                    old_slot = self._slots.get(key)
+                    if old_slot is not None and old_slot != slot:
+                        key_by_slot.pop(old_slot, None)
+                    key_by_slot[slot] = key
+                    self._slots[key] = slot
+                    self._slots.move_to_end(key)
+                    self._log_entries += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            rag_logger.warning(f"Embedding cache index unreadable, starting empty: {e}")
+            self._slots.clear()
+            self._log_entries = 0
+            self._index_valid = False
+
+    def get_many(self, texts: List[str]) -> List[Optional["np.ndarray"]]:
+        """Returns a copy of the cached vector for each text, or None on a miss."""
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                key = self.key_for(text)
+                slot = self._slots.get(key)
+                if slot is not None and bytes(self._keys[slot]) != bytes.fromhex(key):
+                    # Reassigned before the log recorded it (a crash between put and flush).
+                    del self._slots[key]
+                    slot = None
+                if slot is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._slots.move_to_end(key)
+                    self.hits += 1
+                    results.append(np.array(self._vectors[slot]))
+        return results
+
+    def put_many(self, texts: List[str], vectors: "np.ndarray"):
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key_for(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    if self._free_slots:
+                        slot = self._free_slots.pop()
+                    else:
+                        _, slot = self._slots.popitem(last=False)  # Evict least recently used
+                self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self._vectors[slot] = vector
+                self._slots[key] = slot
+                self._slots.move_to_end(key)
+                self._pending.append((key, slot))
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self._pending) >= self.FLUSH_EVERY
+
+    def flush(self):
+        """
+        Flushes vectors and appends the new slot assignments to the index log, or rewrites
+        it compacted once it has grown too long. Blocking; call it from a worker thread.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._vectors.flush()
+                self._keys.flush()
+                pending, self._pending = self._pending, []
+                compact = (not self._index_valid
+                           or self._log_entries + len(pending) > self.COMPACT_FACTOR * self.capacity)
+                entries = list(self._slots.items()) if compact else pending
+            lines = "".join(f"{key} {slot}\n" for key, slot in entries)
+            if compact:
+                tmp_path = self.index_path.with_suffix(".tmp")
+                tmp_path.write_text(self._header() + lines, encoding="utf-8")
+                os.replace(tmp_path, self.index_path)
+                self._log_entries = len(entries)
+                self._index_valid = True
+            else:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                self._log_entries += len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._slots), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+# --- Embedding Backends ---
+class SentenceTransformerBackend:
+    """The reference backend: the model run through sentence-transformers (and torch)."""
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str, device: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def encode(self, texts: List[str]) -> "np.ndarray":
+        return np.asarray(self.model.encode(texts, show_progress_bar=False), dtype=np.float32)
+
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class OnnxEmbeddingBackend:
+    """
+    The same sentence-transformers model exported to ONNX, run with onnxruntime on CPU.
+    Reproduces the model's pipeline (mean pooling over the attention mask, then L2
+    normalization) without importing torch.
+    """
+    name = "onnx"
+    MODEL_FILE = "model.onnx"
+    TOKENIZER_FILE = "tokenizer.json"
+
+    def __init__(self, model_name: str, device: Optional[str] = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_dir = self._resolve_model_dir(model_name)
+        self.tokenizer = Tokenizer.from_file(str(model_dir / self.TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=ONNX_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        if ONNX_THREADS > 0:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = onnxruntime.InferenceSession(str(model_dir / self.MODEL_FILE), sess_options=options,
+                                                    providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    @classmethod
+    def _resolve_model_dir(cls, model_name: str) -> Path:
+        safe_name = model_name.replace("/", "__")
+        model_dir = Path(ONNX_MODEL_DIR) if ONNX_MODEL_DIR else _server_dir / "rag_onnx_models" / safe_name
+        if (model_dir / cls.MODEL_FILE).exists() and (model_dir / cls.TOKENIZER_FILE).exists():
+            return model_dir
+        from huggingface_hub import hf_hub_download
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        rag_logger.info(f"Downloading ONNX export of '{repo_id}' to {model_dir}...")
+        model_dir.mkdir(parents=True, exist_ok=True)
+        for remote_name, local_name in ((f"onnx/{cls.MODEL_FILE}", cls.MODEL_FILE),
+                                        (cls.TOKENIZER_FILE, cls.TOKENIZER_FILE)):
+            downloaded = Path(hf_hub_download(repo_id=repo_id, filename=remote_name))
+            (model_dir / local_name).write_bytes(downloaded.read_bytes())
+        return model_dir
+
+    def encode(self, texts: List[str]) -> "np.ndarray":
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids)}
+        token_embeddings = self.session.run(None, {k: v for k, v in feed.items() if k in self._input_names})[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def dimension(self) -> int:
+        return int(self.encode(["dimension probe"]).shape[1])
+
+
+EMBEDDING_BACKENDS = {backend.name: backend for backend in (SentenceTransformerBackend, OnnxEmbeddingBackend)}
+
+
+def create_embedding_backend(backend_name: str, model_name: str, device: Optional[str] = None):
+    """Instantiates the configured backend, falling back to sentence-transformers if it can't load."""
+    backend_class = EMBEDDING_BACKENDS.get(backend_name)
+    if backend_class is None:
+        rag_logger.warning(f"Unknown embedding backend '{backend_name}'; using sentence-transformers.")
+        backend_class = SentenceTransformerBackend
+    if backend_class is not SentenceTransformerBackend:
+        try:
+            return backend_class(model_name, device=device)
+        except Exception as e:
+            rag_logger.warning(f"Embedding backend '{backend_class.name}' unavailable ({e}); "
+                               f"falling back to sentence-transformers.")
+    return SentenceTransformerBackend(model_name, device=device)
+
+
+# --- Embedding Worker Pool ---
+_worker_model = None
+
+
+def _worker_init(backend_name: str, model_name: str):
+    """Loads a CPU-only copy of the embedding backend inside a pool worker process."""
+    global _worker_model
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    _worker_model = create_embedding_backend(backend_name, model_name, device="cpu")
+
+
+def _worker_encode(texts: List[str]) -> "np.ndarray":
+    return _worker_model.encode(texts)
+
+
+def _worker_dimension() -> int:
+    return _worker_model.dimension()
+
+
+def _worker_backend_name() -> str:
+    return _worker_model.name
+
+
+class EmbeddingWorkerPool:
+    """
+    Runs embedding off the event loop, either in CPU worker processes or on a single
+    background thread using the model loaded in this process. Requests wait in a
+    priority queue so small interactive queries overtake bulk ingestion batches.
+    """
+
+    def __init__(self, workers: int, model_name: str, local_backend=None, backend_name: str = EMBEDDING_BACKEND):
+        self.workers = workers
+        self._local_backend = local_backend
+        if workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_worker_init,
+                                                 initargs=(backend_name, model_name),
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            self._encode_fn = _worker_encode
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-embed")
+            self._encode_fn = local_backend.encode
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._latencies = {QUERY_PRIORITY: deque(maxlen=100), BULK_PRIORITY: deque(maxlen=100)}
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(max(1, workers))]
+
+    async def dimension(self) -> int:
+        if self.workers > 0:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _worker_dimension)
+        return int(self._local_backend.dimension())
+
+    async def backend_name(self) -> str:
+        """Name of the backend actually loaded (it may have fallen back from the configured one)."""
+        if self.workers > 0:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _worker_backend_name)
+        return self._local_backend.name
+
+    async def encode(self, texts: List[str], priority: int) -> "np.ndarray":
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((priority, next(self._sequence), texts, future))
+        return await future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, _, texts, future = await self._queue.get()
+            if future.cancelled():
+                continue
+            self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self._executor, self._encode_fn, texts)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._in_flight -= 1
+                self._latencies[priority].append(((time.perf_counter() - started) * 1000, len(texts)))
+
+    def stats(self) -> Dict[str, Any]:
+        pending = [item[0] for item in self._queue._queue]  # Snapshot of queued priorities
+        latency = {}
+        for priority, name in ((QUERY_PRIORITY, "query"), (BULK_PRIORITY, "bulk")):
+            samples = self._latencies[priority]
+            latency[name] = {
+                "batches": len(samples),
+                "last_ms": round(samples[-1][0], 2) if samples else None,
+                "avg_ms": round(sum(ms for ms, _ in samples) / len(samples), 2) if samples else None,
+                "avg_batch_size": round(sum(n for _, n in samples) / len(samples), 1) if samples else None,
+            }
+        return {
+            "mode": "process" if self.workers > 0 else "thread",
+            "workers": max(1, self.workers),
+            "queue_depth": len(pending),
+            "queued_queries": pending.count(QUERY_PRIORITY),
+            "queued_bulk_batches": pending.count(BULK_PRIORITY),
+            "in_flight": self._in_flight,
+            "batch_latency": latency,
+        }
+
+    async def close(self):
+        for task in self._dispatchers:
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _embed_texts(texts: List[str], priority: int = QUERY_PRIORITY) -> "np.ndarray":
+    """Embeds texts as a float32 matrix, serving repeats from the embedding cache."""
+    pool: EmbeddingWorkerPool = app_state["embedding_pool"]
+    cache: Optional[EmbeddingCache] = app_state.get("embedding_cache")
+    if cache is None:
+        return await pool.encode(texts, priority)
+
+    cached = cache.get_many(texts)
+    result = np.empty((len(texts), cache.dim), dtype=np.float32)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    if missing:
+        unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+        encoded = await pool.encode(unique_texts, priority)
+        cache.put_many(unique_texts, encoded)
+        if cache.needs_flush:
+            await asyncio.to_thread(cache.flush)
+        encoded_by_text = dict(zip(unique_texts, encoded))
+        for i in missing:
+            result[i] = encoded_by_text[texts[i]]
+    for i, vector in enumerate(cached):
+        if vector is not None:
+            result[i] = vector
+    return result
+
+
+# --- Project Client Cache ---
+class ProjectClientCache:
+    """
+    LRU of open per-project Chroma clients and their collections, keyed by DB path.
+    Switching back to a recently used project reuses its client instead of reopening it.
+    Entries beyond the capacity, or idle for too long while not active, are closed.
+    """
+
+    def __init__(self, capacity: int, idle_seconds: float):
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def open(self, db_path: str) -> tuple:
+        """
+        Returns (client, collection, evicted_paths) for the project DB, opening it if needed.
+        The opened project becomes the most recently used entry.
+        """
+        with self._lock:
+            evicted = self._evict_idle_locked(active_path=db_path)
+            entry = self._entries.get(db_path)
+            if entry:
+                self.hits += 1
+                self._entries.move_to_end(db_path)
+            else:
+                self.misses += 1
+                client = chromadb.PersistentClient(path=db_path)
+                entry = {"client": client,
+                         "collection": client.get_or_create_collection(name=PROJECT_COLLECTION_NAME)}
+                self._entries[db_path] = entry
+                while len(self._entries) > self.capacity:
+                    old_path, old_entry = self._entries.popitem(last=False)
+                    self._close(old_path, old_entry)
+                    evicted.append(old_path)
+            entry["last_used"] = time.monotonic()
+            return entry["client"], entry["collection"], evicted
+
+    def replace_collection(self, db_path: str, collection):
+        with self._lock:
+            if db_path in self._entries:
+                self._entries[db_path]["collection"] = collection
+
+    def evict_idle(self, active_path: Optional[str]) -> List[str]:
+        with self._lock:
+            return self._evict_idle_locked(active_path)
+
+    def _evict_idle_locked(self, active_path: Optional[str]) -> List[str]:
+        cutoff = time.monotonic() - self.idle_seconds
+        idle = [path for path, entry in self._entries.items()
+                if path != active_path and entry["last_used"] < cutoff]
+        for path in idle:
+            self._close(path, self._entries.pop(path))
+        return idle
+
+    def close_all(self):
+        with self._lock:
+            while self._entries:
+                self._close(*self._entries.popitem(last=False))
+
+    @staticmethod
+    def _close(db_path: str, entry: Dict[str, Any]):
+        rag_logger.info(f"Closing cached project client: '{db_path}'")
+        close = getattr(entry["client"], "close", None)  # Older chromadb clients have no close().
+        if close:
+            try:
+                close()
+            except Exception as e:
+                rag_logger.warning(f"Error closing project client '{db_path}': {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"open_projects": list(self._entries), "capacity": self.capacity,
+                    "idle_seconds": self.idle_seconds, "hits": self.hits, "misses": self.misses}
+
+
+def _drop_project_indexes(db_paths: List[str]):
+    """Forgets the in-memory lexical and compact indexes of closed projects."""
+    for db_path in db_paths:
+        app_state["lexical_indexes"].pop(f"project:{db_path}", None)
+        compact_index = app_state["compact_indexes"].pop(f"project:{db_path}", None)
+        if compact_index:
+            compact_index.close()
+
+
+async def _evict_idle_project_clients():
+    """Background task closing project clients that have been idle for too long."""
+    while True:
+        await asyncio.sleep(max(1.0, min(60.0, PROJECT_CLIENT_IDLE_SECONDS / 2)))
+        cache = app_state.get("project_clients")
+        if cache:
+            evicted = await run_in_threadpool(cache.evict_idle, app_state.get("project_db_path"))
+            _drop_project_indexes(evicted)
+
+
+# --- Lexical (BM25) Index ---
+_IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+_CAMEL_CASE_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def _tokenize_code(text: str) -> List[str]:
+    """
+    Identifier-aware tokenizer. Each identifier yields itself (lowercased) plus its
+    snake_case / CamelCase parts, so `PlayerPhysics` matches `player_physics` and `physics`.
+    """
+    tokens = []
+    for identifier in _IDENTIFIER_PATTERN.findall(text):
+        lowered = identifier.lower()
+        tokens.append(lowered)
+        parts = [part.lower() for piece in identifier.split('_') if piece
+                 for part in _CAMEL_CASE_PATTERN.findall(piece)]
+        if len(parts) > 1 or (parts and parts[0] != lowered):
+            tokens.extend(parts)
+    return tokens
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index kept in step with one Chroma collection."""
+    K1 = 1.5
+    B = 0.75
+    PAGE_SIZE = 1000
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build_from_collection(cls, collection) -> "LexicalIndex":
+        index = cls()
+        started = time.perf_counter()
+        offset = 0
+        while True:
+            page = collection.get(include=['documents'], limit=cls.PAGE_SIZE, offset=offset)
+            ids = page.get('ids') or []
+            if not ids:
+                break
+            index.add(ids, page.get('documents') or [])
+            offset += len(ids)
+        rag_logger.info(f"Built lexical index for '{collection.name}': {len(index._doc_lengths)} documents "
+                        f"in {time.perf_counter() - started:.2f}s.")
+        return index
+
+    def add(self, ids: List[str], documents: List[str]):
+        """Adds or replaces documents."""
+        with self._lock:
+            for doc_id, document in zip(ids, documents):
+                self._remove_locked(doc_id)
+                tokens = _tokenize_code(document or "")
+                frequencies: Dict[str, int] = defaultdict(int)
+                for token in tokens:
+                    frequencies[token] += 1
+                for term, frequency in frequencies.items():
+                    self._postings[term][doc_id] = frequency
+                self._doc_terms[doc_id] = list(frequencies)
+                self._doc_lengths[doc_id] = len(tokens)
+                self._total_length += len(tokens)
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str):
+        for term in self._doc_terms.pop(doc_id, []):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+
+    def search(self, query_text: str, n_results: int, allowed_ids: Optional[Set[str]] = None) -> List[tuple]:
+        """Returns up to n_results (doc_id, bm25_score) pairs, best first, optionally only from `allowed_ids`."""
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count or 1.0
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(_tokenize_code(query_text)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if allowed_ids is not None and doc_id not in allowed_ids:
+                        continue
+                    length_norm = self.K1 * (1 - self.B + self.B * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] += idf * frequency * (self.K1 + 1) / (frequency + length_norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+
+def _collection_key(collection_name: str) -> str:
+    if collection_name == "global":
+        return "global"
+    return f"project:{app_state.get('project_db_path')}"
+
+
+def _index_build_lock(kind: str, key: str) -> asyncio.Lock:
+    """Serializes builds of one in-memory index, so each is built once and writers can wait for it."""
+    return app_state["index_build_locks"].setdefault((kind, key), asyncio.Lock())
+
+
+async def _wait_for_index_build(kind: str, key: str):
+    """Returns once an in-progress build of the index, if any, has been stored in app_state."""
+    lock = app_state["index_build_locks"].get((kind, key))
+    if lock is not None and lock.locked():
+        async with lock:
+            pass
+
+
+async def _get_lexical_index(collection_name: str, collection) -> LexicalIndex:
+    """Returns the collection's lexical index, building it from the stored documents on first use."""
+    key = _collection_key(collection_name)
+    index = app_state["lexical_indexes"].get(key)
+    if index is None:
+        async with _index_build_lock("lexical", key):
+            index = app_state["lexical_indexes"].get(key)
+            if index is None:
+                index = await run_in_threadpool(LexicalIndex.build_from_collection, collection)
+                app_state["lexical_indexes"][key] = index
+    return index
+
+
+# --- Compact (int8) Vector Index ---
+class CompactVectorIndex:
+    """
+    Memory-compact vector index for one collection. Each vector is kept in RAM as int8 codes
+    with a per-vector scale (4x smaller than float32), and the exact float32 vectors live in
+    an on-disk memmap that is only touched to re-rank the top candidates. Distances are
+    squared L2, matching Chroma's default space.
+    """
+    SCAN_BLOCK_ROWS = 32768
+    INDEX_FILE = "index.npz"
+    VECTORS_FILE = "vectors.f32"
+    # Exists while vectors.f32 holds writes that index.npz doesn't describe yet; a crash leaves it behind.
+    DIRTY_FILE = "dirty"
+
+    def __init__(self, directory: Path, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._codes = np.zeros((0, dim), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._vectors = None
+        self._dirty = False
+
+    @property
+    def count(self) -> int:
+        return len(self._ids)
+
+    @classmethod
+    def open(cls, directory: Path, collection, dim: int) -> "CompactVectorIndex":
+        """Loads the saved index if it holds exactly the collection's IDs, otherwise rebuilds it from Chroma."""
+        index = cls(directory, dim)
+        started = time.perf_counter()
+        # The index is only saved on close/evict, so after an unclean exit a matching count can still
+        # hide deleted and missing chunks; compare the ID sets instead.
+        if index._load() and index._matches(collection):
+            rag_logger.info(f"Loaded compact index for '{collection.name}': {index.count} vectors.")
+            return index
+        index.close()
+        index = cls(directory, dim)
+        offset = 0
+        while True:
+            page = collection.get(include=['embeddings'], limit=LexicalIndex.PAGE_SIZE, offset=offset)
+            ids = page.get('ids') or []
+            if not ids:
+                break
+            index.add(ids, np.asarray(page['embeddings'], dtype=np.float32))
+            offset += len(ids)
+        index.save()
+        rag_logger.info(f"Built compact index for '{collection.name}': {index.count} vectors "
+                        f"in {time.perf_counter() - started:.2f}s.")
+        return index
+
+    def _matches(self, collection) -> bool:
+        if self.count != collection.count():
+            return False
+        offset = 0
+        while True:
+            ids = collection.get(include=[], limit=LexicalIndex.PAGE_SIZE, offset=offset).get('ids') or []
+            if not ids:
+                return True
+            if any(doc_id not in self._rows for doc_id in ids):
+                return False
+            offset += len(ids)
+
+    def _load(self) -> bool:
+        index_path = self.directory / self.INDEX_FILE
+        vectors_path = self.directory / self.VECTORS_FILE
+        if not index_path.exists() or not vectors_path.exists():
+            return False
+        if (self.directory / self.DIRTY_FILE).exists():
+            rag_logger.warning(f"Compact index at {self.directory} was not saved after its last write, rebuilding.")
+            return False
+        try:
+            with np.load(index_path, allow_pickle=False) as data:
+                if int(data["dim"]) != self.dim:
+                    return False
+                self._codes = data["codes"]
+                self._scales = data["scales"]
+                self._sq_norms = data["sq_norms"]
+                self._ids = [str(doc_id) for doc_id in data["ids"]]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._open_vectors(max(1, len(self._codes)))
+            return True
+        except Exception as e:
+            rag_logger.warning(f"Compact index at {self.directory} unreadable, rebuilding: {e}")
+            return False
+
+    def _open_vectors(self, capacity: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        vectors_path = self.directory / self.VECTORS_FILE
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        required_bytes = capacity * self.dim * 4
+        if not vectors_path.exists() or vectors_path.stat().st_size < required_bytes:
+            with open(vectors_path, "ab") as f:
+                f.truncate(required_bytes)
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int):
+        if len(self._codes) >= rows and self._vectors is not None and len(self._vectors) >= rows:
+            return
+        capacity = max(rows, 2 * len(self._codes), 1024)
+        grown = np.zeros((capacity, self.dim), dtype=np.int8)
+        grown[:self.count] = self._codes[:self.count]
+        self._codes = grown
+        self._scales = np.resize(self._scales, capacity)
+        self._sq_norms = np.resize(self._sq_norms, capacity)
+        self._open_vectors(capacity)
+
+    def add(self, ids: List[str], embeddings: "np.ndarray"):
+        """Adds or replaces vectors."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), self.dim)
+        scales = np.maximum(np.abs(embeddings).max(axis=1), 1e-12) / 127.0
+        codes = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+        with self._lock:
+            self._mark_dirty_locked()
+            self._ensure_capacity(self.count + len(ids))
+            for doc_id, vector, code, scale in zip(ids, embeddings, codes, scales):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self.count
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                self._codes[row] = code
+                self._scales[row] = scale
+                self._sq_norms[row] = float(vector @ vector)
+                self._vectors[row] = vector
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            if any(doc_id in self._rows for doc_id in ids):
+                self._mark_dirty_locked()
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self.count - 1
+                if row != last:
+                    # Move the last vector into the hole so rows stay contiguous.
+                    moved_id = self._ids[last]
+                    self._ids[row] = moved_id
+                    self._rows[moved_id] = row
+                    self._codes[row] = self._codes[last]
+                    self._scales[row] = self._scales[last]
+                    self._sq_norms[row] = self._sq_norms[last]
+                    self._vectors[row] = self._vectors[last]
+                self._ids.pop()
+
+    def search(self, query_embedding: "np.ndarray", n_results: int,
+               allowed_ids: Optional[Set[str]] = None) -> List[tuple]:
+        """
+        Returns up to n_results (doc_id, squared L2 distance) pairs, nearest first.
+        With `allowed_ids`, only those rows are scanned.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            rows = None
+            if allowed_ids is not None:
+                rows = np.fromiter((self._rows[doc_id] for doc_id in allowed_ids if doc_id in self._rows),
+                                   dtype=np.int64)
+                rows.sort()
+            count = self.count if rows is None else len(rows)
+            if not count or n_results <= 0:
+                return []
+            approximate = np.empty(count, dtype=np.float32)
+            for start in range(0, count, self.SCAN_BLOCK_ROWS):
+                end = min(start + self.SCAN_BLOCK_ROWS, count)
+                block = slice(start, end) if rows is None else rows[start:end]
+                dots = (self._codes[block].astype(np.float32) @ query) * self._scales[block]
+                approximate[start:end] = self._sq_norms[block] - 2 * dots
+            candidate_count = min(count, n_results * COMPACT_RERANK_FACTOR)
+            candidates = np.argpartition(approximate, candidate_count - 1)[:candidate_count]
+            if rows is not None:
+                candidates = rows[candidates]
+            candidates.sort()  # Sequential reads from the memmap.
+            differences = np.asarray(self._vectors[candidates]) - query
+            exact = np.einsum('ij,ij->i', differences, differences)
+            order = np.argsort(exact)[:n_results]
+            return [(self._ids[candidates[i]], float(exact[i])) for i in order]
+
+    def save(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.directory / f"{self.INDEX_FILE}.tmp.npz"
+            np.savez(tmp_path, dim=self.dim, codes=self._codes[:self.count], scales=self._scales[:self.count],
+                     sq_norms=self._sq_norms[:self.count], ids=np.array(self._ids, dtype=str))
+            os.replace(tmp_path, self.directory / self.INDEX_FILE)
+            (self.directory / self.DIRTY_FILE).unlink(missing_ok=True)
+            self._dirty = False
+
+    def _mark_dirty_locked(self):
+        if not self._dirty:
+            # Written before the memmap changes, so vectors.f32 never gets ahead of index.npz unmarked.
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / self.DIRTY_FILE).touch()
+            self._dirty = True
+
+    def close(self):
+        if self._dirty:
+            try:
+                self.save()
+            except Exception as e:
+                rag_logger.warning(f"Could not save compact index at {self.directory}: {e}")
+        self._vectors = None
+
+    def stats(self) -> Dict[str, Any]:
+        count = self.count
+        return {"vectors": count, "dim": self.dim,
+                "resident_bytes": int(count * (self.dim + 8)),
+                "float32_equivalent_bytes": int(count * self.dim * 4)}
+
+
+def _compact_index_directory(collection_name: str, collection) -> Path:
+    db_path = app_state.get("global_db_path") if collection_name == "global" else app_state.get("project_db_path")
+    return Path(db_path) / COMPACT_INDEX_DIRECTORY_NAME / collection.name
+
+
+async def _get_compact_index(collection_name: str, collection) -> Optional[CompactVectorIndex]:
+    """Returns the compact index for collections configured in COMPACT_COLLECTIONS, opening it on first use."""
+    if collection_name not in COMPACT_COLLECTIONS:
+        return None
+    key = _collection_key(collection_name)
+    index = app_state["compact_indexes"].get(key)
+    if index is None:
+        # Two instances over the same vectors.f32 would overwrite each other's rows, so build once.
+        async with _index_build_lock("compact", key):
+            index = app_state["compact_indexes"].get(key)
+            if index is None:
+                dim = await app_state["embedding_pool"].dimension()
+                index = await run_in_threadpool(CompactVectorIndex.open,
+                                                _compact_index_directory(collection_name, collection), collection, dim)
+                app_state["compact_indexes"][key] = index
+    return index
+
+
+async def _vector_query(collection, collection_name: str, query_embeddings: List[List[float]],
+                        n_results: int, include_documents: bool = True, where: Optional[Dict[str, Any]] = None,
+                        allowed_ids: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """
+    Nearest-neighbour search returning Chroma-shaped results (`ids`, `distances` and, if asked,
+    `documents`/`metadatas`; one list per query). Served from the compact index when the
+    collection is configured for it, otherwise straight from Chroma. Filtered queries pass
+    both forms from `_resolve_filters`: Chroma uses `where`, the compact index `allowed_ids`.
+    """
+    compact_index = await _get_compact_index(collection_name, collection)
+    if compact_index is None:
+        include = ['documents', 'metadatas', 'distances'] if include_documents else ['distances']
+        return await run_in_threadpool(collection.query, query_embeddings=query_embeddings,
+                                       n_results=n_results, include=include, where=where)
+
+    rankings = [await run_in_threadpool(compact_index.search, embedding, n_results, allowed_ids)
+                for embedding in query_embeddings]
+    results: Dict[str, Any] = {'ids': [[doc_id for doc_id, _ in ranking] for ranking in rankings],
+                               'distances': [[distance for _, distance in ranking] for ranking in rankings]}
+    if include_documents:
+        wanted_ids = list(dict.fromkeys(doc_id for ids in results['ids'] for doc_id in ids))
+        records = await run_in_threadpool(collection.get, ids=wanted_ids, include=['documents', 'metadatas']) \
+            if wanted_ids else {}
+        records_by_id = {doc_id: (document, metadata) for doc_id, document, metadata in
+                         zip(records.get('ids', []), records.get('documents') or [], records.get('metadatas') or [])}
+        stale_ids = [doc_id for doc_id in wanted_ids if doc_id not in records_by_id]
+        if stale_ids:
+            # Gone from Chroma but still in the index; drop them rather than return blank hits.
+            rag_logger.warning(f"Compact index for '{collection.name}' had {len(stale_ids)} stale IDs; removing them.")
+            compact_index.remove(stale_ids)
+            rankings = [[(doc_id, distance) for doc_id, distance in ranking if doc_id in records_by_id]
+                        for ranking in rankings]
+            results = {'ids': [[doc_id for doc_id, _ in ranking] for ranking in rankings],
+                       'distances': [[distance for _, distance in ranking] for ranking in rankings]}
+        results['documents'] = [[records_by_id[doc_id][0] for doc_id in ids] for ids in results['ids']]
+        results['metadatas'] = [[records_by_id[doc_id][1] for doc_id in ids] for ids in results['ids']]
+    return results
+
+
+def _reciprocal_rank_fusion(rankings: List[List[str]]) -> List[tuple]:
+    fused: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += 1.0 / (RRF_K + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+# --- Query Result Cache ---
+class QueryResultCache:
+    """
+    LRU of query results keyed by (collection key, collection version, query parameters).
+    Writes bump the collection's version instead of scanning the cache, so stale entries
+    simply stop being reachable and age out.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: "OrderedDict[tuple, List[QueryHit]]" = OrderedDict()
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, collection_name: str, query_text: str, n_results: int, dedupe: bool,
+            max_chars: Optional[int], mode: str, filters: str = "") -> tuple:
+        collection_key = _collection_key(collection_name)
+        return (collection_key, self._versions[collection_key], query_text, n_results, dedupe, max_chars, mode,
+                filters)
+
+    def get(self, key: tuple) -> Optional[List[QueryHit]]:
+        with self._lock:
+            hits = self._entries.get(key)
+            if hits is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hits
+
+    def put(self, key: tuple, hits: List[QueryHit]):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = hits
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def bump_version(self, collection_name: str):
+        with self._lock:
+            self._versions[_collection_key(collection_name)] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+# --- Wire Formats ---
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _is_msgpack(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+def _parse_payload(body: bytes, content_type: Optional[str], model):
+    """Decodes a JSON or msgpack request body and validates it against `model`."""
+    if _is_msgpack(content_type):
+        if msgpack is None:
+            raise HTTPException(status_code=415, detail="msgpack bodies need the 'msgpack' package on the server.")
+        try:
+            data = msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Malformed msgpack body: {e}")
+    else:
+        try:
+            data = json.loads(body) if body else None
+        except ValueError as e:
+            raise RequestValidationError([{"type": "json_invalid", "loc": ("body",), "msg": f"JSON decode error: {e}",
+                                           "input": {}}])
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])}
+                                      for error in e.errors(include_url=False)])
+
+
+def _payload(model):
+    """Dependency parsing the request body as `model`, from JSON or msgpack."""
+    async def parse(http_request: Request):
+        return _parse_payload(await http_request.body(), http_request.headers.get("content-type"), model)
+    return parse
+
+
+def _respond(http_request: Request, content: Any):
+    """Returns `content` as msgpack when the client accepts it, otherwise lets FastAPI send JSON."""
+    accepted = http_request.headers.get("accept", "").split(",")
+    if msgpack is None or not any(_is_msgpack(media_type) for media_type in accepted):
+        return content
+    if isinstance(content, BaseModel):
+        content = content.model_dump()
+    return Response(content=msgpack.packb(content, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPES[0])
+
+
+def _unpack_matrix(value: Any, dim: int) -> "np.ndarray":
+    """
+    Float32 matrix from a payload field. msgpack clients send {"dtype": "float32", "shape": [...],
+    "data": <raw little-endian bytes>}, which is viewed without copying or parsing any floats;
+    JSON clients send nested lists.
+    """
+    try:
+        if isinstance(value, dict):
+            if value.get("dtype") != "float32":
+                raise ValueError(f"unsupported dtype '{value.get('dtype')}'")
+            matrix = np.frombuffer(value["data"], dtype="<f4").reshape(value["shape"])
+        else:
+            matrix = np.asarray(value, dtype=np.float32)
+        matrix = matrix.reshape(-1, dim)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid embeddings (expected {dim} dimensions): {e}")
+    return matrix
+
+
 # --- Global State ---
 app_state = {
     "embedding_model": None,
+    "embedding_backend": None,
+    "embedding_cache": None,
+    "embedding_pool": None,
+    "lexical_indexes": {},
+    "compact_indexes": {},
+    "index_build_locks": {},
+    "query_cache": None,
+    "project_clients": None,
+    "global_db_path": None,
+    "project_db_path": None,
     "project_collection": None,
     "global_collection": None,
     "chroma_client_project": None,
-    "chroma_client_global": None
+    "chroma_client_global": None,
+    "readiness": None,
+    "ready_event": None
 }
 
 
-# --- Lifespan Event Handler ---
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    rag_logger.info("--- RAG Server Startup (Lifespan) ---")
-    rag_logger.info(f"Loading embedding model: '{MODEL_NAME}' into memory...")
+# --- Startup: listening first, ready once warmed up ---
+def _set_readiness(phase: str, error: Optional[str] = None):
+    readiness = app_state["readiness"]
+    readiness["phase"] = phase
+    readiness["ready"] = phase == "ready"
+    readiness["error"] = error
+    if phase in ("ready", "failed"):
+        app_state["ready_event"].set()
+
+
+def _open_global_collection():
+    global_db_path_str = os.getenv("GLOBAL_RAG_DB_PATH")
+    if not global_db_path_str:
+        rag_logger.info("GLOBAL_RAG_DB_PATH environment variable not set.")
+        return
+    global_db_path = Path(global_db_path_str)
+    if not global_db_path.exists():
+        global_db_path.mkdir(parents=True, exist_ok=True)
+    if not global_db_path.is_dir():
+        rag_logger.warning(f"GLOBAL_RAG_DB_PATH '{global_db_path_str}' is not a valid directory. Global KB not loaded.")
+        return
     try:
-        app_state["embedding_model"] = SentenceTransformer(MODEL_NAME)
-        rag_logger.info("Embedding model loaded successfully.")
+        client = chromadb.PersistentClient(path=str(global_db_path))
+        collection = client.get_or_create_collection(name=GLOBAL_COLLECTION_NAME)
+        collection.count()  # Touches the segment files so the first query doesn't pay for it.
+        app_state["chroma_client_global"] = client
+        app_state["global_db_path"] = str(global_db_path)
+        app_state["global_collection"] = collection
+        rag_logger.info(f"Successfully loaded/created GLOBAL knowledge base from: {global_db_path}")
     except Exception as e:
-        rag_logger.critical(f"FATAL: Could not load embedding model. Error: {e}", exc_info=True)
-        sys.exit("RAG Server: Embedding model failed to load.")
+        rag_logger.error(f"Failed to load/create GLOBAL knowledge base from {global_db_path}: {e}", exc_info=True)
 
-    global_db_path_str = os.getenv("GLOBAL_RAG_DB_PATH")
-    if global_db_path_str:
-        global_db_path = Path(global_db_path_str)
-        if not global_db_path.exists():
-            global_db_path.mkdir(parents=True, exist_ok=True)
-        if global_db_path.is_dir():
+
+async def _warm_up():
+    """
+    Loads the embedding model, runs a dummy batch through every worker and opens the global
+    collection, recording the time each phase took. The server accepts connections meanwhile;
+    embedding endpoints answer 503 until `embedding_pool` is published at the very end.
+    """
+    timings = app_state["readiness"]["timings"]
+    started = time.perf_counter()
+    pool = None
+    try:
+        _set_readiness("loading_model")
+        if EMBEDDING_WORKERS > 0:
+            rag_logger.info(f"Starting {EMBEDDING_WORKERS} embedding worker process(es) for '{MODEL_NAME}' "
+                            f"({EMBEDDING_BACKEND} backend)...")
+            pool = EmbeddingWorkerPool(EMBEDDING_WORKERS, MODEL_NAME)
+        else:
+            rag_logger.info(f"Loading embedding model: '{MODEL_NAME}' ({EMBEDDING_BACKEND} backend) into memory...")
+            app_state["embedding_model"] = await asyncio.to_thread(create_embedding_backend, EMBEDDING_BACKEND,
+                                                                   MODEL_NAME)
+            pool = EmbeddingWorkerPool(0, MODEL_NAME, app_state["embedding_model"])
+        embedding_dim = await pool.dimension()
+        app_state["embedding_backend"] = await pool.backend_name()
+        timings["model_load_seconds"] = round(time.perf_counter() - started, 3)
+        rag_logger.info(f"Embedding model loaded successfully with the {app_state['embedding_backend']} backend "
+                        f"in {timings['model_load_seconds']:.2f}s.")
+
+        _set_readiness("warming_up")
+        phase_started = time.perf_counter()
+        # One small batch per worker so each process has run the model once before real work arrives.
+        await asyncio.gather(*(pool.encode([f"def warm_up_{i}(): return 'kintsugi'"], BULK_PRIORITY)
+                               for i in range(max(1, EMBEDDING_WORKERS))))
+        timings["warmup_seconds"] = round(time.perf_counter() - phase_started, 3)
+
+        if EMBEDDING_CACHE_SIZE > 0:
             try:
-                app_state["chroma_client_global"] = chromadb.PersistentClient(path=str(global_db_path))
-                app_state["global_collection"] = app_state["chroma_client_global"].get_or_create_collection(
-                    name=GLOBAL_COLLECTION_NAME)
-                rag_logger.info(f"Successfully loaded/created GLOBAL knowledge base from: {global_db_path}")
+                app_state["embedding_cache"] = await asyncio.to_thread(
+                    EmbeddingCache, EMBEDDING_CACHE_DIR, MODEL_NAME, embedding_dim, EMBEDDING_CACHE_SIZE)
             except Exception as e:
-                rag_logger.error(f"Failed to load/create GLOBAL knowledge base from {global_db_path}: {e}",
-                                 exc_info=True)
-        else:
-            rag_logger.warning(
-                f"GLOBAL_RAG_DB_PATH '{global_db_path_str}' is not a valid directory. Global KB not loaded.")
-    else:
-        rag_logger.info("GLOBAL_RAG_DB_PATH environment variable not set.")
+                rag_logger.error(f"Embedding cache disabled, could not open it: {e}", exc_info=True)
+
+        _set_readiness("opening_global")
+        phase_started = time.perf_counter()
+        await asyncio.to_thread(_open_global_collection)
+        timings["global_open_seconds"] = round(time.perf_counter() - phase_started, 3)
+    except Exception as e:
+        rag_logger.critical(f"FATAL: Could not load embedding model. Error: {e}", exc_info=True)
+        if pool:
+            await pool.close()
+        _set_readiness("failed", str(e))
+        return
+
+    app_state["embedding_pool"] = pool
+    timings["total_seconds"] = round(time.perf_counter() - started, 3)
+    _set_readiness("ready")
+    rag_logger.info(f"--- RAG Server is ready ({timings['total_seconds']:.2f}s: model "
+                    f"{timings['model_load_seconds']:.2f}s, warm-up {timings['warmup_seconds']:.2f}s, "
+                    f"global KB {timings['global_open_seconds']:.2f}s) ---")
+
 
+# --- Lifespan Event Handler ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    rag_logger.info("--- RAG Server Startup (Lifespan) ---")
+    app_state["readiness"] = {"phase": "starting", "ready": False, "error": None,
+                              "timings": {"model_load_seconds": None, "warmup_seconds": None,
+                                          "global_open_seconds": None, "total_seconds": None}}
+    app_state["ready_event"] = asyncio.Event()
     app_state["project_collection"] = None
     app_state["chroma_client_project"] = None
-    rag_logger.info("--- RAG Server is now ready and listening ---")
+    app_state["lexical_indexes"] = {}
+    app_state["compact_indexes"] = {}
+    app_state["index_build_locks"] = {}
+    app_state["query_cache"] = QueryResultCache(QUERY_CACHE_SIZE)
+    app_state["project_clients"] = ProjectClientCache(PROJECT_CLIENT_CACHE_SIZE, PROJECT_CLIENT_IDLE_SECONDS)
+    idle_eviction_task = asyncio.create_task(_evict_idle_project_clients())
+    warm_up_task = asyncio.create_task(_warm_up())
+    rag_logger.info("--- RAG Server is listening; warming up in the background ---")
     yield
     rag_logger.info("--- RAG Server Shutdown (Lifespan) ---")
+    idle_eviction_task.cancel()
+    warm_up_task.cancel()
+    for compact_index in app_state["compact_indexes"].values():
+        compact_index.close()
+    app_state["project_clients"].close_all()
+    if app_state.get("embedding_pool"):
+        await app_state["embedding_pool"].close()
+    if app_state.get("embedding_cache"):
+        app_state["embedding_cache"].flush()
     app_state.clear()
 
 
@@ -152,14 +1385,18 @@ def set_project_collection(request: SetCollectionRequest):
     rag_logger.info(f"Setting PROJECT RAG context. DB path: '{project_db_persist_path}'")
     try:
         project_db_persist_path.mkdir(parents=True, exist_ok=True)
-        app_state["chroma_client_project"] = chromadb.PersistentClient(path=str(project_db_persist_path))
-        app_state["project_collection"] = app_state["chroma_client_project"].get_or_create_collection(
-            name=PROJECT_COLLECTION_NAME)
+        client, collection, evicted = app_state["project_clients"].open(str(project_db_persist_path))
+        # Lexical indexes live exactly as long as their project's cached client.
+        _drop_project_indexes(evicted)
+        app_state["chroma_client_project"] = client
+        app_state["project_collection"] = collection
+        app_state["project_db_path"] = str(project_db_persist_path)
         return {"status": "success", "message": f"Project collection set to: {project_root_path.name}"}
     except Exception as e:
         rag_logger.error(f"FATAL: Could not connect/create PROJECT ChromaDB: {e}", exc_info=True)
         app_state["project_collection"] = None
         app_state["chroma_client_project"] = None
+        app_state["project_db_path"] = None
         raise HTTPException(status_code=500, detail=f"Failed to initialize PROJECT ChromaDB: {e}")
 
 
@@ -176,16 +1413,32 @@ def reset_project_collection():
         rag_logger.info(f"Resetting project collection: '{PROJECT_COLLECTION_NAME}'")
         client.delete_collection(name=PROJECT_COLLECTION_NAME)
         app_state["project_collection"] = client.create_collection(name=PROJECT_COLLECTION_NAME)
+        app_state["project_clients"].replace_collection(app_state["project_db_path"], app_state["project_collection"])
         rag_logger.info(f"Project collection '{PROJECT_COLLECTION_NAME}' has been successfully reset.")
         return {"status": "success", "message": "Project collection has been reset."}
     except ValueError:
         # This happens if the collection didn't exist in the first place, which is fine.
         rag_logger.info(f"Collection '{PROJECT_COLLECTION_NAME}' did not exist, creating new one.")
         app_state["project_collection"] = client.get_or_create_collection(name=PROJECT_COLLECTION_NAME)
+        app_state["project_clients"].replace_collection(app_state["project_db_path"], app_state["project_collection"])
         return {"status": "success", "message": "Project collection did not exist and has been created."}
     except Exception as e:
         rag_logger.error(f"Error resetting project collection: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Same order as /add: invalidate only once the collection has changed, so a query or index
+        # rebuild that ran mid-reset can't leave pre-reset results behind under the new version.
+        _evict_project_indexes()
+        app_state["query_cache"].bump_version("project")
+
+
+def _evict_project_indexes():
+    app_state["lexical_indexes"].pop(_collection_key("project"), None)
+    compact_index = app_state["compact_indexes"].pop(_collection_key("project"), None)
+    if compact_index:
+        compact_index.close()
+    if app_state.get("project_collection"):
+        shutil.rmtree(_compact_index_directory("project", app_state["project_collection"]), ignore_errors=True)
 
 
 @rag_app.get("/")
@@ -194,20 +1447,44 @@ def read_root():
     status_global = "Active" if app_state.get("global_collection") else "Inactive"
     return {
         "status": "RAG Server is running",
+        "ready": bool(app_state.get("readiness") and app_state["readiness"]["ready"]),
+        "readiness": app_state.get("readiness"),
         "project_collection_status": status_project,
         "global_collection_status": status_global,
-        "embedding_model_status": "Loaded" if app_state.get("embedding_model") else "Not Loaded"
+        "embedding_model_status": "Loaded" if app_state.get("embedding_pool") else "Not Loaded",
+        "embedding_backend": app_state.get("embedding_backend"),
+        "wire_formats": ["json", "msgpack"] if msgpack is not None else ["json"],
+        "embedding_cache": app_state["embedding_cache"].stats() if app_state.get("embedding_cache") else None,
+        "embedding_pool": app_state["embedding_pool"].stats() if app_state.get("embedding_pool") else None,
+        "project_clients": app_state["project_clients"].stats() if app_state.get("project_clients") else None,
+        "compact_indexes": {key: index.stats() for key, index in app_state.get("compact_indexes", {}).items()},
+        "query_cache": app_state["query_cache"].stats() if app_state.get("query_cache") else None
     }
 
 
+@rag_app.get("/wait_ready")
+async def wait_ready(timeout: float = 30.0):
+    """
+    Long-poll for readiness: returns as soon as warm-up finishes (or fails), or after
+    `timeout` seconds with the current phase, so clients needn't poll `/` in a loop.
+    """
+    ready_event: Optional[asyncio.Event] = app_state.get("ready_event")
+    if ready_event is None:
+        raise HTTPException(status_code=503, detail="RAG server is not started.")
+    try:
+        await asyncio.wait_for(ready_event.wait(), timeout=max(0.0, min(timeout, 300.0)))
+    except asyncio.TimeoutError:
+        pass
+    return app_state["readiness"]
+
+
 @rag_app.post("/add")
-def add_documents(request: AddRequest):
-    embedding_model = app_state.get("embedding_model")
-    if not embedding_model:
+async def add_documents(http_request: Request, request: AddRequest = Depends(_payload(AddRequest))):
+    if not app_state.get("embedding_pool"):
         raise HTTPException(status_code=503, detail="Embedding model not loaded.")
 
     collection_to_use = None
-    collection_name_log = request.target_collection or "project"
+    collection_name_log = "global" if request.target_collection == "global" else "project"
 
     if request.target_collection == "global":
         collection_to_use = app_state.get("global_collection")
@@ -220,68 +1497,489 @@ def add_documents(request: AddRequest):
 
     docs = request.documents
     if not docs:
-        return {"status": "success", "message": "No documents provided."}
+        return _respond(http_request, {"status": "success", "message": "No documents provided."})
 
+    provided_embeddings = None
+    if request.embeddings is not None:
+        provided_embeddings = _unpack_matrix(request.embeddings, await app_state["embedding_pool"].dimension())
+        if len(provided_embeddings) != len(docs):
+            raise HTTPException(status_code=400, detail=f"Got {len(provided_embeddings)} embeddings "
+                                                        f"for {len(docs)} documents.")
+    # Upsert semantics: later duplicates of an ID win, chunks already stored with the same text
+    # are not re-embedded, and only their metadata is refreshed if it changed (e.g. a moved span).
+    row_by_id = {doc.id: row for row, doc in enumerate(docs)}
+    docs = [docs[row] for row in row_by_id.values()]
     try:
-        ids = [doc.id for doc in docs]
-        contents = [doc.content for doc in docs]
-        metadatas = [doc.metadata for doc in docs]
-        embeddings = embedding_model.encode(contents, show_progress_bar=False).tolist()
+        existing = await run_in_threadpool(collection_to_use.get, ids=[doc.id for doc in docs],
+                                           include=['documents', 'metadatas'])
+    except Exception as e:
+        rag_logger.error(f"ERROR reading existing documents from '{collection_name_log}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    existing_by_id = {doc_id: (document, metadata) for doc_id, document, metadata in
+                      zip(existing.get('ids', []), existing.get('documents') or [], existing.get('metadatas') or [])}
+    changed_docs, metadata_only_docs = [], []
+    for doc in docs:
+        stored = existing_by_id.get(doc.id)
+        if stored is None or stored[0] != doc.content:
+            changed_docs.append(doc)
+        elif (stored[1] or {}) != doc.metadata:
+            metadata_only_docs.append(doc)
+    unchanged = len(docs) - len(changed_docs) - len(metadata_only_docs)
+
+    batches = [changed_docs[start:start + ADD_EMBED_BATCH_SIZE]
+               for start in range(0, len(changed_docs), ADD_EMBED_BATCH_SIZE)]
+    # Slices are queued at bulk priority a few ahead of the one being written so every worker
+    # stays busy, while interactive queries still jump ahead of anything not yet started.
+    embed_ahead = max(1, app_state["embedding_pool"].workers) + 1
+    embedding_tasks: Dict[int, asyncio.Future] = {}
 
-        collection_to_use.add(embeddings=embeddings, documents=contents, metadatas=metadatas, ids=ids)
-        return {"status": "success", "message": f"Added {len(docs)} documents to '{collection_name_log}'."}
+    def queue_embeddings(start: int):
+        if provided_embeddings is not None:
+            return
+        for index in range(start, min(start + embed_ahead, len(batches))):
+            if index not in embedding_tasks:
+                embedding_tasks[index] = asyncio.ensure_future(
+                    _embed_texts([doc.content for doc in batches[index]], BULK_PRIORITY))
+
+    queue_embeddings(0)
+    try:
+        if metadata_only_docs:
+            await run_in_threadpool(collection_to_use.update, ids=[doc.id for doc in metadata_only_docs],
+                                    metadatas=[doc.metadata for doc in metadata_only_docs])
+        added = 0
+        for index, batch in enumerate(batches):
+            if provided_embeddings is not None:
+                embeddings = provided_embeddings[[row_by_id[doc.id] for doc in batch]].tolist()
+            else:
+                queue_embeddings(index)
+                embeddings = (await embedding_tasks.pop(index)).tolist()
+            await run_in_threadpool(collection_to_use.upsert, embeddings=embeddings,
+                                    documents=[doc.content for doc in batch],
+                                    metadatas=[doc.metadata for doc in batch],
+                                    ids=[doc.id for doc in batch])
+            # A build that read the collection before this upsert is updated here once it's stored.
+            await _wait_for_index_build("lexical", _collection_key(collection_name_log))
+            lexical_index = app_state["lexical_indexes"].get(_collection_key(collection_name_log))
+            if lexical_index:
+                lexical_index.add([doc.id for doc in batch], [doc.content for doc in batch])
+            # Opened eagerly so the saved compact index never misses a write.
+            compact_index = await _get_compact_index(collection_name_log, collection_to_use)
+            if compact_index:
+                await run_in_threadpool(compact_index.add, [doc.id for doc in batch], embeddings)
+            added += len(batch)
+        if app_state.get("embedding_cache"):
+            await run_in_threadpool(app_state["embedding_cache"].flush)
+        return _respond(http_request, {
+            "status": "success", "added": added, "updated": len(metadata_only_docs), "unchanged": unchanged,
+            "message": f"Upserted {added} documents to '{collection_name_log}' "
+                       f"({len(metadata_only_docs)} metadata-only updates, {unchanged} unchanged)."})
+    except HTTPException:
+        raise
     except Exception as e:
         rag_logger.error(f"ERROR during document addition to '{collection_name_log}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Bumped after the writes (even partial ones) so no query can cache a pre-write result under the new version.
+        app_state["query_cache"].bump_version(collection_name_log)
+        for embedding_task in embedding_tasks.values():
+            embedding_task.cancel()
+
+
+@rag_app.post("/delete")
+async def delete_documents(request: DeleteRequest):
+    collection_name_log = "global" if request.target_collection == "global" else "project"
+    if request.target_collection == "global":
+        collection_to_use = app_state.get("global_collection")
+        if not collection_to_use:
+            raise HTTPException(status_code=503, detail="Global RAG collection is not active.")
+    else:  # Default to project
+        collection_to_use = app_state.get("project_collection")
+        if not collection_to_use:
+            raise HTTPException(status_code=503, detail="No active PROJECT RAG collection.")
+
+    if not request.ids and not request.where:
+        return {"status": "success", "message": "No document IDs provided."}
+
+    try:
+        ids = list(request.ids)
+        if request.where:
+            # Resolved to IDs so the lexical and compact indexes can drop the same chunks.
+            matched = await run_in_threadpool(collection_to_use.get, where=request.where, include=[])
+            ids = list(dict.fromkeys(ids + (matched.get('ids') or [])))
+        if not ids:
+            return {"status": "success", "message": "No matching documents to delete."}
+        try:
+            await run_in_threadpool(collection_to_use.delete, ids=ids)
+        finally:
+            app_state["query_cache"].bump_version(collection_name_log)
+        # A build that read the collection before the delete must be stored before it's updated.
+        await _wait_for_index_build("lexical", _collection_key(collection_name_log))
+        await _wait_for_index_build("compact", _collection_key(collection_name_log))
+        lexical_index = app_state["lexical_indexes"].get(_collection_key(collection_name_log))
+        if lexical_index:
+            lexical_index.remove(ids)
+        compact_index = app_state["compact_indexes"].get(_collection_key(collection_name_log))
+        if compact_index:
+            compact_index.remove(ids)
+        elif collection_name_log in COMPACT_COLLECTIONS:
+            # Not loaded, so its saved copy is now stale; it is rebuilt on next use.
+            shutil.rmtree(_compact_index_directory(collection_name_log, collection_to_use), ignore_errors=True)
+        return {"status": "success", "message": f"Deleted {len(ids)} documents from '{collection_name_log}'."}
+    except Exception as e:
+        rag_logger.error(f"ERROR during document deletion from '{collection_name_log}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _get_query_collection(target_collection: Optional[str]):
+    """Returns (collection or None, collection name, message to use when the collection is inactive)."""
+    if target_collection == "global":
+        return app_state.get("global_collection"), "global", "Global knowledge base is not active."
+    return (app_state.get("project_collection"), "project",
+            "No knowledge base is active for the current project.")
+
+
+def _build_hits(ids: List[str], documents: List[str], metadatas_list: List[Optional[Dict[str, Any]]],
+                distances: Optional[List[Optional[float]]], n_results: int, dedupe: bool,
+                max_chars: Optional[int], scores: Optional[List[float]] = None) -> List[QueryHit]:
+    """
+    Turns raw Chroma results (best first) into structured hits, suppressing near-duplicates
+    and enforcing the optional character budget.
+    """
+    hits: List[QueryHit] = []
+    kept_spans: Dict[str, List[tuple]] = {}
+    seen_texts = set()
+    used_chars = 0
+    for i, doc_content in enumerate(documents):
+        if len(hits) >= n_results:
+            break
+        metadata = (metadatas_list[i] if i < len(metadatas_list) else None) or {}
+        source = metadata.get('source', "Unknown Source")
+        file_key = metadata.get('full_path') or source
+        char_start, char_end = metadata.get('start_char'), metadata.get('end_char')
+
+        if dedupe:
+            text_key = hashlib.sha1(doc_content.strip().encode("utf-8", errors="ignore")).hexdigest()
+            if text_key in seen_texts:
+                continue
+            if char_start is not None and char_end is not None:
+                span_length = max(1, char_end - char_start)
+                overlaps = any(
+                    min(char_end, kept_end) - max(char_start, kept_start)
+                    > DEDUPE_OVERLAP_RATIO * min(span_length, max(1, kept_end - kept_start))
+                    for kept_start, kept_end in kept_spans.get(file_key, [])
+                )
+                if overlaps:
+                    continue
+                kept_spans.setdefault(file_key, []).append((char_start, char_end))
+            seen_texts.add(text_key)
+
+        if max_chars is not None:
+            remaining = max_chars - used_chars
+            if remaining <= 0:
+                break
+            if len(doc_content) > remaining:
+                if hits:
+                    break  # Keep whole snippets; only the top hit is ever truncated.
+                doc_content = doc_content[:remaining]
+        used_chars += len(doc_content)
+
+        hits.append(QueryHit(
+            id=ids[i] if i < len(ids) else "",
+            source=source,
+            distance=distances[i] if distances and i < len(distances) else None,
+            score=scores[i] if scores and i < len(scores) else None,
+            text=doc_content,
+            char_start=char_start,
+            char_end=char_end,
+        ))
+    return hits
+
+
+def _format_context(hits: List[QueryHit], collection_name: str) -> str:
+    if not hits:
+        return f"No relevant documents found in {collection_name} knowledge base."
+    return "\n\n".join(f"--- Relevant Snippet from {hit.source} ---\n{hit.text}" for hit in hits).strip()
+
+
+def _fetch_count(n_results: int, dedupe: bool, boosted: bool = False) -> int:
+    """
+    Over-fetch when deduplicating so suppressed hits can be replaced by the next best ones,
+    and when boosting so lower-ranked matches have a chance to move up.
+    """
+    fetch_count = n_results * 2 if dedupe else n_results
+    return fetch_count * BOOST_OVERFETCH_FACTOR if boosted else fetch_count
+
+
+# --- Metadata Filters and Boosts ---
+def _normalize_path_prefix(path_prefix: Optional[str]) -> str:
+    prefix = (path_prefix or "").replace("\\", "/").strip()
+    while prefix.startswith("./"):
+        prefix = prefix[2:]
+    return prefix.strip("/")
+
+
+def _path_matches(rel_path: Optional[str], prefix: str) -> bool:
+    return bool(rel_path) and (rel_path == prefix or rel_path.startswith(prefix + "/"))
+
+
+def _filter_key(request: QueryRequest) -> str:
+    """Canonical form of the request's filters and boosts, for the query cache key."""
+    if not (request.where or request.path_prefix or request.language or request.kind or request.boosts):
+        return ""
+    return json.dumps({"where": request.where, "path_prefix": _normalize_path_prefix(request.path_prefix),
+                       "language": request.language, "kind": request.kind,
+                       "boosts": [boost.model_dump() for boost in request.boosts]}, sort_keys=True, default=str)
+
+
+def _metadata_where(request: QueryRequest) -> Optional[Dict[str, Any]]:
+    """
+    Chroma where clause for the request's filters. Chroma has no prefix operator for metadata,
+    so a path prefix only narrows by its first component (`top_directory`) here.
+    """
+    clauses = [request.where] if request.where else []
+    for field, value in (("language", request.language), ("kind", request.kind)):
+        if value:
+            clauses.append({field: {"$in": value}} if isinstance(value, list) else {field: value})
+    prefix = _normalize_path_prefix(request.path_prefix)
+    if prefix:
+        top = prefix.split("/", 1)[0]
+        clauses.append({"$or": [{"top_directory": top}, {"rel_path": top}]})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+async def _resolve_filters(collection, collection_name: str, request: QueryRequest) -> tuple:
+    """
+    Returns (where, allowed_ids) for the request's filters, or (None, None) if it has none.
+    `where` is an exact Chroma where clause: deeper path prefixes are resolved to the matching
+    `rel_path` values. `allowed_ids` restricts the compact and lexical indexes, and is only
+    looked up when one of them will be used.
+    """
+    where = _metadata_where(request)
+    if where is None:
+        return None, None
+    prefix = _normalize_path_prefix(request.path_prefix)
+    deep_prefix = "/" in prefix
+    if not deep_prefix and request.mode == "vector" and collection_name not in COMPACT_COLLECTIONS:
+        return where, None
+
+    records = await run_in_threadpool(collection.get, where=where, include=['metadatas'] if deep_prefix else [])
+    ids = records.get('ids') or []
+    if not deep_prefix:
+        return where, set(ids)
+    matched = {doc_id: metadata.get('rel_path') for doc_id, metadata in zip(ids, records.get('metadatas') or [])
+               if metadata and _path_matches(metadata.get('rel_path'), prefix)}
+    if matched:
+        where = {"$and": [where, {"rel_path": {"$in": sorted(set(matched.values()))}}]}
+    return where, set(matched)
+
+
+def _boost_factor(metadata: Dict[str, Any], boosts: List[QueryBoost]) -> float:
+    factor = 1.0
+    for boost in boosts:
+        if boost.field == "path_prefix":
+            matched = _path_matches(metadata.get('rel_path'), _normalize_path_prefix(str(boost.value)))
+        elif isinstance(boost.value, list):
+            matched = metadata.get(boost.field) in boost.value
+        else:
+            matched = metadata.get(boost.field) == boost.value
+        if matched:
+            factor += boost.weight
+    return factor
+
+
+def _apply_boosts(ids: List[str], documents: List[str], metadatas_list: List[Optional[Dict[str, Any]]],
+                  distances: Optional[List[Optional[float]]], boosts: List[QueryBoost]) -> tuple:
+    """
+    Re-ranks candidates (best first) by their rank-fusion relevance 1 / (RRF_K + rank) scaled by
+    the matching boosts, so a boost reorders hits of similar relevance without burying a clearly
+    better one. Returns the reordered lists plus the boosted scores.
+    """
+    boosted = sorted(((_boost_factor(metadatas_list[rank] or {}, boosts) / (RRF_K + rank + 1), rank)
+                      for rank in range(len(ids))), key=lambda item: item[0], reverse=True)
+    order = [rank for _, rank in boosted]
+
+    def _reorder(values):
+        return [values[rank] for rank in order] if values else values
+
+    return (_reorder(ids), _reorder(documents), _reorder(metadatas_list), _reorder(distances),
+            [score for score, _ in boosted])
+
+
+async def _ranked_query(collection, collection_name: str, request: QueryRequest,
+                        where: Optional[Dict[str, Any]] = None,
+                        allowed_ids: Optional[Set[str]] = None) -> List[QueryHit]:
+    """Runs a lexical or hybrid query and returns hits in fused rank order."""
+    fetch_count = _fetch_count(request.n_results, request.dedupe, bool(request.boosts))
+    lexical_index = await _get_lexical_index(collection_name, collection)
+    lexical_ranking = lexical_index.search(request.query_text, fetch_count, allowed_ids)
+
+    distances_by_id: Dict[str, float] = {}
+    if request.mode == "hybrid":
+        query_embedding = await _query_vector(request)
+        vector_results = await _vector_query(collection, collection_name, [query_embedding], fetch_count,
+                                             include_documents=False, where=where, allowed_ids=allowed_ids)
+        vector_ids = vector_results.get('ids', [[]])[0]
+        distances_by_id = dict(zip(vector_ids, (vector_results.get('distances') or [[]])[0]))
+        ranking = _reciprocal_rank_fusion([vector_ids, [doc_id for doc_id, _ in lexical_ranking]])[:fetch_count]
+    else:
+        ranking = lexical_ranking
+
+    if not ranking:
+        return []
+    ranked_ids = [doc_id for doc_id, _ in ranking]
+    records = await run_in_threadpool(collection.get, ids=ranked_ids, include=['documents', 'metadatas'])
+    records_by_id = {doc_id: (document, metadata) for doc_id, document, metadata in
+                     zip(records.get('ids', []), records.get('documents') or [], records.get('metadatas') or [])}
+    ids, documents, metadatas_list, distances, scores = [], [], [], [], []
+    for doc_id, score in ranking:
+        if doc_id not in records_by_id:
+            continue
+        document, metadata = records_by_id[doc_id]
+        ids.append(doc_id)
+        documents.append(document)
+        metadatas_list.append(metadata)
+        distances.append(distances_by_id.get(doc_id))
+        scores.append(score)
+    if request.boosts:
+        ids, documents, metadatas_list, distances, scores = _apply_boosts(ids, documents, metadatas_list,
+                                                                          distances, request.boosts)
+    return _build_hits(ids, documents, metadatas_list, distances, request.n_results, request.dedupe,
+                       request.max_chars, scores)
+
+
+async def _query_vector(request: QueryRequest) -> List[float]:
+    """The client-supplied query vector if there is one, otherwise the embedded query text."""
+    if request.query_embedding is not None:
+        return _unpack_matrix(request.query_embedding, await app_state["embedding_pool"].dimension())[0].tolist()
+    return (await _embed_texts([request.query_text], QUERY_PRIORITY))[0].tolist()
 
 
 @rag_app.post("/query", response_model=QueryResponse)
-def query_rag(request: QueryRequest) -> QueryResponse:
-    embedding_model = app_state.get("embedding_model")
-    if not embedding_model:
+async def query_rag(http_request: Request, request: QueryRequest = Depends(_payload(QueryRequest))):
+    if request.mode not in QUERY_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown query mode '{request.mode}'. Use one of {QUERY_MODES}.")
+    if request.mode != "lexical" and not app_state.get("embedding_pool"):
         raise HTTPException(status_code=503, detail="Embedding model not loaded.")
 
-    collection_to_query = None
-    collection_name_for_log = request.target_collection or "project"
+    collection_to_query, collection_name_for_log, inactive_message = _get_query_collection(request.target_collection)
+    if not collection_to_query:
+        return _respond(http_request, QueryResponse(context=inactive_message,
+                                                    source_collection=collection_name_for_log))
 
-    if request.target_collection == "global":
-        collection_to_query = app_state.get("global_collection")
-        if not collection_to_query:
-            return QueryResponse(context="Global knowledge base is not active.", source_collection="global")
-    else:  # Default to project
-        collection_to_query = app_state.get("project_collection")
-        if not collection_to_query:
-            return QueryResponse(context="No knowledge base is active for the current project.",
-                                 source_collection="project")
+    query_cache = app_state["query_cache"]
+    cache_key = None
+    if request.query_embedding is None:  # Results for client-supplied vectors are not cached.
+        cache_key = query_cache.key(collection_name_for_log, request.query_text, request.n_results, request.dedupe,
+                                    request.max_chars, request.mode, _filter_key(request))
+        hits = query_cache.get(cache_key)
+        if hits is not None:
+            return _respond(http_request, QueryResponse(context=_format_context(hits, collection_name_for_log),
+                                                        source_collection=collection_name_for_log, hits=hits))
 
     try:
-        query_embedding = embedding_model.encode(request.query_text).tolist()
-        results = collection_to_query.query(
-            query_embeddings=[query_embedding],
-            n_results=request.n_results,
-            include=['documents', 'metadatas']
-        )
-        documents = results.get('documents', [[]])[0]
-        metadatas_list = results.get('metadatas', [[]])[0] if results.get('metadatas') else [{} for _ in documents]
-
-        if not documents:
-            return QueryResponse(context=f"No relevant documents found in {collection_name_for_log} knowledge base.",
-                                 source_collection=collection_name_for_log)
-
-        context_parts = []
-        for i, doc_content in enumerate(documents):
-            source_file = "Unknown Source"
-            if i < len(metadatas_list) and metadatas_list[i] is not None and 'source' in metadatas_list[i]:
-                source_file = metadatas_list[i]['source']
-            context_parts.append(f"--- Relevant Snippet from {source_file} ---\n{doc_content}")
-
-        return QueryResponse(context="\n\n".join(context_parts).strip(), source_collection=collection_name_for_log)
+        where, allowed_ids = await _resolve_filters(collection_to_query, collection_name_for_log, request)
+        if allowed_ids is not None and not allowed_ids:
+            hits = []
+        elif request.mode != "vector":
+            hits = await _ranked_query(collection_to_query, collection_name_for_log, request, where, allowed_ids)
+        else:
+            query_embedding = await _query_vector(request)
+            results = await _vector_query(collection_to_query, collection_name_for_log, [query_embedding],
+                                          _fetch_count(request.n_results, request.dedupe, bool(request.boosts)),
+                                          where=where, allowed_ids=allowed_ids)
+            ids = results.get('ids', [[]])[0]
+            documents = results.get('documents', [[]])[0]
+            metadatas_list = results.get('metadatas', [[]])[0] if results.get('metadatas') else [{} for _ in documents]
+            distances = results.get('distances', [[]])[0] if results.get('distances') else None
+            scores = None
+            if request.boosts:
+                ids, documents, metadatas_list, distances, scores = _apply_boosts(ids, documents, metadatas_list,
+                                                                                  distances, request.boosts)
+            hits = _build_hits(ids, documents, metadatas_list, distances,
+                               request.n_results, request.dedupe, request.max_chars, scores)
+        if cache_key is not None:
+            query_cache.put(cache_key, hits)
+        return _respond(http_request, QueryResponse(context=_format_context(hits, collection_name_for_log),
+                                                    source_collection=collection_name_for_log, hits=hits))
+    except HTTPException:
+        raise
     except Exception as e:
+        if request.where and isinstance(e, (ValueError, chromadb.errors.ChromaError)):
+            raise HTTPException(status_code=400, detail=f"Invalid where clause: {e}")
         rag_logger.error(f"ERROR during query of '{collection_name_for_log}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@rag_app.post("/query_batch", response_model=BatchQueryResponse)
+async def query_rag_batch(request: BatchQueryRequest) -> BatchQueryResponse:
+    """
+    Answers several query texts against several collections in one round trip.
+    Each distinct query text is embedded at most once and each collection is searched at
+    most once; results already in the query cache skip both.
+    """
+    if not app_state.get("embedding_pool"):
+        raise HTTPException(status_code=503, detail="Embedding model not loaded.")
+    if not request.query_texts:
+        return BatchQueryResponse(results=[])
+
+    try:
+        unique_texts = list(dict.fromkeys(request.query_texts))
+        query_cache = app_state["query_cache"]
+        # Resolve cache hits first so only texts missing from some collection get embedded.
+        targets = []
+        for target_collection in dict.fromkeys(request.target_collections):
+            collection, collection_name, inactive_message = _get_query_collection(target_collection)
+            cached = {}
+            if collection:
+                for text in unique_texts:
+                    cache_key = query_cache.key(collection_name, text, request.n_results, request.dedupe,
+                                                request.max_chars, "vector")
+                    cached[text] = (cache_key, query_cache.get(cache_key))
+            targets.append((collection, collection_name, inactive_message, cached))
+
+        texts_to_embed = list(dict.fromkeys(text for collection, _, _, cached in targets if collection
+                                            for text, (_, hits) in cached.items() if hits is None))
+        embeddings_by_text = {}
+        if texts_to_embed:
+            embeddings_by_text = dict(zip(texts_to_embed,
+                                          (await _embed_texts(texts_to_embed, QUERY_PRIORITY)).tolist()))
+
+        results = []
+        for collection, collection_name, inactive_message, cached in targets:
+            if not collection:
+                results.extend(BatchQueryResult(query_text=text, context=inactive_message,
+                                                source_collection=collection_name) for text in unique_texts)
+                continue
+            missing_texts = [text for text in unique_texts if cached[text][1] is None]
+            if missing_texts:
+                query_results = await _vector_query(collection, collection_name,
+                                                    [embeddings_by_text[text] for text in missing_texts],
+                                                    _fetch_count(request.n_results, request.dedupe))
+                all_documents = query_results.get('documents') or [[] for _ in missing_texts]
+                all_ids = query_results.get('ids') or [[] for _ in missing_texts]
+                all_metadatas = query_results.get('metadatas') or [[{} for _ in docs] for docs in all_documents]
+                all_distances = query_results.get('distances') or [None for _ in missing_texts]
+                for text, ids, documents, metadatas_list, distances in zip(missing_texts, all_ids, all_documents,
+                                                                           all_metadatas, all_distances):
+                    hits = _build_hits(ids, documents, metadatas_list, distances,
+                                       request.n_results, request.dedupe, request.max_chars)
+                    query_cache.put(cached[text][0], hits)
+                    cached[text] = (cached[text][0], hits)
+            for text in unique_texts:
+                hits = cached[text][1]
+                results.append(BatchQueryResult(query_text=text, context=_format_context(hits, collection_name),
+                                                source_collection=collection_name, hits=hits))
+        return BatchQueryResponse(results=results)
+    except Exception as e:
+        rag_logger.error(f"ERROR during batch query: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 if __name__ == "__main__":
+    # Embedding workers are spawned processes; a frozen (PyInstaller) build must not rerun the server in them.
+    multiprocessing.freeze_support()
     if not os.getenv("GLOBAL_RAG_DB_PATH"):
         rag_logger.warning("GLOBAL_RAG_DB_PATH not set. Global KB will be limited.")
     try:
@@ -3,6 +3,7 @@ from .action_service import ActionService
 from .app_state_service import AppStateService
 from .architect_service import ArchitectService
 from .chunking_service import ChunkingService
+from .coder_context_builder import CoderContextBuilder
 from .context_manager import ContextManager
 from .dependency_planner import DependencyPlanner
 from .directory_scanner_service import DirectoryScannerService
@@ -12,6 +13,7 @@ from .integration_validator import IntegrationValidator
 from .lsp_client_service import LSPClientService # <-- NEW
 from .project_analyzer import ProjectAnalyzer
 from .project_indexer_service import ProjectIndexerService
+from .project_watcher_service import ProjectWatcherService
 # from .rag_manager import RAGManager # <-- REMOVED to break circular import
 from .rag_service import RAGService
 from .reviewer_service import ReviewerService
@@ -23,6 +25,7 @@ __all__ = [
     "AppStateService",
     "ArchitectService",
     "ChunkingService",
+    "CoderContextBuilder",
     "ContextManager",
     "DependencyPlanner",
     "DirectoryScannerService",
@@ -32,6 +35,7 @@ __all__ = [
     "LSPClientService", # <-- NEW
     "ProjectAnalyzer",
     "ProjectIndexerService",
+    "ProjectWatcherService",
     # "RAGManager", # <-- REMOVED
     "RAGService",
     "ReviewerService",
@@ -28,6 +28,9 @@ if TYPE_CHECKING:
 
 
 class ArchitectService:
+    # Upper bound on snippet text fetched per knowledge base for planning prompts.
+    RAG_CONTEXT_CHAR_BUDGET = 6000
+
     def __init__(self, service_manager: 'ServiceManager', event_bus: EventBus,
                  llm_client: LLMClient, project_manager: ProjectManager,
                  rag_service: RAGService, project_indexer: ProjectIndexerService,
@@ -48,11 +51,13 @@ class ArchitectService:
         )
 
     async def _get_combined_rag_context(self, prompt: str) -> str:
-        project_rag_context = await self.rag_service.query(prompt, target_collection="project")
-        global_rag_context = await self.rag_service.query(prompt, target_collection="global")
-
-        valid_project_context = project_rag_context if "no relevant documents found" not in project_rag_context.lower() and "not running or is unreachable" not in project_rag_context.lower() else ""
-        valid_global_context = global_rag_context if "no relevant documents found" not in global_rag_context.lower() and "not running or is unreachable" not in global_rag_context.lower() else ""
+        results = await self.rag_service.query_batch([prompt], target_collections=["project", "global"],
+                                                     max_chars=self.RAG_CONTEXT_CHAR_BUDGET)
+        # Only results with hits carry snippets; the context of the rest is a status or error message.
+        contexts = {result.get("source_collection"): result.get("context", "") for result in results
+                    if result.get("hits")}
+        valid_project_context = contexts.get("project", "")
+        valid_global_context = contexts.get("global", "")
 
         combined_context_parts = []
         if valid_project_context:
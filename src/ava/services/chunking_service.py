@@ -1,27 +1,48 @@
 # src/ava/services/chunking_service.py
+import ast
+import bisect
+import hashlib
 import re
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+# Stored as the `language` metadata field so queries can be restricted to one language.
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python', '.js': 'javascript', '.ts': 'typescript', '.html': 'html', '.css': 'css',
+    '.md': 'markdown', '.txt': 'text', '.json': 'json', '.toml': 'toml', '.rst': 'rst',
+    '.java': 'java', '.c': 'c', '.cpp': 'cpp', '.cs': 'csharp', '.go': 'go', '.rb': 'ruby',
+}
 
 
 class ChunkingService:
     """
     Smart chunking service for breaking documents into optimal pieces for RAG.
     Handles Python code, text files, and other document types with specific logic.
+
+    Python files are chunked per symbol using `ast` by default (one chunk per function or
+    class, large classes split by method) with line ranges, qualified names and imports in
+    the metadata. Files that don't parse fall back to the regex block splitter.
+
+    Every chunk also records its `language`, and, when the caller passes the root it
+    ingests from, its `rel_path`, `directory` and `top_directory` for filtered queries.
     """
 
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 150):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 150, use_python_ast: bool = True):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.use_python_ast = use_python_ast
         print("[ChunkingService] Initialized.")
 
-    def chunk_document(self, content: str, file_path_str: str) -> List[Dict[str, Any]]:
+    def chunk_document(self, content: str, file_path_str: str,
+                       base_path: Optional[Path] = None) -> List[Dict[str, Any]]:
         """
         Chunks a document into optimal pieces based on file type.
 
         Args:
             content: The document content as a string.
             file_path_str: The string path to the file, used to determine file type.
+            base_path: Optional root the file is ingested from (e.g. the project root),
+                used for the path metadata.
 
         Returns:
             A list of chunk dictionaries, ready for embedding.
@@ -40,47 +61,161 @@ class ChunkingService:
         else:
             chunks = self._chunk_generic_text(content, file_path)
 
+        path_metadata = self._path_metadata(file_path, base_path)
+        for chunk in chunks:
+            chunk['metadata'].update(path_metadata)
+        self._assign_chunk_ids(chunks, path_metadata.get('rel_path') or file_path.resolve().as_posix())
+
         print(f"[ChunkingService] Chunked '{file_path.name}' into {len(chunks)} pieces.")
         return chunks
 
-    def _get_unique_file_prefix(self, file_path: Path) -> str:
-        """Creates a sanitized, unique prefix from a file path to avoid ID collisions."""
-        # Using the last 4 parts of the path is a good compromise for uniqueness and readability.
-        # e.g., '.../src/ava/utils.py' -> 'src_ava_utils'
-        relevant_parts = file_path.parts[-4:]
-        sanitized_path = "_".join(relevant_parts)
-        # Remove common extensions and sanitize remaining dots.
-        # This handles cases like 'file.tar.gz' by just removing the final suffix.
-        return sanitized_path.replace(file_path.suffix, '').replace('.', '_')
+    @staticmethod
+    def _path_metadata(file_path: Path, base_path: Optional[Path]) -> Dict[str, str]:
+        """Language and project-relative location of a file, as flat (filterable) metadata."""
+        metadata = {'language': LANGUAGE_BY_EXTENSION.get(file_path.suffix.lower(), 'text')}
+        if base_path is not None:
+            try:
+                relative = file_path.relative_to(base_path)
+            except ValueError:
+                return metadata
+            directory = relative.parent.as_posix()
+            metadata['rel_path'] = relative.as_posix()
+            metadata['directory'] = "" if directory == "." else directory
+            metadata['top_directory'] = relative.parts[0] if len(relative.parts) > 1 else ""
+        return metadata
+
+    @staticmethod
+    def _assign_chunk_ids(chunks: List[Dict[str, Any]], path_key: str):
+        """
+        Gives every chunk a stable ID: the file's key plus a hash of the chunk's text, with an
+        occurrence number for repeated text. Re-chunking an unchanged span yields the same ID even
+        if it moved, so re-ingestion can skip it, and IDs of different files can never collide.
+        """
+        occurrences: Dict[str, int] = {}
+        for chunk in chunks:
+            span_hash = hashlib.sha1(chunk['content'].encode('utf-8', errors='ignore')).hexdigest()[:16]
+            occurrence = occurrences.get(span_hash, 0)
+            occurrences[span_hash] = occurrence + 1
+            chunk['id'] = f"{path_key}#{span_hash}" + (f"-{occurrence}" if occurrence else "")
 
     def _chunk_python_code(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
+        """Chunks Python code per symbol via `ast`, falling back to regex blocks if it doesn't parse."""
+        if self.use_python_ast:
+            try:
+                return self._chunk_python_ast(content, file_path)
+            except (SyntaxError, ValueError):
+                pass
+        return self._chunk_python_blocks(content, file_path)
+
+    def _chunk_python_ast(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
+        """
+        Emits one chunk per top-level function/class. Classes larger than the chunk size
+        are split into a chunk per method plus chunks for the remaining class body.
+        Module-level code between definitions (imports, constants, comments) is grouped.
+        """
+        tree = ast.parse(content)
+        # Break lines where ast does (\n, \r\n, \r); str.splitlines also breaks on \f, \x1c, \u2028...
+        line_offsets = [0] + [match.end() for match in re.finditer(r'\r\n|\r|\n', content)]
+        if line_offsets[-1] < len(content):
+            line_offsets.append(len(content))
+        line_count = len(line_offsets) - 1
+
+        imports = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imports.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                imports.add('.' * node.level + (node.module or ''))
+        imports_str = ",".join(sorted(imports))
+
+        chunks: List[Dict[str, Any]] = []
+
+        def emit(start_line: int, end_line: int, kind: str, symbol: str):
+            start_char, end_char = line_offsets[start_line - 1], line_offsets[end_line]
+            text = content[start_char:end_char]
+            if not text.strip():
+                return
+            pieces = [text] if len(text) <= self.chunk_size else self._split_text_by_size(text)
+            for i, piece in enumerate(pieces):
+                piece_start = start_char + i * (self.chunk_size - self.chunk_overlap)
+                piece_end = piece_start + len(piece)
+                chunks.append(self._create_chunk(
+                    piece,
+                    file_path=file_path,
+                    start_char=piece_start,
+                    end_char=piece_end,
+                    extra_metadata={
+                        'kind': kind,
+                        'symbol': symbol,
+                        'start_line': bisect.bisect_right(line_offsets, piece_start),
+                        'end_line': bisect.bisect_left(line_offsets, piece_end),
+                        'imports': imports_str
+                    }
+                ))
+
+        def emit_body(body: List[ast.stmt], start_line: int, end_line: int, gap_kind: str, gap_symbol: str,
+                      parent: Optional[str]):
+            """Emits each definition in `body` and groups the code between them."""
+            position = start_line
+            for node in body:
+                if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    continue
+                node_start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                if node_start > position:
+                    emit(position, node_start - 1, gap_kind, gap_symbol)
+                qualified_name = f"{parent}.{node.name}" if parent else node.name
+                node_end = node.end_lineno
+                if isinstance(node, ast.ClassDef):
+                    if parent is None and line_offsets[node_end] - line_offsets[node_start - 1] > self.chunk_size:
+                        emit_body(node.body, node_start, node_end, 'class', qualified_name, qualified_name)
+                    else:
+                        emit(node_start, node_end, 'class', qualified_name)
+                else:
+                    kind = 'method' if parent else 'function'
+                    if isinstance(node, ast.AsyncFunctionDef):
+                        kind = f"async_{kind}"
+                    emit(node_start, node_end, kind, qualified_name)
+                position = node_end + 1
+            if position <= end_line:
+                emit(position, end_line, gap_kind, gap_symbol)
+
+        emit_body(tree.body, 1, line_count, 'module', file_path.stem, None)
+        return chunks
+
+    def _chunk_python_blocks(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
         """Smart chunking for Python code files by splitting into logical blocks."""
         chunks = []
         code_blocks = self._extract_python_blocks(content)
         current_chunk_content = ""
-        current_chunk_id_counter = 0
-        file_prefix = self._get_unique_file_prefix(file_path)
+        current_chunk_start = 0
+        current_chunk_end = 0
 
         for block in code_blocks:
             # If adding the next block would exceed the chunk size, process the current chunk
             if len(current_chunk_content) + len(block['content']) > self.chunk_size and current_chunk_content:
                 chunks.append(self._create_chunk(
                     current_chunk_content,
-                    chunk_id=f"{file_prefix}_code_{current_chunk_id_counter}",
-                    file_path=file_path
+                    file_path=file_path,
+                    start_char=current_chunk_start,
+                    end_char=current_chunk_end
                 ))
-                current_chunk_id_counter += 1
                 # Start the new chunk with an overlap from the previous one
-                current_chunk_content = self._get_overlap_content(current_chunk_content) + block['content']
+                overlap = self._get_overlap_content(current_chunk_content)
+                current_chunk_start = max(0, current_chunk_end - len(overlap))
+                current_chunk_content = overlap + block['content']
             else:
+                if not current_chunk_content:
+                    current_chunk_start = block['start']
                 current_chunk_content += block['content'] + '\n\n'  # Add separation
+            current_chunk_end = block['start'] + len(block['content'])
 
         # Add the final remaining chunk
         if current_chunk_content.strip():
             chunks.append(self._create_chunk(
                 current_chunk_content.strip(),
-                chunk_id=f"{file_prefix}_code_{current_chunk_id_counter}",
-                file_path=file_path
+                file_path=file_path,
+                start_char=current_chunk_start,
+                end_char=current_chunk_end
             ))
 
         return chunks
@@ -93,6 +228,7 @@ class ChunkingService:
         raw_blocks = block_delimiters.split(content)
 
         structured_blocks = []
+        offset = 0
         for block in raw_blocks:
             if block.strip():
                 block_type = "unknown"
@@ -100,19 +236,21 @@ class ChunkingService:
                     block_type = "class"
                 elif block.strip().startswith("def"):
                     block_type = "function"
-                structured_blocks.append({"content": block, "type": block_type})
+                structured_blocks.append({"content": block, "type": block_type, "start": offset})
+            offset += len(block) + 1  # +1 for the newline consumed by the split
 
         return structured_blocks
 
     def _chunk_markdown_text(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
         """Smart chunking for Markdown by splitting on headers."""
         chunks = []
-        file_prefix = self._get_unique_file_prefix(file_path)
         # Split by major headers (## or #)
         sections = re.split(r'\n(?=#{1,2} )', content)
-        section_id_counter = 0
+        offset = 0
 
         for section in sections:
+            section_start = offset
+            offset += len(section) + 1  # +1 for the newline consumed by the split
             if not section.strip():
                 continue
 
@@ -120,32 +258,35 @@ class ChunkingService:
             if len(section) <= self.chunk_size:
                 chunks.append(self._create_chunk(
                     section,
-                    chunk_id=f"{file_prefix}_section_{section_id_counter}",
-                    file_path=file_path
+                    file_path=file_path,
+                    start_char=section_start,
+                    end_char=section_start + len(section)
                 ))
             else:
                 # If the section is too large, fall back to generic splitting
                 sub_chunks = self._split_text_by_size(section)
                 for i, sub_chunk in enumerate(sub_chunks):
+                    sub_start = section_start + i * (self.chunk_size - self.chunk_overlap)
                     chunks.append(self._create_chunk(
                         sub_chunk,
-                        chunk_id=f"{file_prefix}_section_{section_id_counter}_part_{i}",
-                        file_path=file_path
+                        file_path=file_path,
+                        start_char=sub_start,
+                        end_char=sub_start + len(sub_chunk)
                     ))
-            section_id_counter += 1
 
         return chunks
 
     def _chunk_generic_text(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
         """Generic text chunking by size for any other file type."""
         chunks = []
-        file_prefix = self._get_unique_file_prefix(file_path)
         text_chunks = self._split_text_by_size(content)
         for i, chunk_text in enumerate(text_chunks):
+            chunk_start = i * (self.chunk_size - self.chunk_overlap)
             chunks.append(self._create_chunk(
                 chunk_text,
-                chunk_id=f"{file_prefix}_generic_{i}",
-                file_path=file_path
+                file_path=file_path,
+                start_char=chunk_start,
+                end_char=chunk_start + len(chunk_text)
             ))
         return chunks
 
@@ -166,13 +307,22 @@ class ChunkingService:
             return content
         return content[-self.chunk_overlap:]
 
-    def _create_chunk(self, content: str, chunk_id: str, file_path: Path) -> Dict[str, Any]:
+    def _create_chunk(self, content: str, file_path: Path,
+                      start_char: Optional[int] = None, end_char: Optional[int] = None,
+                      extra_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Creates a standardized chunk dictionary."""
+        metadata = {
+            'source': file_path.name,
+            'full_path': str(file_path)
+        }
+        if start_char is not None and end_char is not None:
+            # Character span of the chunk within the original file, used for overlap detection.
+            metadata['start_char'] = start_char
+            metadata['end_char'] = end_char
+        if extra_metadata:
+            metadata.update(extra_metadata)
         return {
-            'id': chunk_id,
+            'id': None,  # Assigned by `_assign_chunk_ids` once the file is fully chunked.
             'content': content.strip(),
-            'metadata': {
-                'source': file_path.name,
-                'full_path': str(file_path)
-            }
-        }
\ No newline at end of file
+            'metadata': metadata
+        }
@@ -0,0 +1,208 @@
+# src/ava/services/coder_context_builder.py
+import ast
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+from src.ava.utils.code_summarizer import CodeSummarizer
+
+SUMMARY_MARKER = "# [Signatures only. The full source was left out to fit the prompt budget.]"
+OMITTED_MARKER = "# [Omitted to fit the prompt budget. This file exists; see the Project Symbol Index.]"
+
+
+@dataclass
+class CoderContext:
+    """The budgeted context sections of a coder prompt and how they were chosen."""
+    file_plan_json: str
+    symbol_index_json: str
+    code_context_json: str
+    full_files: List[str] = field(default_factory=list)
+    summarized_files: List[str] = field(default_factory=list)
+    omitted_files: List[str] = field(default_factory=list)
+    estimated_tokens: int = 0
+
+
+class CoderContextBuilder:
+    """
+    Builds the plan, symbol index and code context sections of a coder prompt within a
+    token budget, instead of pasting every file in full. Other project files are ranked by
+    relevance to the target file (its imports, the planned dependency graph, symbol
+    references, shared package); the top few are included in full and the rest as
+    CodeSummarizer signatures, for as long as they fit.
+    """
+    # Budget for the sections built here plus the original code; the fixed prompt text comes on top.
+    TOKEN_BUDGET = 24000
+    # Rough average for code and JSON; close enough for budgeting without a tokenizer.
+    CHARS_PER_TOKEN = 4
+    MAX_FULL_FILES = 5
+    # Largest share of the budget the symbol index may use before it's trimmed to ranked modules.
+    SYMBOL_INDEX_SHARE = 0.2
+
+    DEPENDENCY_WEIGHT = 10.0
+    IMPORT_WEIGHT = 8.0
+    DEPENDENT_WEIGHT = 4.0
+    MENTION_WEIGHT = 3.0
+    SYMBOL_WEIGHT = 1.5
+    MAX_SYMBOL_REFERENCES = 5
+    SAME_PACKAGE_WEIGHT = 1.0
+    IMPORT_CACHE_SIZE = 1024
+
+    def __init__(self, token_budget: int = TOKEN_BUDGET, max_full_files: int = MAX_FULL_FILES):
+        self.token_budget = token_budget
+        self.max_full_files = max_full_files
+        # (path, content hash) -> imported modules, so files are parsed once without keeping their sources.
+        self._import_cache: "OrderedDict[Tuple[str, str], frozenset]" = OrderedDict()
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        return -(-len(text) // cls.CHARS_PER_TOKEN)
+
+    @staticmethod
+    def module_path(filename: str) -> str:
+        """Same module naming the project indexer uses for the symbol index."""
+        return filename.replace('.py', '').replace('/', '.')
+
+    def _imported_modules(self, filename: str, source: str) -> frozenset:
+        key = (filename, hashlib.sha256(source.encode('utf-8', errors='ignore')).hexdigest())
+        modules = self._import_cache.get(key)
+        if modules is None:
+            modules = self._parse_imports(source)
+            self._import_cache[key] = modules
+            if len(self._import_cache) > self.IMPORT_CACHE_SIZE:
+                self._import_cache.popitem(last=False)
+        else:
+            self._import_cache.move_to_end(key)
+        return modules
+
+    @staticmethod
+    def _parse_imports(source: str) -> frozenset:
+        """Dotted names a file imports, including `package.name` for `from package import name`."""
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            return frozenset()
+        modules = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ""
+                if base:
+                    modules.add(base)
+                modules.update(f"{base}.{alias.name}" if base else alias.name for alias in node.names)
+        return frozenset(modules)
+
+    @staticmethod
+    def _imports_module(imports: Iterable[str], module: str) -> bool:
+        # Matches absolute imports and ones rooted lower in the tree (e.g. relative or from `src`).
+        return any(name == module or name.endswith("." + module) or module.endswith("." + name)
+                   for name in imports)
+
+    def rank_files(self, filename: str, purpose: str, original_code: str, files: Dict[str, str],
+                   project_index: Dict[str, str], dependencies: Set[str] = frozenset(),
+                   dependents: Set[str] = frozenset()) -> List[Tuple[str, float]]:
+        """Scores every other file by relevance to `filename`, most relevant first."""
+        target_module = self.module_path(filename)
+        target_imports = self._imported_modules(filename, original_code) if original_code else frozenset()
+        mentioned_words = set(re.findall(r'[A-Za-z_][A-Za-z0-9_]*', f"{purpose}\n{original_code}"))
+        purpose_lower = purpose.lower()
+        target_package = PurePosixPath(filename).parent
+
+        symbols_by_module: Dict[str, Set[str]] = {}
+        for symbol, module in project_index.items():
+            symbols_by_module.setdefault(module, set()).add(symbol)
+
+        ranked = []
+        for other, content in files.items():
+            module = self.module_path(other)
+            score = 0.0
+            if other in dependencies:
+                score += self.DEPENDENCY_WEIGHT
+            if other.endswith('.py') and self._imports_module(target_imports, module):
+                score += self.IMPORT_WEIGHT
+            if other in dependents or (other.endswith('.py')
+                                       and self._imports_module(self._imported_modules(other, content), target_module)):
+                score += self.DEPENDENT_WEIGHT
+            if PurePosixPath(other).stem.lower() in purpose_lower:
+                score += self.MENTION_WEIGHT
+            references = len(symbols_by_module.get(module, set()) & mentioned_words)
+            score += self.SYMBOL_WEIGHT * min(references, self.MAX_SYMBOL_REFERENCES)
+            if PurePosixPath(other).parent == target_package:
+                score += self.SAME_PACKAGE_WEIGHT
+            ranked.append((other, score))
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+    def _budget_symbol_index(self, project_index: Dict[str, str], ranked: List[Tuple[str, float]],
+                             budget_chars: int) -> str:
+        full_index = json.dumps(project_index)
+        if len(full_index) <= budget_chars:
+            return full_index
+        # Keep whole modules, most relevant first, so the coder never sees half a module's API.
+        module_order = {self.module_path(name): i for i, (name, _) in enumerate(ranked)}
+        symbols_by_module: Dict[str, Dict[str, str]] = {}
+        for symbol, module in project_index.items():
+            symbols_by_module.setdefault(module, {})[symbol] = module
+        trimmed, used = {}, 2
+        for module in sorted(symbols_by_module, key=lambda name: (module_order.get(name, len(module_order)), name)):
+            module_chars = len(json.dumps(symbols_by_module[module]))
+            if used + module_chars > budget_chars:
+                continue
+            trimmed.update(symbols_by_module[module])
+            used += module_chars
+        return json.dumps(trimmed)
+
+    def build(self, filename: str, purpose: str, plan: Dict[str, Any], project_index: Dict[str, str],
+              files: Dict[str, str], original_code: str = "", dependencies: Optional[Set[str]] = None,
+              dependents: Optional[Set[str]] = None) -> CoderContext:
+        """
+        Args:
+            files: Other project files (existing and generated this session), path -> source.
+            original_code: Source of the target file when it's being modified.
+            dependencies, dependents: The target's neighbours in the planned dependency graph.
+        """
+        budget_chars = self.token_budget * self.CHARS_PER_TOKEN
+        ranked = self.rank_files(filename, purpose, original_code, files, project_index,
+                                 dependencies or set(), dependents or set())
+
+        file_plan_json = json.dumps(plan)
+        symbol_index_json = self._budget_symbol_index(project_index, ranked,
+                                                      int(budget_chars * self.SYMBOL_INDEX_SHARE))
+        remaining = budget_chars - len(file_plan_json) - len(symbol_index_json) - len(original_code)
+
+        code_context: Dict[str, str] = {}
+        full_files, summarized_files, omitted_files = [], [], []
+        for rank, (other, _) in enumerate(ranked):
+            content = files[other]
+            entry_overhead = len(json.dumps(other)) + 5
+            if rank < self.max_full_files:
+                cost = len(json.dumps(content)) + entry_overhead
+                if cost <= remaining:
+                    code_context[other] = content
+                    full_files.append(other)
+                    remaining -= cost
+                    continue
+            if other.endswith('.py'):
+                summary = f"{SUMMARY_MARKER}\n{CodeSummarizer(content).summarize()}"
+                cost = len(json.dumps(summary)) + entry_overhead
+                if cost <= remaining:
+                    code_context[other] = summary
+                    summarized_files.append(other)
+                    remaining -= cost
+                    continue
+            omitted_files.append(other)
+            cost = len(json.dumps(OMITTED_MARKER)) + entry_overhead
+            if cost <= remaining:
+                code_context[other] = OMITTED_MARKER
+                remaining -= cost
+
+        code_context_json = json.dumps(code_context, indent=1)
+        estimated_tokens = self.estimate_tokens(file_plan_json + symbol_index_json + code_context_json + original_code)
+        return CoderContext(file_plan_json=file_plan_json, symbol_index_json=symbol_index_json,
+                            code_context_json=code_context_json, full_files=full_files,
+                            summarized_files=summarized_files, omitted_files=omitted_files,
+                            estimated_tokens=estimated_tokens)
@@ -5,6 +5,9 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Set
 from dataclasses import dataclass
 
+# Header the RAG server puts in front of every snippet in a formatted context string.
+RAG_SNIPPET_HEADER = "--- Relevant Snippet from"
+
 
 @dataclass
 class GenerationContext:
@@ -138,7 +141,7 @@ class ContextManager:
                 score = self._calculate_text_relevance(module_content, plan_keywords)
                 relevance_scores[f"project_index:{module_name}"] = score
             if rag_context:
-                rag_chunks = rag_context.split("--- Relevant Document Snippet")
+                rag_chunks = rag_context.split(RAG_SNIPPET_HEADER)
                 for i, chunk in enumerate(rag_chunks):
                     if chunk.strip():
                         score = self._calculate_text_relevance(chunk, plan_keywords)
@@ -227,7 +230,7 @@ class ContextManager:
     def _filter_rag_context(self, filename: str, rag_context: str) -> str:
         try:
             if not rag_context: return ""
-            chunks = rag_context.split("--- Relevant Document Snippet")
+            chunks = rag_context.split(RAG_SNIPPET_HEADER)
             relevant_chunks = []
             file_stem = Path(filename).stem.lower()
             for chunk in chunks:
@@ -1,23 +1,44 @@
 # src/ava/services/generation_coordinator.py
+import asyncio
 import json
+import os
 import re
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional
 import textwrap
 from pathlib import Path
 
 from src.ava.core.event_bus import EventBus
 from src.ava.prompts import CODER_PROMPT, SIMPLE_FILE_PROMPT
+from src.ava.services.coder_context_builder import CoderContextBuilder
 
 
 class GenerationCoordinator:
+    # Opt-in parallel mode (AVA_PARALLEL_GENERATION=1): the topological order is walked in waves,
+    # and every file whose dependencies are already written is streamed concurrently, up to the
+    # limit of the coder's provider (AVA_GENERATION_CONCURRENCY, default 4).
+    PARALLEL_GENERATION = os.getenv("AVA_PARALLEL_GENERATION", "0") == "1"
+    DEFAULT_PROVIDER_CONCURRENCY = int(os.getenv("AVA_GENERATION_CONCURRENCY", "4"))
+    # Local models serve one request at a time, so concurrent streams would only queue up.
+    PROVIDER_CONCURRENCY = {"ollama": 1}
+
     def __init__(self, service_manager, event_bus: EventBus, context_manager,
-                 dependency_planner, integration_validator):
+                 dependency_planner, integration_validator, parallel: Optional[bool] = None,
+                 provider_concurrency: Optional[Dict[str, int]] = None):
         self.service_manager = service_manager
         self.event_bus = event_bus
         self.context_manager = context_manager
         self.dependency_planner = dependency_planner
         self.integration_validator = integration_validator
         self.llm_client = service_manager.get_llm_client()
+        self.parallel = self.PARALLEL_GENERATION if parallel is None else parallel
+        self.provider_concurrency = {**self.PROVIDER_CONCURRENCY, **(provider_concurrency or {})}
+        self._provider_slots: Dict[str, asyncio.Semaphore] = {}
+        self.context_builder = CoderContextBuilder()
+        # filename -> (dependencies, dependents) from the current plan, for ranking prompt context.
+        self._dependency_graph: Dict[str, Any] = {}
+        # filename -> estimated tokens of the last coder prompt built for it.
+        self.prompt_sizes: Dict[str, int] = {}
 
     async def coordinate_generation(self, plan: Dict[str, Any], rag_context: str,
                                     existing_files: Optional[Dict[str, str]]) -> Dict[str, str]:
@@ -26,9 +47,15 @@ class GenerationCoordinator:
             context = await self.context_manager.build_generation_context(plan, rag_context, existing_files)
             generation_specs = await self.dependency_planner.plan_generation_order(context)
             generation_order = [spec.filename for spec in generation_specs]
+            self._dependency_graph = {spec.filename: (spec.dependencies, spec.dependents)
+                                      for spec in generation_specs}
             generated_files_this_session = {}
             total_files = len(generation_order)
 
+            if self.parallel and total_files > 1:
+                await self._generate_in_waves(plan, generation_specs, context, generated_files_this_session)
+                return generated_files_this_session
+
             for i, filename in enumerate(generation_order):
                 self.event_bus.emit("agent_status_changed", "Coder", f"Writing {filename}...", "fa5s.keyboard")
                 self.log("info", f"Generating file {i + 1}/{total_files}: {filename}")
@@ -64,6 +91,89 @@ class GenerationCoordinator:
             traceback.print_exc()
             return {}
 
+    @staticmethod
+    def _plan_waves(generation_specs: List[Any]) -> List[List[str]]:
+        """
+        Groups the topological order into waves of files that don't depend on each other.
+        A file lands one wave after its latest dependency; dependencies that come later in
+        the order (cycles the planner broke) are ignored, as in sequential mode.
+        """
+        position = {spec.filename: i for i, spec in enumerate(generation_specs)}
+        levels: Dict[str, int] = {}
+        waves: List[List[str]] = []
+        for i, spec in enumerate(generation_specs):
+            level = max((levels[dep] + 1 for dep in spec.dependencies
+                         if dep in levels and position[dep] < i), default=0)
+            levels[spec.filename] = level
+            if level == len(waves):
+                waves.append([])
+            waves[level].append(spec.filename)
+        return waves
+
+    def _concurrency_for(self, provider: Optional[str]) -> int:
+        return max(1, self.provider_concurrency.get(provider or "", self.DEFAULT_PROVIDER_CONCURRENCY))
+
+    def _provider_slot(self, provider: Optional[str]) -> asyncio.Semaphore:
+        key = provider or ""
+        if key not in self._provider_slots:
+            self._provider_slots[key] = asyncio.Semaphore(self._concurrency_for(provider))
+        return self._provider_slots[key]
+
+    async def _generate_in_waves(self, plan: Dict[str, Any], generation_specs: List[Any], context: Any,
+                                 generated_files_this_session: Dict[str, str]):
+        """
+        Parallel mode of `coordinate_generation`. Each file's prompt is built when it gets a
+        provider slot, from the rolling context at that moment, so files that wait for a slot
+        still see everything completed before them.
+        """
+        waves = self._plan_waves(generation_specs)
+        total_files = len(generation_specs)
+        provider, _ = self.llm_client.get_model_for_role("coder")
+        slot = self._provider_slot(provider)
+        file_infos = {f['filename']: f for f in plan['files']}
+        state = {"context": context, "completed": 0}
+        context_lock = asyncio.Lock()
+        started_at = time.monotonic()
+
+        async def generate(filename: str, file_number: int):
+            file_info = file_infos.get(filename)
+            if not file_info:
+                self.log("error", f"Could not find file info for {filename} in plan. Skipping.")
+                return
+            async with slot:
+                self.event_bus.emit("agent_status_changed", "Coder", f"Writing {filename}...", "fa5s.keyboard")
+                self.log("info", f"Generating file {file_number}/{total_files}: {filename}")
+                generated_content = await self._generate_single_file(
+                    file_info, state["context"], generated_files_this_session
+                )
+
+            async with context_lock:
+                if generated_content is not None:
+                    cleaned_content = self.robust_clean_llm_output(generated_content)
+                    generated_files_this_session[filename] = cleaned_content
+                    state["context"] = await self.context_manager.update_session_context(
+                        state["context"], {filename: cleaned_content})
+                else:
+                    self.log("error", f"Failed to generate content for {filename}.")
+                    generated_files_this_session[filename] = f"# ERROR: Failed to generate content for {filename}"
+                state["completed"] += 1
+                self.event_bus.emit("coordinated_generation_progress",
+                                    {"filename": filename, "completed": state["completed"], "total": total_files})
+
+        self.log("info", f"Generating {total_files} files in {len(waves)} wave(s), "
+                         f"up to {self._concurrency_for(provider)} at a time for '{provider}'.")
+        scheduled = 0
+        for wave_number, wave in enumerate(waves, 1):
+            if len(wave) > 1:
+                self.log("info", f"Wave {wave_number}/{len(waves)}: {len(wave)} independent files: {', '.join(wave)}")
+            # Files in a wave run concurrently, so each is numbered when scheduled, not when it starts.
+            await asyncio.gather(*(generate(filename, scheduled + i) for i, filename in enumerate(wave, 1)))
+            scheduled += len(wave)
+
+        self.log("success",
+                 f"✅ Unified generation complete: {len(generated_files_this_session)}/{total_files} files generated "
+                 f"in {time.monotonic() - started_at:.1f}s.")
+
     async def _generate_single_file(self, file_info: Dict[str, str], context: Any,
                                     generated_files_this_session: Dict[str, str]) -> Optional[str]:
         filename = file_info["filename"]
@@ -98,6 +208,7 @@ class GenerationCoordinator:
         filename = file_info["filename"]
         is_modification = filename in (context.existing_files or {})
         original_code_section = ""
+        original_code = ""
         if is_modification:
             original_code = context.existing_files.get(filename, "")
             original_code_section = textwrap.dedent(f"""
@@ -113,14 +224,26 @@ class GenerationCoordinator:
         if filename in full_code_context:
             del full_code_context[filename]
 
-        return CODER_PROMPT.format(
+        purpose = file_info.get("purpose", "Modify this file based on the user's request.")
+        dependencies, dependents = self._dependency_graph.get(filename, (set(), set()))
+        coder_context = self.context_builder.build(
+            filename, purpose, context.plan, context.project_index, full_code_context,
+            original_code=original_code, dependencies=dependencies, dependents=dependents
+        )
+        prompt = CODER_PROMPT.format(
             filename=filename,
-            purpose=file_info.get("purpose", "Modify this file based on the user's request."),
+            purpose=purpose,
             original_code_section=original_code_section,
-            file_plan_json=json.dumps(context.plan, indent=2),
-            symbol_index_json=json.dumps(context.project_index, indent=2),
-            code_context_json=json.dumps(full_code_context, indent=2),
+            file_plan_json=coder_context.file_plan_json,
+            symbol_index_json=coder_context.symbol_index_json,
+            code_context_json=coder_context.code_context_json,
         )
+        self.prompt_sizes[filename] = self.context_builder.estimate_tokens(prompt)
+        self.log("info", f"Coder prompt for {filename}: ~{self.prompt_sizes[filename]} tokens "
+                         f"({len(coder_context.full_files)} files in full, "
+                         f"{len(coder_context.summarized_files)} as signatures, "
+                         f"{len(coder_context.omitted_files)} omitted).")
+        return prompt
 
     def _build_simple_file_prompt(self, file_info: Dict[str, str], context: Any,
                                   generated_files_this_session: Dict[str, str]) -> str:
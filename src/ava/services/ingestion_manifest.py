@@ -0,0 +1,126 @@
+# src/ava/services/ingestion_manifest.py
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+@dataclass
+class ManifestEntry:
+    """What the project knowledge base knows about a single ingested file."""
+    size: int
+    mtime: float
+    content_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+    # Set when an upload failed part-way: chunk_ids may be partly in the collection,
+    # and the file is re-ingested on the next sync whatever its size and mtime.
+    dirty: bool = False
+
+
+class IngestionManifest:
+    """
+    Per-project record of every file ingested into the PROJECT knowledge base.
+    Stored inside the project's `rag_db` directory so it lives and dies with the
+    Chroma collection it describes.
+    """
+    DB_DIRECTORY_NAME = "rag_db"
+    FILE_NAME = "ingestion_manifest.json"
+    # Bumped when chunk IDs or metadata change, so existing projects are re-ingested once.
+    VERSION = 2
+
+    def __init__(self, project_root: Path):
+        self.project_root = project_root
+        self.manifest_path = project_root / self.DB_DIRECTORY_NAME / self.FILE_NAME
+        self.entries: Dict[str, ManifestEntry] = {}
+
+    @classmethod
+    def load(cls, project_root: Path) -> "IngestionManifest":
+        """Loads the manifest for a project, returning an empty one if missing or unreadable."""
+        manifest = cls(project_root)
+        if not manifest.manifest_path.exists():
+            return manifest
+        try:
+            data = json.loads(manifest.manifest_path.read_text(encoding='utf-8'))
+            if data.get("version") != cls.VERSION:
+                print(f"[IngestionManifest] Ignoring manifest with unknown version: {data.get('version')}")
+                return manifest
+            for rel_path, entry in data.get("files", {}).items():
+                manifest.entries[rel_path] = ManifestEntry(**entry)
+        except Exception as e:
+            print(f"[IngestionManifest] Could not read manifest at {manifest.manifest_path}: {e}")
+            manifest.entries = {}
+        return manifest
+
+    def save(self):
+        """Atomically writes the manifest to disk."""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": self.VERSION,
+            "files": {rel_path: asdict(entry) for rel_path, entry in sorted(self.entries.items())}
+        }
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(tmp_path, self.manifest_path)
+
+    def clear(self):
+        self.entries = {}
+
+    def is_empty(self) -> bool:
+        return not self.entries
+
+    def relative_key(self, file_path: Path) -> str:
+        return file_path.relative_to(self.project_root).as_posix()
+
+    def find_changes(self, file_paths: List[Path]) -> Tuple[List[Path], Dict[str, ManifestEntry]]:
+        """
+        Compares scanned files against the manifest using size and mtime only.
+
+        Returns:
+            A tuple of (candidate files whose size/mtime differ or are new,
+            manifest entries for files that no longer exist on disk).
+            Candidates still need a content-hash check before re-chunking.
+        """
+        candidates = []
+        seen = set()
+        for file_path in file_paths:
+            try:
+                rel_path = self.relative_key(file_path)
+                stat = file_path.stat()
+            except (ValueError, OSError):
+                continue
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if entry is None or entry.dirty or entry.size != stat.st_size or entry.mtime != stat.st_mtime:
+                candidates.append(file_path)
+
+        removed = {rel_path: entry for rel_path, entry in self.entries.items() if rel_path not in seen}
+        return candidates, removed
+
+    def find_path_changes(self, file_paths: List[Path]) -> Tuple[List[Path], Dict[str, ManifestEntry]]:
+        """
+        Like `find_changes`, but only considers the given paths, e.g. those reported by a
+        file watcher. Paths that no longer exist are returned as removed if they were ingested.
+        """
+        candidates = []
+        removed = {}
+        for file_path in file_paths:
+            try:
+                rel_path = self.relative_key(file_path)
+            except ValueError:
+                continue
+            entry = self.entries.get(rel_path)
+            try:
+                stat = file_path.stat()
+            except OSError:
+                if entry is not None:
+                    removed[rel_path] = entry
+                continue
+            if entry is None or entry.dirty or entry.size != stat.st_size or entry.mtime != stat.st_mtime:
+                candidates.append(file_path)
+        return candidates, removed
+
+    @staticmethod
+    def hash_content(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8', errors='ignore')).hexdigest()
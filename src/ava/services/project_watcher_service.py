@@ -0,0 +1,165 @@
+# src/ava/services/project_watcher_service.py
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from src.ava.services.directory_scanner_service import DirectoryScannerService
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    """Forwards watchdog events (raised on the observer thread) to the watcher."""
+    # Opened/closed events are ignored, otherwise reading files for ingestion would retrigger it.
+    # Directory "modified" events only mean a child changed, which is reported on its own.
+    FILE_EVENTS = {"created", "modified", "deleted", "moved"}
+    DIRECTORY_EVENTS = {"created", "deleted", "moved"}
+
+    def __init__(self, record: Callable[[str, bool], None]):
+        super().__init__()
+        self._record = record
+
+    def dispatch(self, event):
+        relevant_events = self.DIRECTORY_EVENTS if event.is_directory else self.FILE_EVENTS
+        if event.event_type not in relevant_events:
+            return
+        self._record(event.src_path, event.is_directory)
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self._record(dest_path, event.is_directory)
+
+
+class ProjectWatcherService:
+    """
+    Watches the active project's working tree and reports changed paths in debounced,
+    coalesced batches. Uses native file system events through `watchdog` when it is
+    installed, and falls back to a cheap periodic mtime/size poll otherwise.
+    """
+    # Quiet period after the last event before a batch is reported.
+    DEBOUNCE_SECONDS = 1.5
+    # Upper bound on how long a busy tree (e.g. a generation run) can delay a batch.
+    MAX_DELAY_SECONDS = 10.0
+    POLL_INTERVAL_SECONDS = 3.0
+
+    def __init__(self, on_changes: Callable[[Path, List[Path]], Awaitable[None]],
+                 scanner: DirectoryScannerService):
+        self.on_changes = on_changes
+        self.scanner = scanner
+        self.project_root: Optional[Path] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._observer = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._pending: Set[Path] = set()
+        self._first_pending_at = 0.0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        print("[ProjectWatcher] Initialized.")
+
+    def watch(self, project_root: Path):
+        """Starts watching `project_root`, replacing any previously watched project."""
+        self.stop()
+        self.project_root = project_root
+        self._loop = asyncio.get_running_loop()
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_WatchdogHandler(self._record_threadsafe), str(project_root), recursive=True)
+                self._observer.daemon = True
+                self._observer.start()
+                print(f"[ProjectWatcher] Watching '{project_root.name}' for changes (native events).")
+                return
+            except Exception as e:
+                print(f"[ProjectWatcher] Native watching unavailable ({e}); falling back to polling.")
+                self._observer = None
+        self._poll_task = asyncio.create_task(self._poll_loop(project_root))
+        print(f"[ProjectWatcher] Watching '{project_root.name}' for changes "
+              f"(polling every {self.POLL_INTERVAL_SECONDS:.0f}s).")
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._poll_task and not self._poll_task.done():
+            self._poll_task.cancel()
+        self._poll_task = None
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending.clear()
+        self.project_root = None
+
+    def _is_relevant(self, path: Path, is_directory: bool) -> bool:
+        try:
+            relative_parts = path.relative_to(self.project_root).parts
+        except (ValueError, TypeError):
+            return False
+        if any(part in self.scanner.ignore_dirs for part in relative_parts):
+            return False
+        return is_directory or path.suffix.lower() in self.scanner.supported_extensions
+
+    def _record_threadsafe(self, path_str: str, is_directory: bool):
+        loop = self._loop
+        if loop and not loop.is_closed():
+            loop.call_soon_threadsafe(self._record, Path(path_str), is_directory)
+
+    def _record(self, path: Path, is_directory: bool = False):
+        """Adds a changed path to the pending batch and (re)arms the debounce timer."""
+        if self.project_root is None or not self._is_relevant(path, is_directory):
+            return
+        now = time.monotonic()
+        if not self._pending:
+            self._first_pending_at = now
+        self._pending.add(path)
+        if self._flush_handle:
+            self._flush_handle.cancel()
+        delay = min(self.DEBOUNCE_SECONDS, max(0.0, self._first_pending_at + self.MAX_DELAY_SECONDS - now))
+        self._flush_handle = self._loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        if not self._pending or self.project_root is None:
+            return
+        paths = sorted(self._pending)
+        self._pending = set()
+        print(f"[ProjectWatcher] {len(paths)} changed path(s) in '{self.project_root.name}'.")
+        asyncio.create_task(self.on_changes(self.project_root, paths))
+
+    def _snapshot(self, project_root: Path) -> Dict[Path, Tuple[int, float]]:
+        """Size and mtime of every supported file, walked quietly for polling."""
+        snapshot = {}
+        for root, dirs, files in os.walk(project_root, topdown=True):
+            dirs[:] = [d for d in dirs if d not in self.scanner.ignore_dirs]
+            for file_name in files:
+                if Path(file_name).suffix.lower() not in self.scanner.supported_extensions:
+                    continue
+                file_path = Path(root) / file_name
+                try:
+                    stat = file_path.stat()
+                except OSError:
+                    continue
+                snapshot[file_path] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    async def _poll_loop(self, project_root: Path):
+        previous = await asyncio.to_thread(self._snapshot, project_root)
+        while True:
+            await asyncio.sleep(self.POLL_INTERVAL_SECONDS)
+            try:
+                current = await asyncio.to_thread(self._snapshot, project_root)
+            except Exception as e:
+                print(f"[ProjectWatcher] Poll of '{project_root.name}' failed: {e}")
+                continue
+            for path in current.keys() - previous.keys():
+                self._record(path)
+            for path in previous.keys() - current.keys():
+                self._record(path)
+            for path, signature in current.items():
+                if previous.get(path, signature) != signature:
+                    self._record(path)
+            previous = current
@@ -1,7 +1,11 @@
 # src/ava/services/rag_manager.py
 import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any  # Added for type hinting
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple  # Added for type hinting
 
 from PySide6.QtCore import QObject, Signal
 from PySide6.QtWidgets import QFileDialog, QMessageBox
@@ -9,6 +13,8 @@ from PySide6.QtWidgets import QFileDialog, QMessageBox
 from src.ava.services.rag_service import RAGService
 from src.ava.services.directory_scanner_service import DirectoryScannerService
 from src.ava.services.chunking_service import ChunkingService
+from src.ava.services.ingestion_manifest import IngestionManifest, ManifestEntry
+from src.ava.services.project_watcher_service import ProjectWatcherService
 from src.ava.core.event_bus import EventBus  # Added EventBus import
 
 
@@ -18,6 +24,14 @@ class RAGManager(QObject):
     """
     log_message = Signal(str, str, str)
 
+    # Number of chunks sent to the RAG server per /add request.
+    INGEST_BATCH_SIZE = 128
+    # Maximum number of chunked batches waiting for upload before chunking pauses.
+    INGEST_QUEUE_DEPTH = 4
+    # Threads that read and chunk files off the event loop, and how many files each may run ahead.
+    INGEST_WORKERS = min(4, os.cpu_count() or 1)
+    INGEST_READ_AHEAD_PER_WORKER = 2
+
     def __init__(self, event_bus: EventBus, project_root: Path):  # Added EventBus type hint
         super().__init__()
         self.event_bus = event_bus
@@ -26,12 +40,23 @@ class RAGManager(QObject):
         self.rag_service = RAGService()
         self.scanner = DirectoryScannerService()
         self.chunker = ChunkingService()
+        self._chunk_executor = ThreadPoolExecutor(max_workers=self.INGEST_WORKERS,
+                                                  thread_name_prefix="rag-chunker")
+        # Serializes full syncs and live updates so they never race on the manifest.
+        self._sync_lock = asyncio.Lock()
+        self.project_watcher = ProjectWatcherService(self.sync_changed_paths, self.scanner)
 
         self.log_message.connect(
             lambda src, type, msg: self.event_bus.emit("log_message_received", src, type, msg)
         )
         print("[RAGManager] Initialized for RAG service communication.")
 
+    async def close(self):
+        """Stops the project watcher and chunking workers and closes the RAG server session."""
+        self.project_watcher.stop()
+        self._chunk_executor.shutdown(wait=False, cancel_futures=True)
+        await self.rag_service.close()
+
     def set_project_manager(self, project_manager):  # Add type hint: project_manager: ProjectManager
         self.project_manager = project_manager
 
@@ -41,6 +66,8 @@ class RAGManager(QObject):
         success, msg = await self.rag_service.set_project_db(str(project_path))
         if success:
             self.log_message.emit("RAGManager", "success", "RAG project context switched successfully.")
+            # Keep the project KB in step with the working tree from now on.
+            self.project_watcher.watch(project_path)
         else:
             self.log_message.emit("RAGManager", "error", f"Failed to switch RAG project context: {msg}")
 
@@ -64,52 +91,189 @@ class RAGManager(QObject):
                                   f"User selected {len(file_paths_str)} file(s) to add to project KB.")
             path_objects = [Path(fp) for fp in file_paths_str]
             # Explicitly target "project" collection
-            asyncio.create_task(self.ingest_files(path_objects, target_collection="project"))
+            asyncio.create_task(self.ingest_files(path_objects, target_collection="project",
+                                                  base_path=self.project_manager.active_project_path))
+
+    def ingest_active_project(self, incremental: bool = True):
+        """
+        Ingests the source files of the currently active project into the PROJECT knowledge base.
 
-    def ingest_active_project(self):
-        """Ingests all source files from the currently active project into the PROJECT knowledge base."""
+        Args:
+            incremental: When True, only files that changed since the last ingestion are
+                re-chunked and re-embedded. When False, the collection is rebuilt from scratch.
+        """
         if not self.project_manager or not self.project_manager.active_project_path:
             self.log_message.emit("RAGManager", "error", "No active project to ingest into project KB.")
             return
         project_path = self.project_manager.active_project_path
+        mode = "incrementally syncing" if incremental else "fully re-ingesting"
         self.log_message.emit("RAGManager", "info",
-                              f"Ingesting all source files from active project '{project_path.name}' into PROJECT KB.")
-        files_to_ingest = self.scanner.scan(str(project_path))
-        if files_to_ingest:
-            # Explicitly target "project" collection
-            asyncio.create_task(self.ingest_files(files_to_ingest, target_collection="project"))
-        else:
-            self.log_message.emit("RAGManager", "warning", "No supported source files found in the project to ingest.")
+                              f"{mode.capitalize()} source files from active project '{project_path.name}' into PROJECT KB.")
+        asyncio.create_task(self.sync_project_knowledge(project_path, full_rebuild=not incremental))
+
+    async def sync_project_knowledge(self, project_path: Path, full_rebuild: bool = False):
+        """
+        Brings the PROJECT knowledge base in line with the files on disk using the
+        per-project ingestion manifest. Unchanged files are skipped, changed files are
+        re-chunked and their old chunks replaced, and chunks of deleted files are removed.
+        """
+        async with self._sync_lock:
+            try:
+                manifest = IngestionManifest.load(project_path)
+                if full_rebuild:
+                    success, message = await self.rag_service.reset_project_db()
+                    if not success:
+                        self.log_message.emit("RAGManager", "error", f"Could not reset project KB: {message}")
+                        return
+                    manifest.clear()
+
+                files_on_disk = self.scanner.scan(str(project_path))
+                candidates, removed = manifest.find_changes(files_on_disk)
+                if manifest.is_empty() and not full_rebuild:
+                    # Missing, unreadable or from an older VERSION: we don't know which chunks came
+                    # from these files, so remove them by path. Manually added knowledge is kept.
+                    if not await self._delete_chunks_for_paths(manifest, candidates):
+                        return
+                await self._apply_project_changes(manifest, candidates, removed, files_scanned=len(files_on_disk))
+            except Exception as e:
+                self.log_message.emit("RAGManager", "error", f"Project KB sync failed: {e}")
+
+    async def sync_changed_paths(self, project_path: Path, changed_paths: List[Path]):
+        """
+        Incrementally re-indexes only the given paths, as reported by the project watcher.
+        Directories are expanded to the files under them, both on disk and in the manifest,
+        so renamed or deleted folders are handled too. Projects that were never ingested
+        are left alone; the first ingestion is always an explicit user action.
+        """
+        async with self._sync_lock:
+            try:
+                manifest = IngestionManifest.load(project_path)
+                if manifest.is_empty():
+                    return
+                file_paths = set()
+                for path in changed_paths:
+                    if path.is_dir():
+                        file_paths.update(self.scanner.scan(str(path)))
+                    elif path.suffix.lower() in self.scanner.supported_extensions:
+                        file_paths.add(path)
+                    try:
+                        prefix = manifest.relative_key(path) + "/"
+                    except ValueError:
+                        continue
+                    file_paths.update(project_path / key for key in manifest.entries if key.startswith(prefix))
+
+                candidates, removed = manifest.find_path_changes(sorted(file_paths))
+                if candidates or removed:
+                    await self._apply_project_changes(manifest, candidates, removed,
+                                                      files_scanned=len(file_paths) - len(removed))
+            except Exception as e:
+                self.log_message.emit("RAGManager", "error", f"Live project KB update failed: {e}")
+
+    async def _delete_chunks_for_paths(self, manifest: IngestionManifest, file_paths: List[Path]) -> bool:
+        """Deletes every project chunk ingested from the given files, matched by path metadata."""
+        for start in range(0, len(file_paths), self.INGEST_BATCH_SIZE):
+            batch = file_paths[start:start + self.INGEST_BATCH_SIZE]
+            # Chunks from before `rel_path` existed only carry `full_path`.
+            where = {"$or": [{"full_path": {"$in": [str(path) for path in batch]}},
+                             {"rel_path": {"$in": [manifest.relative_key(path) for path in batch]}}]}
+            success, message = await self.rag_service.delete([], target_collection="project", where=where)
+            if not success:
+                self.log_message.emit("RAGManager", "error", f"Could not remove old chunks: {message}")
+                return False
+        return True
+
+    async def _apply_project_changes(self, manifest: IngestionManifest, candidates: List[Path],
+                                     removed: Dict[str, ManifestEntry], files_scanned: int):
+        """Re-chunks changed candidates, drops stale chunks and uploads new ones, then saves the manifest."""
+        stale_chunk_ids: List[str] = []
+        new_chunks: List[Dict[str, Any]] = []
+        updated_entries: Dict[str, ManifestEntry] = {}
+        changed_paths: List[str] = []
+        previous_entries = {path: manifest.entries.get(manifest.relative_key(path)) for path in candidates}
+        # Dirty entries are always re-chunked, even if the content hash still matches.
+        previous_hashes = {path: entry.content_hash if entry and not entry.dirty else None
+                           for path, entry in previous_entries.items()}
+        async for file_path, result in self._map_files_in_pool(
+                lambda path: self._read_hash_and_chunk(path, previous_hashes[path], manifest.project_root),
+                candidates):
+            rel_path = manifest.relative_key(file_path)
+            if isinstance(result, Exception):
+                self.log_message.emit("RAGManager", "warning", f"Failed to read or chunk {rel_path}: {result}")
+                continue
+
+            stat, content_hash, chunks = result
+            previous = manifest.entries.get(rel_path)
+            if chunks is None:
+                # Touched but not modified; just remember the new size/mtime.
+                updated_entries[rel_path] = ManifestEntry(stat.st_size, stat.st_mtime, content_hash,
+                                                          previous.chunk_ids)
+                continue
+
+            if previous:
+                # Chunk IDs are stable per span, so only spans that no longer exist are deleted;
+                # the server skips unchanged chunks when the new ones are upserted.
+                new_ids = {chunk['id'] for chunk in chunks}
+                stale_chunk_ids.extend(chunk_id for chunk_id in previous.chunk_ids if chunk_id not in new_ids)
+            new_chunks.extend(chunks)
+            changed_paths.append(rel_path)
+            updated_entries[rel_path] = ManifestEntry(stat.st_size, stat.st_mtime, content_hash,
+                                                      [chunk['id'] for chunk in chunks])
+
+        for entry in removed.values():
+            stale_chunk_ids.extend(entry.chunk_ids)
+
+        changed_count = len(changed_paths)
+        self.log_message.emit("RAGManager", "info",
+                              f"Project KB sync: {files_scanned} files scanned, {changed_count} new/changed, "
+                              f"{len(removed)} removed, {files_scanned - changed_count} unchanged.")
+
+        if stale_chunk_ids:
+            success, message = await self.rag_service.delete(stale_chunk_ids, target_collection="project")
+            if not success:
+                self.log_message.emit("RAGManager", "error", f"Failed to remove stale chunks: {message}")
+                return
+
+        if new_chunks:
+            success, message = await self._upload_chunk_batches(
+                self._batch_chunk_list(new_chunks), "project", total_files=len(changed_paths))
+            if not success:
+                self.log_message.emit("RAGManager", "error", f"Project KB sync failed. {message}")
+                # Stale and removed chunks are already gone. Some batches of the changed files may
+                # have been written, so keep their chunk IDs but mark them dirty: the next sync
+                # re-ingests them, or deletes the chunks if the file is gone by then.
+                for rel_path in removed:
+                    manifest.entries.pop(rel_path, None)
+                for rel_path in changed_paths:
+                    updated_entries[rel_path].dirty = True
+                manifest.entries.update(updated_entries)
+                manifest.save()
+                return
+
+        for rel_path in removed:
+            manifest.entries.pop(rel_path, None)
+        manifest.entries.update(updated_entries)
+        manifest.save()
+        self.log_message.emit("RAGManager", "success",
+                              f"Project KB is up to date ({len(new_chunks)} chunks upserted, "
+                              f"{len(stale_chunk_ids)} stale chunks removed).")
 
-    async def ingest_files(self, file_paths: List[Path], target_collection: str):
+    async def ingest_files(self, file_paths: List[Path], target_collection: str, base_path: Optional[Path] = None):
         """
         Chunks and ingests a list of files into the specified RAG collection.
+        Chunks are streamed to the server in fixed-size batches so memory stays bounded
+        regardless of how many files are ingested.
 
         Args:
             file_paths: List of Path objects for the files to ingest.
             target_collection: "project" or "global".
+            base_path: Optional root the files are ingested from, recorded as path metadata.
         """
         try:
             self.log_message.emit("RAGManager", "info",
                                   f"Starting ingestion for {len(file_paths)} file(s) into '{target_collection}' KB...")
-            all_chunks: List[Dict[str, Any]] = []  # Ensure all_chunks is typed
-            for file_path in file_paths:
-                try:
-                    content = file_path.read_text(encoding='utf-8', errors='ignore')
-                    chunks = self.chunker.chunk_document(content, str(file_path))
-                    all_chunks.extend(chunks)
-                except Exception as e:
-                    self.log_message.emit("RAGManager", "warning",
-                                          f"Failed to chunk {file_path.name} for '{target_collection}' KB: {e}")
-
-            if not all_chunks:
-                self.log_message.emit("RAGManager", "warning",
-                                      f"No content to ingest for '{target_collection}' KB after chunking.")
-                return
-
-            self.log_message.emit("RAGManager", "info",
-                                  f"Ingesting {len(all_chunks)} chunks into '{target_collection}' knowledge base...")
-            success, message = await self.rag_service.add(all_chunks, target_collection=target_collection)
+            success, message = await self._upload_chunk_batches(
+                self._chunk_files_in_batches(file_paths, target_collection, base_path), target_collection,
+                total_files=len(file_paths))
             if success:
                 self.log_message.emit("RAGManager", "success",
                                       f"Ingestion into '{target_collection}' KB complete. {message}")
@@ -119,6 +283,154 @@ class RAGManager(QObject):
         except Exception as e:
             self.log_message.emit("RAGManager", "error", f"Ingestion process for '{target_collection}' KB failed: {e}")
 
+    def _read_and_chunk(self, file_path: Path, base_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+        """Worker-thread job: reads a file and chunks it."""
+        content = file_path.read_text(encoding='utf-8', errors='ignore')
+        return self.chunker.chunk_document(content, str(file_path), base_path)
+
+    def _read_hash_and_chunk(self, file_path: Path, previous_hash: Optional[str],
+                             base_path: Optional[Path] = None) -> tuple:
+        """
+        Worker-thread job for project sync: reads and hashes a file, chunking it only if
+        its content differs from `previous_hash`. Returns (stat, content_hash, chunks or None).
+        """
+        stat = file_path.stat()
+        content = file_path.read_text(encoding='utf-8', errors='ignore')
+        content_hash = IngestionManifest.hash_content(content)
+        if content_hash == previous_hash:
+            return stat, content_hash, None
+        return stat, content_hash, self.chunker.chunk_document(content, str(file_path), base_path)
+
+    async def _map_files_in_pool(self, job: Callable[[Path], Any],
+                                 file_paths: List[Path]) -> AsyncIterator[Tuple[Path, Any]]:
+        """
+        Runs `job` over the files on the chunking thread pool, yielding (file_path, result)
+        in input order. At most INGEST_WORKERS * INGEST_READ_AHEAD_PER_WORKER files are in
+        flight, so a slow consumer holds back reading. Failures are yielded as the exception.
+        """
+        loop = asyncio.get_running_loop()
+        window = self.INGEST_WORKERS * self.INGEST_READ_AHEAD_PER_WORKER
+        pending: deque = deque()
+        remaining = iter(file_paths)
+        try:
+            while True:
+                while len(pending) < window:
+                    file_path = next(remaining, None)
+                    if file_path is None:
+                        break
+                    pending.append((file_path, loop.run_in_executor(self._chunk_executor, job, file_path)))
+                if not pending:
+                    break
+                file_path, future = pending.popleft()
+                try:
+                    result = await future
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    result = e
+                yield file_path, result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    async def _chunk_files_in_batches(self, file_paths: List[Path], target_collection: str,
+                                      base_path: Optional[Path] = None
+                                      ) -> AsyncIterator[Tuple[List[Dict[str, Any]], int]]:
+        """Reads and chunks files on the worker pool, yielding (batch, files_processed) as batches fill up."""
+        batch: List[Dict[str, Any]] = []
+        files_processed = 0
+        chunk_count = 0
+        started = time.perf_counter()
+        async for file_path, result in self._map_files_in_pool(
+                lambda path: self._read_and_chunk(path, base_path), file_paths):
+            files_processed += 1
+            if isinstance(result, Exception):
+                self.log_message.emit("RAGManager", "warning",
+                                      f"Failed to chunk {file_path.name} for '{target_collection}' KB: {result}")
+                continue
+            batch.extend(result)
+            chunk_count += len(result)
+            while len(batch) >= self.INGEST_BATCH_SIZE:
+                yield batch[:self.INGEST_BATCH_SIZE], files_processed
+                batch = batch[self.INGEST_BATCH_SIZE:]
+        if batch:
+            yield batch, files_processed
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.log_message.emit("RAGManager", "info",
+                              f"'{target_collection}' KB: read and chunked {files_processed} files into {chunk_count} "
+                              f"chunks in {elapsed:.1f}s ({files_processed / elapsed:.1f} files/s, "
+                              f"{chunk_count / elapsed:.1f} chunks/s).")
+
+    async def _batch_chunk_list(self, chunks: List[Dict[str, Any]]) -> AsyncIterator[Tuple[List[Dict[str, Any]], int]]:
+        """Adapts an already chunked list to the batch stream used by `_upload_chunk_batches`."""
+        files_seen = set()
+        for start in range(0, len(chunks), self.INGEST_BATCH_SIZE):
+            batch = chunks[start:start + self.INGEST_BATCH_SIZE]
+            files_seen.update(chunk['metadata'].get('full_path') for chunk in batch)
+            yield batch, len(files_seen)
+
+    async def _upload_chunk_batches(self, batches: AsyncIterator[Tuple[List[Dict[str, Any]], int]],
+                                    target_collection: str, total_files: int) -> tuple[bool, str]:
+        """
+        Uploads chunk batches to the RAG server one request at a time. A bounded queue sits
+        between chunking and uploading, so chunking pauses whenever the server falls behind.
+        Emits `rag_ingestion_progress` on the event bus after every written batch.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.INGEST_QUEUE_DEPTH)
+
+        async def produce():
+            try:
+                async for item in batches:
+                    await queue.put(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log_message.emit("RAGManager", "warning", f"Chunking stopped early: {e}")
+            await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        chunks_written = 0
+        batches_written = 0
+        files_processed = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                batch, files_processed = item
+                success, message = await self.rag_service.add(batch, target_collection=target_collection)
+                if not success:
+                    return False, f"Batch {batches_written + 1} failed after {chunks_written} chunks: {message}"
+                batches_written += 1
+                chunks_written += len(batch)
+                elapsed = max(time.perf_counter() - started, 1e-6)
+                progress = {
+                    "target_collection": target_collection,
+                    "batch": batches_written,
+                    "chunks_written": chunks_written,
+                    "files_processed": files_processed,
+                    "total_files": total_files,
+                    "files_per_sec": files_processed / elapsed,
+                    "chunks_per_sec": chunks_written / elapsed,
+                }
+                self.event_bus.emit("rag_ingestion_progress", progress)
+                self.log_message.emit("RAGManager", "info",
+                                      f"'{target_collection}' KB: batch {batches_written} written "
+                                      f"({chunks_written} chunks, {files_processed}/{total_files} files, "
+                                      f"{progress['files_per_sec']:.1f} files/s, "
+                                      f"{progress['chunks_per_sec']:.1f} chunks/s).")
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+        if chunks_written == 0:
+            return True, "No content to ingest after chunking."
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        return True, (f"Wrote {chunks_written} chunks in {batches_written} batches "
+                      f"({files_processed / elapsed:.1f} files/s, {chunks_written / elapsed:.1f} chunks/s).")
+
     # --- NEW METHOD for Global Knowledge ---
     def open_add_global_knowledge_dialog(self, parent_widget=None):
         """
@@ -145,7 +457,8 @@ class RAGManager(QObject):
             files_to_ingest = self.scanner.scan(str(directory_path))
             if files_to_ingest:
                 # Explicitly target "global" collection
-                asyncio.create_task(self.ingest_files(files_to_ingest, target_collection="global"))
+                asyncio.create_task(self.ingest_files(files_to_ingest, target_collection="global",
+                                                      base_path=directory_path))
             else:
                 self.log_message.emit("RAGManager", "warning",
                                       f"No supported files found in '{directory_path.name}' for GLOBAL KB.")
@@ -1,8 +1,33 @@
 # src/ava/services/rag_service.py
 import aiohttp
 import asyncio
+import sys
+import time
+from array import array
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+try:
+    import msgpack  # Optional: binary bodies for /add and /query when the server supports them.
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def pack_float32(matrix) -> Dict[str, Any]:
+    """
+    Packs a 2D float matrix (numpy array or nested lists) as raw little-endian float32 bytes,
+    the vector format `rag_server` accepts in msgpack bodies.
+    """
+    if hasattr(matrix, "astype"):
+        matrix = matrix.astype("<f4", copy=False)
+        return {"dtype": "float32", "shape": list(matrix.shape), "data": matrix.tobytes()}
+    rows = [list(row) for row in matrix]
+    values = array('f', (value for row in rows for value in row))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return {"dtype": "float32", "shape": [len(rows), len(rows[0]) if rows else 0], "data": values.tobytes()}
 
 
 class RAGService:
@@ -10,98 +35,302 @@ class RAGService:
     Acts as a client for the external RAG FastAPI server.
     This class is now lightweight and does not load any models,
     ensuring the main application starts instantly.
+
+    All requests share one keep-alive session. Server health is cached for a short
+    TTL and refreshed in the background, and a circuit breaker stops hammering the
+    server after repeated connection failures instead of retrying every call.
+
+    The server starts listening before its embedding model is loaded. `wait_until_ready`
+    long-polls its readiness, and embedding requests briefly wait for it instead of failing.
+
+    `/add` and `/query` bodies are sent as msgpack when the `msgpack` package is installed
+    and the server advertises it, with vectors as raw float32 buffers; JSON otherwise.
     """
+    HEALTH_TTL_SECONDS = 10.0
+    FAILURE_THRESHOLD = 3
+    BREAKER_COOLDOWN_SECONDS = 15.0
+    MAX_CONNECTIONS = 8
+    # How long an embedding request waits for a server that is up but still warming up.
+    READY_WAIT_SECONDS = 60.0
 
     def __init__(self, server_url: str = "http://127.0.0.1:8001"):
         self.server_url = server_url
         self.is_connected = False
+        self.is_ready = False
+        self.readiness: Dict[str, Any] = {}
+        self.use_msgpack = False
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._last_health_check = 0.0
+        self._health_refresh_task: Optional[asyncio.Task] = None
+        self._consecutive_failures = 0
+        self._breaker_open_until = 0.0
         print(f"[RAGService] Client initialized. Will connect to RAG server at {self.server_url}")
 
-    async def check_connection(self, retries: int = 3, delay: float = 1.0) -> bool:
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared session, creating it lazily on the running event loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Stops the background health refresh and closes the shared session."""
+        if self._health_refresh_task and not self._health_refresh_task.done():
+            self._health_refresh_task.cancel()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # --- Health and circuit breaker ---
+
+    def _record_success(self):
+        self._consecutive_failures = 0
+        self._breaker_open_until = 0.0
+        self.is_connected = True
+        self._last_health_check = time.monotonic()
+
+    def _record_failure(self):
+        self._consecutive_failures += 1
+        self.is_connected = False
+        self._last_health_check = time.monotonic()
+        if self._consecutive_failures >= self.FAILURE_THRESHOLD:
+            self._breaker_open_until = time.monotonic() + self.BREAKER_COOLDOWN_SECONDS
+            print(f"[RAGService] Circuit breaker open for {self.BREAKER_COOLDOWN_SECONDS:.0f}s "
+                  f"after {self._consecutive_failures} consecutive failures.")
+
+    async def check_connection(self) -> bool:
         """
-        Performs a quick check to see if the RAG server is running and responding.
+        Performs a single quick check to see if the RAG server is running and responding,
+        updating the cached health state.
         """
-        for attempt in range(retries):
-            try:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=3.0)) as session:
-                    async with session.get(self.server_url) as response:
-                        if response.status == 200:
-                            self.is_connected = True
-                            return True
-            except (aiohttp.ClientConnectorError, asyncio.TimeoutError):
-                if attempt < retries - 1:
-                    await asyncio.sleep(delay)
-        self.is_connected = False
+        try:
+            async with self._get_session().get(self.server_url,
+                                               timeout=aiohttp.ClientTimeout(total=3.0)) as response:
+                if response.status == 200:
+                    self._record_success()
+                    body = await response.json(content_type=None)
+                    self._update_readiness(body.get("readiness"))
+                    self.use_msgpack = msgpack is not None and "msgpack" in body.get("wire_formats", [])
+                    return True
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            pass
+        self._record_failure()
         return False
 
+    def _update_readiness(self, readiness: Optional[Dict[str, Any]]):
+        # Servers without a readiness report only start listening once they are ready.
+        self.readiness = readiness or {"phase": "ready", "ready": True}
+        self.is_ready = bool(self.readiness.get("ready"))
+
+    async def wait_until_ready(self, timeout: float = READY_WAIT_SECONDS) -> bool:
+        """
+        Waits until the server reports it is ready to embed, long-polling `/wait_ready`
+        and retrying while the server process is still starting up.
+        Returns False on timeout or if the server's warm-up failed.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.is_ready:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.readiness.get("phase") == "failed":
+                return False
+            try:
+                async with self._get_session().get(
+                        f"{self.server_url}/wait_ready", params={"timeout": f"{min(remaining, 30.0):.1f}"},
+                        timeout=aiohttp.ClientTimeout(total=min(remaining, 30.0) + 5.0)) as response:
+                    if response.status == 200:
+                        self._record_success()
+                        self._update_readiness(await response.json(content_type=None))
+                    elif response.status == 404:  # Older server: being reachable means ready.
+                        self._record_success()
+                        self._update_readiness(None)
+                    else:
+                        await asyncio.sleep(min(1.0, max(0.0, remaining)))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                await asyncio.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+        return True
+
+    def _schedule_health_refresh(self):
+        if self._health_refresh_task is None or self._health_refresh_task.done():
+            self._health_refresh_task = asyncio.create_task(self.check_connection())
+
+    async def _ensure_available(self, require_ready: bool = True) -> bool:
+        """
+        Cheap gate used before every request. Trusts a fresh cached status, refreshes a
+        stale healthy status in the background, and only probes inline when the server
+        was last seen down and the circuit breaker allows a trial request.
+        With `require_ready`, a server that is still warming up is waited for.
+        """
+        now = time.monotonic()
+        if now < self._breaker_open_until:
+            return False
+        if self.is_connected:
+            if now - self._last_health_check > self.HEALTH_TTL_SECONDS:
+                self._schedule_health_refresh()
+        elif not await self.check_connection():
+            return False
+        if require_ready and not self.is_ready:
+            return await self.wait_until_ready(self.READY_WAIT_SECONDS)
+        return True
+
+    async def _post(self, path: str, payload: Optional[Dict[str, Any]], timeout: float,
+                    binary: bool = False) -> tuple[int, Any]:
+        """
+        POSTs to the RAG server on the shared session. With `binary`, the body is sent and the
+        response requested as msgpack if the server supports it.
+
+        Returns:
+            (status, body) where body is the decoded JSON/msgpack for 200 responses and the raw text otherwise.
+        """
+        if binary and self.use_msgpack:
+            request_kwargs = {"data": msgpack.packb(payload, use_bin_type=True),
+                              "headers": {"Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE}}
+        else:
+            request_kwargs = {"json": payload}
+        try:
+            async with self._get_session().post(f"{self.server_url}{path}", **request_kwargs,
+                                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status != 200:
+                    body = await response.text()
+                elif response.content_type == MSGPACK_MEDIA_TYPE:
+                    body = msgpack.unpackb(await response.read(), raw=False)
+                else:
+                    body = await response.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            self._record_failure()
+            raise
+        self._record_success()
+        return response.status, body
+
+    def _encode_vectors(self, matrix):
+        """Raw float32 buffer for msgpack bodies, plain nested lists for JSON."""
+        if self.use_msgpack:
+            return pack_float32(matrix)
+        return matrix.tolist() if hasattr(matrix, "tolist") else [[float(value) for value in row] for row in matrix]
+
+    # --- API ---
+
     async def set_project_db(self, project_path: str) -> tuple[bool, str]:
         """Tells the RAG server to switch its PROJECT database context."""
-        if not await self.check_connection():
+        if not await self._ensure_available(require_ready=False):
             return False, "RAG Service is not running or is unreachable."
         payload = {"project_path": project_path}
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20.0)) as session:
-                async with session.post(f"{self.server_url}/set_collection", json=payload) as response:
-                    if response.status == 200:
-                        return True, "RAG project context switched."
-                    error_detail = await response.text()
-                    return False, f"Server error on context switch (status {response.status}): {error_detail}"
+            status, body = await self._post("/set_collection", payload, timeout=20.0)
+            if status == 200:
+                return True, "RAG project context switched."
+            return False, f"Server error on context switch (status {status}): {body}"
         except Exception as e:
             return False, f"Failed to switch RAG project context: {e}"
 
     async def reset_project_db(self) -> tuple[bool, str]:
         """Tells the RAG server to wipe and recreate the current project's database."""
-        if not await self.check_connection():
+        if not await self._ensure_available(require_ready=False):
             return False, "RAG Service is not running or is unreachable."
         print("[RAGService] Asking server to reset project collection...")
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20.0)) as session:
-                async with session.post(f"{self.server_url}/reset_project_collection") as response:
-                    if response.status == 200:
-                        return True, "RAG project DB reset successfully."
-                    error_detail = await response.text()
-                    return False, f"Server error on project DB reset (status {response.status}): {error_detail}"
+            status, body = await self._post("/reset_project_collection", None, timeout=20.0)
+            if status == 200:
+                return True, "RAG project DB reset successfully."
+            return False, f"Server error on project DB reset (status {status}): {body}"
         except Exception as e:
             return False, f"Failed to reset RAG project DB: {e}"
 
-    async def add(self, chunks: List[Dict[str, Any]], target_collection: str = "project") -> tuple[bool, str]:
+    async def add(self, chunks: List[Dict[str, Any]], target_collection: str = "project",
+                  embeddings=None) -> tuple[bool, str]:
         """
         Sends a list of document chunks to the RAG server for ingestion.
+        `embeddings` optionally supplies precomputed vectors, one row per chunk.
         """
-        if not await self.check_connection():
+        if not await self._ensure_available():
             return False, "RAG Service is not running or is unreachable."
 
         payload = {"documents": chunks, "target_collection": target_collection}
+        if embeddings is not None:
+            payload["embeddings"] = self._encode_vectors(embeddings)
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120.0)) as session:
-                async with session.post(f"{self.server_url}/add", json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return True, result.get("message", "Ingestion successful.")
-                    error_detail = await response.text()
-                    return False, f"Error from RAG server (status {response.status}): {error_detail}"
+            status, body = await self._post("/add", payload, timeout=120.0, binary=True)
+            if status == 200:
+                return True, body.get("message", "Ingestion successful.")
+            return False, f"Error from RAG server (status {status}): {body}"
         except Exception as e:
             return False, f"An unexpected error occurred during ingestion: {e}"
 
-    async def query(self, query_text: str, n_results: int = 5, target_collection: str = "project") -> str:
+    async def delete(self, ids: List[str], target_collection: str = "project",
+                     where: Optional[Dict[str, Any]] = None) -> tuple[bool, str]:
+        """
+        Removes the chunks with the given IDs, and any matching the Chroma `where` clause,
+        from a RAG collection.
+        """
+        if not ids and not where:
+            return True, "No chunks to delete."
+        if not await self._ensure_available():
+            return False, "RAG Service is not running or is unreachable."
+
+        payload = {"ids": ids, "target_collection": target_collection}
+        if where:
+            payload["where"] = where
+        try:
+            status, body = await self._post("/delete", payload, timeout=60.0)
+            if status == 200:
+                return True, body.get("message", "Deletion successful.")
+            return False, f"Error from RAG server (status {status}): {body}"
+        except Exception as e:
+            return False, f"An unexpected error occurred during deletion: {e}"
+
+    async def query(self, query_text: str, n_results: int = 5, target_collection: str = "project",
+                    max_chars: Optional[int] = None, mode: str = "vector",
+                    filters: Optional[Dict[str, Any]] = None) -> str:
         """
         Queries the external RAG server and returns a formatted string of context.
+        `mode` is "vector", "lexical" (BM25 over identifiers) or "hybrid" (both, rank-fused).
+        `filters` may hold any of `path_prefix`, `language`, `kind`, `where` and `boosts`,
+        e.g. {"path_prefix": "game/", "kind": "class"}.
         """
-        if not await self.check_connection():
+        if not await self._ensure_available():
             return f"RAG Service is not running (target: {target_collection})."
 
         query_payload = {
             "query_text": query_text,
             "n_results": n_results,
-            "target_collection": target_collection
+            "target_collection": target_collection,
+            "max_chars": max_chars,
+            "mode": mode,
+            **(filters or {})
         }
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30.0)) as session:
-                async with session.post(f"{self.server_url}/query", json=query_payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("context", f"Received empty context from RAG server for '{target_collection}'.")
-                    error_detail = await response.text()
-                    return f"Error: RAG server returned status {response.status} for '{target_collection}'."
+            status, body = await self._post("/query", query_payload, timeout=30.0, binary=True)
+            if status == 200:
+                return body.get("context", f"Received empty context from RAG server for '{target_collection}'.")
+            return f"Error: RAG server returned status {status} for '{target_collection}'."
+        except Exception as e:
+            return f"An unexpected error occurred during query (target: {target_collection}): {e}"
+
+    async def query_batch(self, query_texts: List[str], n_results: int = 5,
+                          target_collections: Optional[List[str]] = None,
+                          max_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Queries several collections (and query texts) in a single request.
+
+        Returns:
+            A list of {"query_text", "source_collection", "context", "hits"} dicts, one per
+            query text and collection. On failure every entry carries the error as its context
+            and has no hits.
+        """
+        target_collections = target_collections or ["project", "global"]
+
+        def _failed(message: str) -> List[Dict[str, str]]:
+            return [{"query_text": text, "source_collection": collection, "context": message}
+                    for collection in target_collections for text in query_texts]
+
+        if not await self._ensure_available():
+            return _failed("RAG Service is not running or is unreachable.")
+
+        payload = {"query_texts": query_texts, "n_results": n_results, "target_collections": target_collections,
+                   "max_chars": max_chars}
+        try:
+            status, body = await self._post("/query_batch", payload, timeout=30.0)
+            if status == 200:
+                return body.get("results", [])
+            return _failed(f"Error: RAG server returned status {status} for batch query.")
         except Exception as e:
-            return f"An unexpected error occurred during query (target: {target_collection}): {e}"
\ No newline at end of file
+            return _failed(f"An unexpected error occurred during batch query: {e}")
@@ -0,0 +1,52 @@
+# tests/_loader.py
+import atexit
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+_state_dir = None
+
+
+def load_module(name: str, relative_path: str):
+    """Imports a module by path so the GUI package __init__ (and PySide6) isn't pulled in."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, REPO_ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _isolate_server_state():
+    """Points the servers' logs and caches at a temp dir; by default they live next to the source."""
+    global _state_dir
+    if _state_dir is None:
+        _state_dir = Path(tempfile.mkdtemp(prefix="ava_tests_"))
+        atexit.register(shutil.rmtree, _state_dir, ignore_errors=True)
+    os.environ.setdefault("RAG_LOG_PATH", str(_state_dir / "rag_server_debug.log"))
+    os.environ.setdefault("RAG_EMBEDDING_CACHE_DIR", str(_state_dir / "rag_embedding_cache"))
+    os.environ.setdefault("RAG_ONNX_MODEL_DIR", str(_state_dir / "rag_onnx_model"))
+    os.environ.setdefault("LLM_RESPONSE_CACHE_PATH", str(_state_dir / "llm_response_cache.sqlite3"))
+    os.environ.setdefault("LLM_METRICS_PATH", str(_state_dir / "llm_metrics.jsonl"))
+
+
+def load_rag_server():
+    """rag_server.py is a standalone script; import it the way the benchmarks do."""
+    _isolate_server_state()
+    server_dir = str(REPO_ROOT / "src" / "ava")
+    if server_dir not in sys.path:
+        sys.path.insert(0, server_dir)
+    import rag_server
+    return rag_server
+
+
+def load_llm_server():
+    """llm_server.py is a standalone script too, with its caches next to it by default."""
+    _isolate_server_state()
+    return load_module("llm_server", "src/ava/llm_server.py")
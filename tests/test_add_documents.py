@@ -0,0 +1,84 @@
+# tests/test_add_documents.py
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import chromadb
+import numpy as np
+from starlette.requests import Request
+
+from tests._loader import load_rag_server
+
+rag_server = load_rag_server()
+
+
+def test_add_bounds_the_embedding_slices_in_flight(tmp_path, monkeypatch):
+    collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection("docs")
+    written_when_queued = []
+
+    async def embed_texts(texts, priority):
+        written_when_queued.append(collection.count())
+        await asyncio.sleep(0)
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    monkeypatch.setattr(rag_server, "ADD_EMBED_BATCH_SIZE", 1)
+    monkeypatch.setattr(rag_server, "_embed_texts", embed_texts)
+    monkeypatch.setitem(rag_server.app_state, "embedding_pool", SimpleNamespace(workers=1))
+    monkeypatch.setitem(rag_server.app_state, "embedding_cache", None)
+    monkeypatch.setitem(rag_server.app_state, "project_collection", collection)
+    monkeypatch.setitem(rag_server.app_state, "query_cache", rag_server.QueryResultCache(16))
+    monkeypatch.setitem(rag_server.app_state, "lexical_indexes", {})
+    monkeypatch.setitem(rag_server.app_state, "compact_indexes", {})
+    monkeypatch.setitem(rag_server.app_state, "index_build_locks", {})
+
+    request = rag_server.AddRequest(documents=[rag_server.Document(id=f"doc-{i}", content=f"text {i}",
+                                                                   metadata={"source": "a.py"})
+                                               for i in range(10)])
+    response = asyncio.run(rag_server.add_documents(Request({"type": "http", "headers": []}), request))
+
+    assert response["added"] == 10
+    assert len(written_when_queued) == 10
+    # One worker: each slice is queued at most one slice ahead of the one being written.
+    assert max(index - written for index, written in enumerate(written_when_queued)) <= 1
+
+
+def test_add_during_a_lexical_index_build_is_not_lost(tmp_path, monkeypatch):
+    collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection("docs")
+    collection.add(ids=["old"], embeddings=[[1.0, 0.0]], documents=["def load_level(): pass"],
+                   metadatas=[{"source": "a.py"}])
+    original_build = rag_server.LexicalIndex.build_from_collection
+    build_read = threading.Event()
+
+    def slow_build(target):
+        index = original_build(target)  # Reads the collection before the upsert below
+        build_read.set()
+        time.sleep(0.2)
+        return index
+
+    async def embed_texts(texts, priority):
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    monkeypatch.setattr(rag_server.LexicalIndex, "build_from_collection", slow_build)
+    monkeypatch.setattr(rag_server, "_embed_texts", embed_texts)
+    monkeypatch.setitem(rag_server.app_state, "embedding_pool", SimpleNamespace(workers=1))
+    monkeypatch.setitem(rag_server.app_state, "embedding_cache", None)
+    monkeypatch.setitem(rag_server.app_state, "project_collection", collection)
+    monkeypatch.setitem(rag_server.app_state, "query_cache", rag_server.QueryResultCache(16))
+    monkeypatch.setitem(rag_server.app_state, "lexical_indexes", {})
+    monkeypatch.setitem(rag_server.app_state, "compact_indexes", {})
+    monkeypatch.setitem(rag_server.app_state, "index_build_locks", {})
+    request = rag_server.AddRequest(documents=[rag_server.Document(id="new", content="def spawn_enemy(): pass",
+                                                                   metadata={"source": "b.py"})])
+
+    async def add_after_build_read():
+        await asyncio.to_thread(build_read.wait)
+        return await rag_server.add_documents(Request({"type": "http", "headers": []}), request)
+
+    async def run():
+        build = asyncio.create_task(rag_server._get_lexical_index("project", collection))
+        await add_after_build_read()
+        return await build
+
+    index = asyncio.run(run())
+    assert index.search("spawn_enemy", 5)[0][0] == "new"
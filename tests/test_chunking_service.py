@@ -0,0 +1,61 @@
+# tests/test_chunking_service.py
+from tests._loader import load_module
+
+chunking_service = load_module("ava_chunking_service", "src/ava/services/chunking_service.py")
+
+
+def _chunk(content: str):
+    chunker = chunking_service.ChunkingService(chunk_size=1000, chunk_overlap=100)
+    return chunker.chunk_document(content, "/project/pkg/module.py", base_path="/project")
+
+
+def _by_symbol(chunks):
+    return {chunk['metadata']['symbol']: chunk for chunk in chunks}
+
+
+def test_form_feed_does_not_shift_symbol_spans():
+    content = "def x():\n    return 1\n\f\ndef b():\n    return 2\n"
+    chunks = _by_symbol(_chunk(content))
+    assert set(chunks) == {'x', 'b'}
+    assert chunks['x']['content'] == "def x():\n    return 1"
+    assert chunks['b']['content'] == "def b():\n    return 2"
+    assert chunks['b']['metadata']['start_line'] == 4
+
+
+def test_crlf_line_endings_keep_whole_definitions():
+    content = "import os\r\n\r\ndef a():\r\n    return os.sep\r\n\r\nclass B:\r\n    pass\r\n"
+    chunks = _by_symbol(_chunk(content))
+    assert chunks['a']['content'] == "def a():\r\n    return os.sep"
+    assert chunks['B']['content'] == "class B:\r\n    pass"
+    assert chunks['B']['metadata']['start_line'] == 6
+    for chunk in chunks.values():
+        start, end = chunk['metadata']['start_char'], chunk['metadata']['end_char']
+        assert content[start:end].strip() == chunk['content']
+
+
+def test_repeated_chunk_text_gets_occurrence_suffixes():
+    chunks = [{'content': text} for text in ("same", "other", "same", "same")]
+    chunking_service.ChunkingService._assign_chunk_ids(chunks, "pkg/module.py")
+    ids = [chunk['id'] for chunk in chunks]
+    assert len(set(ids)) == 4
+    assert ids[0].startswith("pkg/module.py#") and "-" not in ids[0].split("#")[1]
+    assert ids[2] == f"{ids[0]}-1"
+    assert ids[3] == f"{ids[0]}-2"
+
+
+def test_chunk_ids_survive_a_symbol_moving():
+    original = "def a():\n    return 1\n\n\ndef b():\n    return 2\n"
+    moved = "def new():\n    return 0\n\n\n" + original
+    before = {chunk['metadata']['symbol']: chunk['id'] for chunk in _chunk(original)}
+    after = {chunk['metadata']['symbol']: chunk['id'] for chunk in _chunk(moved)}
+    assert after['a'] == before['a']
+    assert after['b'] == before['b']
+
+
+def test_same_text_in_different_files_gets_different_ids():
+    chunker = chunking_service.ChunkingService(chunk_size=1000, chunk_overlap=100)
+    content = "def a():\n    return 1\n"
+    first = chunker.chunk_document(content, "/project/one.py", base_path="/project")
+    second = chunker.chunk_document(content, "/project/two.py", base_path="/project")
+    assert first[0]['id'].startswith("one.py#")
+    assert {chunk['id'] for chunk in first}.isdisjoint(chunk['id'] for chunk in second)
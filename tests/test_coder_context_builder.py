@@ -0,0 +1,91 @@
+# tests/test_coder_context_builder.py
+import json
+
+from tests._loader import load_module
+
+load_module("src.ava.utils.code_summarizer", "src/ava/utils/code_summarizer.py")
+coder_context_builder = load_module("src.ava.services.coder_context_builder",
+                                    "src/ava/services/coder_context_builder.py")
+CoderContextBuilder = coder_context_builder.CoderContextBuilder
+
+TARGET = "game/player.py"
+TARGET_CODE = "from game.physics import Body\n\nclass Player(Body):\n    pass\n"
+FILES = {
+    "game/world.py": "class World:\n    pass\n",
+    "game/physics.py": "class Body:\n    pass\n",
+    "game/hud.py": "from game.player import Player\n",
+    "audio/sound.py": "def play():\n    pass\n",
+    "game/misc.py": "X = 1\n",
+    "tools/unrelated.py": "Y = 2\n",
+}
+
+
+def _large_module(name: str, functions: int = 40) -> str:
+    return "\n\n".join(f"def {name}_{i}(value):\n    '''Helper {i}.'''\n    return value + {i}\n"
+                       for i in range(functions))
+
+
+def test_files_are_ranked_by_graph_imports_mentions_and_package():
+    ranked = CoderContextBuilder().rank_files(TARGET, "Player controller that plays a sound", TARGET_CODE,
+                                              FILES, project_index={}, dependencies={"game/world.py"})
+    assert [name for name, _ in ranked] == ["game/world.py", "game/physics.py", "game/hud.py",
+                                            "audio/sound.py", "game/misc.py", "tools/unrelated.py"]
+    scores = dict(ranked)
+    assert scores["game/world.py"] == CoderContextBuilder.DEPENDENCY_WEIGHT + CoderContextBuilder.SAME_PACKAGE_WEIGHT
+    assert scores["tools/unrelated.py"] == 0
+
+
+def test_referenced_symbols_raise_a_file_above_its_package_neighbours():
+    project_index = {"Inventory": "tools.unrelated", "add_item": "tools.unrelated"}
+    ranked = CoderContextBuilder().rank_files(TARGET, "Uses Inventory.add_item", "", FILES, project_index)
+    scores = dict(ranked)
+    assert scores["tools/unrelated.py"] == 2 * CoderContextBuilder.SYMBOL_WEIGHT
+    assert scores["tools/unrelated.py"] > scores["game/misc.py"]
+
+
+def test_symbol_index_is_trimmed_to_whole_modules_in_rank_order():
+    project_index = {f"a_{i}": "pkg.a" for i in range(5)}
+    project_index.update({f"b_{i}": "pkg.b" for i in range(5)})
+    project_index.update({f"c_{i}": "pkg.c" for i in range(5)})
+    module_chars = len(json.dumps({f"a_{i}": "pkg.a" for i in range(5)}))
+    ranked = [("pkg/c.py", 5.0), ("pkg/a.py", 3.0), ("pkg/b.py", 1.0)]
+
+    trimmed = json.loads(CoderContextBuilder()._budget_symbol_index(project_index, ranked, 2 * module_chars + 2))
+    assert set(trimmed.values()) == {"pkg.c", "pkg.a"}
+    assert len(trimmed) == 10
+
+
+def test_small_symbol_index_is_kept_whole():
+    project_index = {"Body": "game.physics", "World": "game.world"}
+    assert json.loads(CoderContextBuilder()._budget_symbol_index(project_index, [], 10_000)) == project_index
+
+
+def test_budget_keeps_top_files_whole_then_summarizes_then_omits():
+    files = {f"pkg/module_{i}.py": _large_module(f"module_{i}") for i in range(6)}
+    builder = CoderContextBuilder(token_budget=1500, max_full_files=1)
+    context = builder.build("pkg/target.py", "Uses module_0", {"files": []}, {}, files,
+                            dependencies={"pkg/module_0.py"})
+
+    code_context = json.loads(context.code_context_json)
+    assert context.full_files == ["pkg/module_0.py"]
+    assert code_context["pkg/module_0.py"] == files["pkg/module_0.py"]
+    assert context.summarized_files
+    for name in context.summarized_files:
+        assert code_context[name].startswith(coder_context_builder.SUMMARY_MARKER)
+    assert context.omitted_files
+    # Omitted files still get a marker while there is room, so the coder knows they exist.
+    assert [code_context.get(name) for name in context.omitted_files][0] == coder_context_builder.OMITTED_MARKER
+    for name in context.omitted_files:
+        assert code_context.get(name, coder_context_builder.OMITTED_MARKER) == coder_context_builder.OMITTED_MARKER
+    assert set(context.full_files) | set(context.summarized_files) | set(context.omitted_files) == set(files)
+    assert context.estimated_tokens <= builder.token_budget
+
+
+def test_import_cache_is_keyed_by_content_and_bounded():
+    builder = CoderContextBuilder()
+    builder.IMPORT_CACHE_SIZE = 2
+    assert builder._imported_modules("a.py", "import os\n") == frozenset({"os"})
+    assert builder._imported_modules("a.py", "import sys\n") == frozenset({"sys"})
+    builder._imported_modules("b.py", "import json\n")
+    assert len(builder._import_cache) == 2
+    assert all(len(digest) == 64 for _, digest in builder._import_cache)
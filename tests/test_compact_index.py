@@ -0,0 +1,103 @@
+# tests/test_compact_index.py
+import asyncio
+from types import SimpleNamespace
+
+import chromadb
+import numpy as np
+
+from tests._loader import load_rag_server
+
+rag_server = load_rag_server()
+
+DIM = 4
+
+
+def _embedding(seed: int) -> list:
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32).tolist()
+
+
+def _collection(tmp_path, ids):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    collection = client.get_or_create_collection("docs")
+    collection.add(ids=ids, embeddings=[_embedding(i) for i in range(len(ids))],
+                   documents=[f"document {doc_id}" for doc_id in ids])
+    return collection
+
+
+def test_saved_index_with_same_count_but_different_ids_is_rebuilt(tmp_path):
+    collection = _collection(tmp_path, ["a", "b", "c"])
+    directory = tmp_path / "compact"
+    rag_server.CompactVectorIndex.open(directory, collection, DIM).close()
+
+    # Changed while the server was down without saving the index: one delete, one add.
+    collection.delete(ids=["b"])
+    collection.add(ids=["d"], embeddings=[_embedding(10)], documents=["document d"])
+
+    index = rag_server.CompactVectorIndex.open(directory, collection, DIM)
+    assert sorted(index._rows) == ["a", "c", "d"]
+    index.close()
+
+
+def test_unsaved_writes_before_a_crash_force_a_rebuild(tmp_path):
+    collection = _collection(tmp_path, ["a", "b", "c"])
+    directory = tmp_path / "compact"
+    rag_server.CompactVectorIndex.open(directory, collection, DIM).close()
+
+    # Re-embed "a": removing it moves "c" into its row and the new vector goes to a new row.
+    index = rag_server.CompactVectorIndex.open(directory, collection, DIM)
+    index.remove(["a"])
+    index.add(["a"], np.asarray([_embedding(20)], dtype=np.float32))
+    collection.upsert(ids=["a"], embeddings=[_embedding(20)], documents=["document a v2"])
+    index._vectors.flush()
+    del index  # Crash: vectors.f32 was written but index.npz still has the old row order.
+
+    reopened = rag_server.CompactVectorIndex.open(directory, collection, DIM)
+    doc_id, distance = reopened.search(np.asarray(_embedding(20), dtype=np.float32), 1)[0]
+    assert doc_id == "a" and distance < 1e-6
+    assert not (directory / rag_server.CompactVectorIndex.DIRTY_FILE).exists()
+    reopened.close()
+
+
+def test_vector_query_drops_ids_missing_from_the_collection(tmp_path, monkeypatch):
+    collection = _collection(tmp_path, ["a", "b", "c"])
+    index = rag_server.CompactVectorIndex.open(tmp_path / "compact", collection, DIM)
+    collection.delete(ids=["b"])  # Index not told, as after an unclean exit.
+
+    monkeypatch.setattr(rag_server, "COMPACT_COLLECTIONS", {"global"})
+    monkeypatch.setitem(rag_server.app_state, "compact_indexes", {"global": index})
+    results = asyncio.run(rag_server._vector_query(collection, "global", [_embedding(1)], n_results=3))
+
+    assert sorted(results["ids"][0]) == ["a", "c"]
+    assert len(results["distances"][0]) == len(results["documents"][0]) == 2
+    assert "" not in results["documents"][0]
+    assert "b" not in index._rows
+    index.close()
+
+
+def test_concurrent_first_uses_build_the_index_once(tmp_path, monkeypatch):
+    collection = _collection(tmp_path, ["a", "b", "c"])
+    opened = []
+    original_open = rag_server.CompactVectorIndex.open
+
+    def counting_open(*args):
+        opened.append(args)
+        return original_open(*args)
+
+    async def dimension():
+        return DIM
+
+    monkeypatch.setattr(rag_server.CompactVectorIndex, "open", counting_open)
+    monkeypatch.setattr(rag_server, "COMPACT_COLLECTIONS", {"global"})
+    monkeypatch.setitem(rag_server.app_state, "global_db_path", str(tmp_path))
+    monkeypatch.setitem(rag_server.app_state, "embedding_pool", SimpleNamespace(dimension=dimension))
+    monkeypatch.setitem(rag_server.app_state, "compact_indexes", {})
+    monkeypatch.setitem(rag_server.app_state, "index_build_locks", {})
+
+    async def first_query_and_add():
+        return await asyncio.gather(rag_server._get_compact_index("global", collection),
+                                    rag_server._get_compact_index("global", collection))
+
+    query_index, add_index = asyncio.run(first_query_and_add())
+    assert len(opened) == 1
+    assert query_index is add_index is rag_server.app_state["compact_indexes"]["global"]
+    query_index.close()
@@ -0,0 +1,31 @@
+# tests/test_delete_documents.py
+import asyncio
+
+import chromadb
+
+from tests._loader import load_rag_server
+
+rag_server = load_rag_server()
+
+
+def test_delete_by_where_keeps_other_chunks(tmp_path, monkeypatch):
+    collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection("docs")
+    collection.add(ids=["main-1", "main-2", "legacy", "manual"],
+                   embeddings=[[0.1, 0.2], [0.2, 0.1], [0.3, 0.3], [0.4, 0.1]],
+                   documents=["a", "b", "c", "d"],
+                   metadatas=[{"full_path": "/p/main.py", "rel_path": "main.py"},
+                              {"full_path": "/p/main.py", "rel_path": "main.py"},
+                              {"full_path": "/p/old.py"},  # Ingested before rel_path existed
+                              {"full_path": "/home/user/notes.md"}])
+    monkeypatch.setitem(rag_server.app_state, "project_collection", collection)
+    monkeypatch.setitem(rag_server.app_state, "query_cache", rag_server.QueryResultCache(16))
+    monkeypatch.setitem(rag_server.app_state, "lexical_indexes", {})
+    monkeypatch.setitem(rag_server.app_state, "compact_indexes", {})
+    monkeypatch.setitem(rag_server.app_state, "index_build_locks", {})
+
+    where = {"$or": [{"full_path": {"$in": ["/p/main.py", "/p/old.py"]}},
+                     {"rel_path": {"$in": ["main.py", "old.py"]}}]}
+    response = asyncio.run(rag_server.delete_documents(rag_server.DeleteRequest(where=where)))
+
+    assert response["status"] == "success"
+    assert collection.get()["ids"] == ["manual"]
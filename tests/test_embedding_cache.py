@@ -0,0 +1,75 @@
+# tests/test_embedding_cache.py
+import numpy as np
+
+from tests._loader import load_rag_server
+
+rag_server = load_rag_server()
+
+
+def _vectors(count: int, dim: int = 4, offset: int = 0) -> np.ndarray:
+    return np.arange(offset, offset + count * dim, dtype=np.float32).reshape(count, dim)
+
+
+def test_flush_appends_only_new_slots(tmp_path):
+    cache = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=100)
+    cache.put_many(["a", "b"], _vectors(2))
+    cache.flush()
+    size_after_first = cache.index_path.stat().st_size
+    cache.put_many(["c"], _vectors(1, offset=100))
+    cache.flush()
+    lines = cache.index_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1 + 3  # header + one line per slot assignment, nothing rewritten
+    assert cache.index_path.stat().st_size > size_after_first
+
+
+def test_reload_replays_log_including_evictions(tmp_path):
+    cache = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=2)
+    cache.put_many(["a", "b"], _vectors(2))
+    cache.flush()
+    cache.put_many(["c"], _vectors(1, offset=100))  # Evicts "a" and reuses its slot
+    cache.flush()
+
+    reloaded = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=2)
+    a, b, c = reloaded.get_many(["a", "b", "c"])
+    assert a is None
+    np.testing.assert_array_equal(b, _vectors(2)[1])
+    np.testing.assert_array_equal(c, _vectors(1, offset=100)[0])
+
+
+def test_log_is_compacted_when_it_outgrows_the_capacity(tmp_path):
+    cache = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=2)
+    for i in range(10):
+        cache.put_many([f"text {i}"], _vectors(1, offset=i))
+        cache.flush()
+    lines = cache.index_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) <= 1 + cache.COMPACT_FACTOR * cache.capacity + 1
+    reloaded = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=2)
+    assert reloaded.stats()["entries"] == 2
+    assert reloaded.get_many(["text 9"])[0] is not None
+
+
+def test_index_for_another_model_is_rewritten(tmp_path):
+    cache = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=10)
+    cache.put_many(["a"], _vectors(1))
+    cache.flush()
+    cache.index_path.write_text('{"model": "other", "dim": 4}\nsomekey 0\n', encoding="utf-8")
+
+    reopened = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=10)
+    assert reopened.stats()["entries"] == 0
+    reopened.put_many(["b"], _vectors(1))
+    reopened.flush()
+    assert reopened.index_path.read_text(encoding="utf-8").splitlines()[0] == reopened._header().strip()
+
+
+def test_slot_reused_before_a_crash_is_not_served_for_the_old_text(tmp_path):
+    cache = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=1)
+    cache.put_many(["old"], _vectors(1))
+    cache.flush()
+    cache.put_many(["new"], _vectors(1, offset=100))  # Evicts "old" in the memmap...
+    cache._vectors.flush()
+    cache._keys.flush()
+    del cache  # ...but crashes before the log records it.
+
+    reopened = rag_server.EmbeddingCache(tmp_path, "model", 4, capacity=1)
+    assert reopened.get_many(["old"]) == [None]
+    assert reopened.stats()["entries"] == 0
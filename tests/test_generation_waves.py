@@ -0,0 +1,97 @@
+# tests/test_generation_waves.py
+import asyncio
+import sys
+import types
+from dataclasses import dataclass, field
+from typing import Set
+
+from tests._loader import load_module
+
+# generation_coordinator only needs these names at import time.
+sys.modules.setdefault("src.ava.core.event_bus", types.SimpleNamespace(EventBus=object))
+sys.modules.setdefault("src.ava.prompts", types.SimpleNamespace(CODER_PROMPT="", SIMPLE_FILE_PROMPT=""))
+load_module("src.ava.utils.code_summarizer", "src/ava/utils/code_summarizer.py")
+load_module("src.ava.services.coder_context_builder", "src/ava/services/coder_context_builder.py")
+context_manager = load_module("src.ava.services.context_manager", "src/ava/services/context_manager.py")
+dependency_planner = load_module("src.ava.services.dependency_planner", "src/ava/services/dependency_planner.py")
+generation_coordinator = load_module("ava_generation_coordinator", "src/ava/services/generation_coordinator.py")
+
+GenerationCoordinator = generation_coordinator.GenerationCoordinator
+
+
+@dataclass
+class Spec:
+    filename: str
+    dependencies: Set[str] = field(default_factory=set)
+
+
+def _plan(graph: dict):
+    """Runs the real planner's topological sort, then groups its order into waves."""
+    planner = dependency_planner.DependencyPlanner(service_manager=None)
+    full_graph = {name: {"dependencies": set(deps), "dependents": set()} for name, deps in graph.items()}
+    for name, data in full_graph.items():
+        for dep in data["dependencies"]:
+            full_graph[dep]["dependents"].add(name)
+    order = planner._topological_sort(full_graph)
+    return GenerationCoordinator._plan_waves([Spec(name, set(graph[name])) for name in order])
+
+
+def test_dependents_come_in_a_later_wave_than_their_imports():
+    waves = _plan({"app.py": ["models.py", "utils.py"], "cli.py": ["app.py"],
+                   "models.py": [], "utils.py": [], "readme.md": []})
+    wave_of = {name: i for i, wave in enumerate(waves) for name in wave}
+    assert wave_of["app.py"] > wave_of["models.py"]
+    assert wave_of["app.py"] > wave_of["utils.py"]
+    assert wave_of["cli.py"] > wave_of["app.py"]
+    assert set(waves[0]) == {"models.py", "utils.py", "readme.md"}
+
+
+def test_cycles_are_broken_deterministically():
+    graph = {"a.py": ["b.py"], "b.py": ["a.py"], "c.py": []}
+    first = _plan(graph)
+    assert all(_plan(graph) == first for _ in range(5))
+    assert sorted(name for wave in first for name in wave) == ["a.py", "b.py", "c.py"]
+    # The planner appends cycle members in sorted order; the later one waits for the earlier.
+    wave_of = {name: i for i, wave in enumerate(first) for name in wave}
+    assert wave_of["b.py"] == wave_of["a.py"] + 1
+
+
+def test_parallel_generation_is_opt_in():
+    assert GenerationCoordinator.PARALLEL_GENERATION is False or \
+        generation_coordinator.os.getenv("AVA_PARALLEL_GENERATION") == "1"
+
+
+class _RecordingBus:
+    def __init__(self):
+        self.messages = []
+
+    def emit(self, event, *args):
+        if event == "log_message_received":
+            self.messages.append(args[-1])
+
+
+def test_files_in_a_parallel_wave_get_distinct_numbers():
+    async def update_session_context(context, files):
+        return context
+
+    async def generate_single_file(file_info, context, generated):
+        await asyncio.sleep(0.01)
+        return "x = 1\n"
+
+    coordinator = GenerationCoordinator.__new__(GenerationCoordinator)
+    coordinator.event_bus = _RecordingBus()
+    coordinator.context_manager = types.SimpleNamespace(update_session_context=update_session_context)
+    coordinator.llm_client = types.SimpleNamespace(get_model_for_role=lambda role: ("openai", "model"))
+    coordinator.provider_concurrency = {}
+    coordinator._provider_slots = {}
+    coordinator._generate_single_file = generate_single_file
+
+    specs = [Spec("a.py"), Spec("b.py"), Spec("c.py"), Spec("app.py", {"a.py", "b.py", "c.py"})]
+    plan = {"files": [{"filename": spec.filename} for spec in specs]}
+    generated = {}
+    asyncio.run(coordinator._generate_in_waves(plan, specs, None, generated))
+
+    numbers = [message.split()[2].rstrip(":") for message in coordinator.event_bus.messages
+               if message.startswith("Generating file ")]
+    assert numbers == ["1/4", "2/4", "3/4", "4/4"]
+    assert set(generated) == {"a.py", "b.py", "c.py", "app.py"}
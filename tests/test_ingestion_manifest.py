@@ -0,0 +1,105 @@
+# tests/test_ingestion_manifest.py
+import json
+import os
+
+from tests._loader import load_module
+
+ingestion_manifest = load_module("ava_ingestion_manifest", "src/ava/services/ingestion_manifest.py")
+IngestionManifest = ingestion_manifest.IngestionManifest
+ManifestEntry = ingestion_manifest.ManifestEntry
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def _entry_for(path, chunk_ids=()):
+    stat = path.stat()
+    return ManifestEntry(stat.st_size, stat.st_mtime, IngestionManifest.hash_content(path.read_text()),
+                         list(chunk_ids))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    source = _write(tmp_path / "pkg" / "main.py", "print('hi')\n")
+    manifest = IngestionManifest(tmp_path)
+    manifest.entries["pkg/main.py"] = _entry_for(source, ["pkg/main.py#abc"])
+    manifest.save()
+
+    loaded = IngestionManifest.load(tmp_path)
+    assert loaded.entries == manifest.entries
+
+
+def test_manifest_from_another_version_loads_empty(tmp_path):
+    manifest_path = tmp_path / IngestionManifest.DB_DIRECTORY_NAME / IngestionManifest.FILE_NAME
+    _write(manifest_path, json.dumps({"version": IngestionManifest.VERSION - 1,
+                                      "files": {"a.py": {"size": 1, "mtime": 1.0, "content_hash": "x"}}}))
+    assert IngestionManifest.load(tmp_path).is_empty()
+
+
+def test_unreadable_manifest_loads_empty(tmp_path):
+    _write(tmp_path / IngestionManifest.DB_DIRECTORY_NAME / IngestionManifest.FILE_NAME, "{not json")
+    assert IngestionManifest.load(tmp_path).is_empty()
+
+
+def test_find_changes_reports_new_modified_and_removed_files(tmp_path):
+    unchanged = _write(tmp_path / "unchanged.py", "a = 1\n")
+    modified = _write(tmp_path / "modified.py", "b = 1\n")
+    manifest = IngestionManifest(tmp_path)
+    manifest.entries["unchanged.py"] = _entry_for(unchanged)
+    manifest.entries["modified.py"] = _entry_for(modified)
+    manifest.entries["deleted.py"] = ManifestEntry(1, 1.0, "hash", ["deleted.py#1"])
+
+    _write(modified, "b = 2  # longer\n")
+    added = _write(tmp_path / "added.py", "c = 1\n")
+    candidates, removed = manifest.find_changes([unchanged, modified, added])
+
+    assert candidates == [modified, added]
+    assert list(removed) == ["deleted.py"]
+
+
+def test_find_changes_flags_a_touched_file_with_the_same_size(tmp_path):
+    source = _write(tmp_path / "a.py", "x = 1\n")
+    manifest = IngestionManifest(tmp_path)
+    manifest.entries["a.py"] = _entry_for(source)
+    stat = source.stat()
+    os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+
+    candidates, _ = manifest.find_changes([source])
+    assert candidates == [source]
+
+
+def test_find_path_changes_only_considers_the_given_paths(tmp_path):
+    kept = _write(tmp_path / "kept.py", "a = 1\n")
+    edited = _write(tmp_path / "edited.py", "b = 1\n")
+    manifest = IngestionManifest(tmp_path)
+    manifest.entries["kept.py"] = _entry_for(kept)
+    manifest.entries["edited.py"] = _entry_for(edited)
+    manifest.entries["gone.py"] = ManifestEntry(1, 1.0, "hash", ["gone.py#1"])
+
+    _write(edited, "b = 22\n")
+    candidates, removed = manifest.find_path_changes([edited, tmp_path / "gone.py", tmp_path / "never.py"])
+
+    assert candidates == [edited]
+    assert list(removed) == ["gone.py"]  # kept.py wasn't reported, so it isn't treated as deleted
+
+
+def test_paths_outside_the_project_are_ignored(tmp_path):
+    outside = _write(tmp_path / "elsewhere" / "x.py", "x = 1\n")
+    manifest = IngestionManifest(tmp_path / "project")
+    assert manifest.find_changes([outside]) == ([], {})
+    assert manifest.find_path_changes([outside]) == ([], {})
+
+
+def test_dirty_entries_are_candidates_until_cleared(tmp_path):
+    source = _write(tmp_path / "a.py", "x = 1\n")
+    manifest = IngestionManifest(tmp_path)
+    manifest.entries["a.py"] = _entry_for(source, ["a.py#1"])
+    manifest.entries["a.py"].dirty = True
+    manifest.save()
+
+    loaded = IngestionManifest.load(tmp_path)
+    assert loaded.entries["a.py"].dirty
+    assert loaded.find_changes([source]) == ([source], {})
+    assert loaded.find_path_changes([source]) == ([source], {})
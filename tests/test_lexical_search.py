@@ -0,0 +1,39 @@
+# tests/test_lexical_search.py
+from tests._loader import load_rag_server
+
+rag_server = load_rag_server()
+
+
+def _index():
+    index = rag_server.LexicalIndex()
+    index.add(["physics", "render", "input"],
+              ["class PlayerPhysics:\n    def apply_gravity(self): pass",
+               "def render_sprite(surface): surface.blit(sprite)",
+               "def read_input(keys): return keys.get('jump')"])
+    return index
+
+
+def test_identifiers_match_their_snake_and_camel_case_parts():
+    assert rag_server._tokenize_code("PlayerPhysics") == ["playerphysics", "player", "physics"]
+    assert _index().search("player_physics", 3)[0][0] == "physics"
+
+
+def test_search_ranks_by_bm25_and_respects_allowed_ids():
+    index = _index()
+    assert [doc_id for doc_id, _ in index.search("render sprite", 3)] == ["render"]
+    assert index.search("render sprite", 3, allowed_ids={"input"}) == []
+
+
+def test_removed_and_replaced_documents_are_not_found_by_old_terms():
+    index = _index()
+    index.remove(["render"])
+    index.add(["input"], ["def poll_gamepad(): pass"])
+    assert index.search("render", 3) == []
+    assert index.search("jump", 3) == []
+    assert index.search("gamepad", 3)[0][0] == "input"
+
+
+def test_reciprocal_rank_fusion_prefers_documents_ranked_well_in_both_lists():
+    fused = rag_server._reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == 1 / (rag_server.RRF_K + 2) + 1 / (rag_server.RRF_K + 1)
@@ -0,0 +1,63 @@
+# tests/test_query_cache.py
+from tests._loader import load_rag_server
+
+rag_server = load_rag_server()
+
+
+def _key(cache, collection="project", query="find player"):
+    return cache.key(collection, query, 5, True, None, "hybrid")
+
+
+def test_bumping_the_version_makes_old_entries_unreachable(monkeypatch):
+    monkeypatch.setitem(rag_server.app_state, "project_db_path", "/projects/a")
+    cache = rag_server.QueryResultCache(8)
+    cache.put(_key(cache), ["hit"])
+    assert cache.get(_key(cache)) == ["hit"]
+
+    cache.bump_version("project")
+    assert cache.get(_key(cache)) is None
+
+
+def test_versions_are_tracked_per_collection(monkeypatch):
+    monkeypatch.setitem(rag_server.app_state, "project_db_path", "/projects/a")
+    cache = rag_server.QueryResultCache(8)
+    cache.put(_key(cache, "global"), ["global hit"])
+    cache.bump_version("project")
+    assert cache.get(_key(cache, "global")) == ["global hit"]
+
+
+def test_each_project_database_gets_its_own_keys(monkeypatch):
+    cache = rag_server.QueryResultCache(8)
+    monkeypatch.setitem(rag_server.app_state, "project_db_path", "/projects/a")
+    cache.put(_key(cache), ["from a"])
+    monkeypatch.setitem(rag_server.app_state, "project_db_path", "/projects/b")
+    assert cache.get(_key(cache)) is None
+
+
+def test_query_parameters_are_part_of_the_key(monkeypatch):
+    monkeypatch.setitem(rag_server.app_state, "project_db_path", "/projects/a")
+    cache = rag_server.QueryResultCache(8)
+    base = cache.key("project", "q", 5, True, None, "vector")
+    assert len({base, cache.key("project", "q", 6, True, None, "vector"),
+                cache.key("project", "q", 5, False, None, "vector"),
+                cache.key("project", "q", 5, True, 100, "vector"),
+                cache.key("project", "q", 5, True, None, "hybrid"),
+                cache.key("project", "q", 5, True, None, "vector", '{"kind": "class"}')}) == 6
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    monkeypatch.setitem(rag_server.app_state, "project_db_path", "/projects/a")
+    cache = rag_server.QueryResultCache(2)
+    cache.put(_key(cache, query="a"), ["a"])
+    cache.put(_key(cache, query="b"), ["b"])
+    cache.get(_key(cache, query="a"))
+    cache.put(_key(cache, query="c"), ["c"])
+    assert cache.get(_key(cache, query="b")) is None
+    assert cache.get(_key(cache, query="a")) == ["a"]
+
+
+def test_zero_capacity_disables_caching(monkeypatch):
+    monkeypatch.setitem(rag_server.app_state, "project_db_path", "/projects/a")
+    cache = rag_server.QueryResultCache(0)
+    cache.put(_key(cache), ["hit"])
+    assert cache.get(_key(cache)) is None
@@ -0,0 +1,61 @@
+# tests/test_rag_manager_sync.py
+import asyncio
+
+import pytest
+
+# RAGManager is a Qt object; these tests run where the GUI dependencies are installed.
+rag_manager = pytest.importorskip("src.ava.services.rag_manager")
+
+
+class _EventBus:
+    def emit(self, name, *args):
+        pass
+
+
+class _FlakyRAGService:
+    """Stands in for RAGService; /add fails on the given call numbers."""
+
+    def __init__(self, failing_calls=()):
+        self.failing_calls = set(failing_calls)
+        self.add_calls = 0
+        self.uploaded_ids = []
+        self.deleted_ids = []
+
+    async def add(self, batch, target_collection="project"):
+        self.add_calls += 1
+        if self.add_calls in self.failing_calls:
+            return False, "server error"
+        self.uploaded_ids.extend(chunk["id"] for chunk in batch)
+        return True, "ok"
+
+    async def delete(self, ids, target_collection="project", where=None):
+        self.deleted_ids.extend(ids)
+        return True, "ok"
+
+    async def close(self):
+        pass
+
+
+def test_chunks_written_before_a_failed_upload_are_removed_with_their_file(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.py").write_text(f"def {name}():\n    return 1\n", encoding="utf-8")
+    manager = rag_manager.RAGManager(_EventBus(), tmp_path)
+    manager.INGEST_BATCH_SIZE = 1
+    manager.rag_service = _FlakyRAGService(failing_calls={2})
+
+    asyncio.run(manager.sync_project_knowledge(tmp_path))
+
+    manifest = rag_manager.IngestionManifest.load(tmp_path)
+    assert all(entry.dirty for entry in manifest.entries.values())
+    written_before_failure = list(manager.rag_service.uploaded_ids)
+    assert len(written_before_failure) == 1
+    written_file = written_before_failure[0].split("#")[0]
+
+    (tmp_path / written_file).unlink()
+    manager.rag_service = _FlakyRAGService()
+    asyncio.run(manager.sync_project_knowledge(tmp_path))
+
+    assert written_before_failure[0] in manager.rag_service.deleted_ids
+    manifest = rag_manager.IngestionManifest.load(tmp_path)
+    assert written_file not in manifest.entries
+    assert not any(entry.dirty for entry in manifest.entries.values())
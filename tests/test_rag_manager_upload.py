@@ -0,0 +1,105 @@
+# tests/test_rag_manager_upload.py
+import asyncio
+
+import pytest
+
+# RAGManager is a Qt object; these tests run where the GUI dependencies are installed.
+rag_manager = pytest.importorskip("src.ava.services.rag_manager")
+
+
+class _RecordingEventBus:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, name, *args):
+        self.events.append((name, args))
+
+    def progress(self):
+        return [args[0] for name, args in self.events if name == "rag_ingestion_progress"]
+
+
+class _SlowRAGService:
+    """Stands in for RAGService.add; yields to the loop a few times per batch like a real request."""
+
+    def __init__(self, produced=None):
+        self.batches = []
+        self.produced_at_call = []
+        self._produced = produced
+
+    async def add(self, batch, target_collection="project"):
+        if self._produced is not None:
+            self.produced_at_call.append(self._produced[0])
+        for _ in range(5):
+            await asyncio.sleep(0)
+        self.batches.append(list(batch))
+        return True, "ok"
+
+    async def close(self):
+        pass
+
+
+def _manager(tmp_path, rag_service):
+    event_bus = _RecordingEventBus()
+    manager = rag_manager.RAGManager(event_bus, tmp_path)
+    manager.rag_service = rag_service
+    return manager, event_bus
+
+
+def _chunks(count):
+    return [{"id": f"c{i}", "content": f"chunk {i}", "metadata": {"full_path": f"/p/file{i // 10}.py"}}
+            for i in range(count)]
+
+
+def test_chunks_are_uploaded_in_fixed_size_batches_with_progress_per_batch(tmp_path):
+    service = _SlowRAGService()
+    manager, event_bus = _manager(tmp_path, service)
+    chunks = _chunks(2 * manager.INGEST_BATCH_SIZE + 7)
+
+    success, _ = asyncio.run(manager._upload_chunk_batches(manager._batch_chunk_list(chunks), "project",
+                                                           total_files=27))
+
+    assert success
+    assert [len(batch) for batch in service.batches] == [manager.INGEST_BATCH_SIZE, manager.INGEST_BATCH_SIZE, 7]
+    assert [chunk for batch in service.batches for chunk in batch] == chunks
+    progress = event_bus.progress()
+    assert [event["batch"] for event in progress] == [1, 2, 3]
+    assert [event["chunks_written"] for event in progress] == [128, 256, 263]
+    assert progress[-1]["total_files"] == 27
+
+
+def test_chunking_never_runs_more_than_the_queue_depth_ahead_of_uploads(tmp_path):
+    produced = [0]
+    service = _SlowRAGService(produced)
+    manager, _ = _manager(tmp_path, service)
+
+    async def batches():
+        for index in range(20):
+            produced[0] += 1
+            yield [{"id": f"c{index}", "content": "x", "metadata": {}}], index + 1
+
+    success, _ = asyncio.run(manager._upload_chunk_batches(batches(), "project", total_files=20))
+
+    assert success
+    assert len(service.batches) == 20
+    # The queue holds INGEST_QUEUE_DEPTH batches, and the producer may hold one more waiting to be queued.
+    assert max(produced_count - calls for calls, produced_count in enumerate(service.produced_at_call, 1)) \
+        <= manager.INGEST_QUEUE_DEPTH + 1
+
+
+def test_a_failed_batch_stops_the_upload(tmp_path):
+    class _FailingService(_SlowRAGService):
+        async def add(self, batch, target_collection="project"):
+            await super().add(batch, target_collection)
+            return (False, "server error") if len(self.batches) == 2 else (True, "ok")
+
+    service = _FailingService()
+    manager, event_bus = _manager(tmp_path, service)
+    chunks = _chunks(4 * manager.INGEST_BATCH_SIZE)
+
+    success, message = asyncio.run(manager._upload_chunk_batches(manager._batch_chunk_list(chunks), "project",
+                                                                 total_files=4))
+
+    assert not success
+    assert "Batch 2 failed" in message
+    assert len(service.batches) == 2
+    assert len(event_bus.progress()) == 1
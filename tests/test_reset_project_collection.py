@@ -0,0 +1,49 @@
+# tests/test_reset_project_collection.py
+import chromadb
+
+from tests._loader import load_rag_server
+
+rag_server = load_rag_server()
+
+
+class _ClientQueriedMidReset:
+    """A Chroma client that lets a query cache results and rebuild the lexical index mid-reset."""
+
+    def __init__(self, path: str):
+        self._client = chromadb.PersistentClient(path=path)
+        self.stale_cache_key = None
+
+    def delete_collection(self, name: str):
+        state = rag_server.app_state
+        self.stale_cache_key = state["query_cache"].key("project", "query", 5, True, None, "hybrid")
+        state["query_cache"].put(self.stale_cache_key, ["pre-reset hit"])
+        state["lexical_indexes"][rag_server._collection_key("project")] = "pre-reset lexical index"
+        self._client.delete_collection(name)
+
+    def create_collection(self, name: str):
+        return self._client.create_collection(name)
+
+    def get_or_create_collection(self, name: str):
+        return self._client.get_or_create_collection(name)
+
+
+def test_reset_invalidates_after_recreating_the_collection(tmp_path, monkeypatch):
+    client = _ClientQueriedMidReset(str(tmp_path / "chroma"))
+    collection = client.get_or_create_collection(rag_server.PROJECT_COLLECTION_NAME)
+    collection.add(ids=["a"], embeddings=[[0.1, 0.2]], documents=["old"])
+    state = rag_server.app_state
+    monkeypatch.setitem(state, "chroma_client_project", client)
+    monkeypatch.setitem(state, "project_collection", collection)
+    monkeypatch.setitem(state, "project_db_path", str(tmp_path / "chroma"))
+    monkeypatch.setitem(state, "project_clients", rag_server.ProjectClientCache(2, 3600))
+    monkeypatch.setitem(state, "query_cache", rag_server.QueryResultCache(16))
+    monkeypatch.setitem(state, "lexical_indexes", {})
+    monkeypatch.setitem(state, "compact_indexes", {})
+
+    assert rag_server.reset_project_collection()["status"] == "success"
+
+    assert state["project_collection"].count() == 0
+    assert rag_server._collection_key("project") not in state["lexical_indexes"]
+    fresh_key = state["query_cache"].key("project", "query", 5, True, None, "hybrid")
+    assert fresh_key != client.stale_cache_key
+    assert state["query_cache"].get(fresh_key) is None
@@ -0,0 +1,55 @@
+# tests/test_response_cache.py
+from tests._loader import load_llm_server
+
+llm_server = load_llm_server()
+
+
+def _request(**overrides):
+    fields = {"provider": "openai", "model": "gpt", "prompt": "Write a function.", "temperature": 0.1}
+    return llm_server.StreamChatRequest(**{**fields, **overrides})
+
+
+def _cache(tmp_path, max_bytes=1 << 20):
+    return llm_server.ResponseCache(tmp_path / "responses.sqlite3", max_bytes, max_temperature=0.3)
+
+
+def test_only_low_temperature_requests_that_allow_caching_are_cached(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.accepts(_request())
+    assert cache.accepts(_request(temperature=0.3))
+    assert not cache.accepts(_request(temperature=0.7))
+    assert not cache.accepts(_request(use_cache=False))
+
+
+def test_key_ignores_line_endings_and_trailing_whitespace(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.key_for(_request(prompt="a\nb")) == cache.key_for(_request(prompt="a  \r\nb\n"))
+    assert cache.key_for(_request(prompt="a\nb")) != cache.key_for(_request(prompt="a\nc"))
+
+
+def test_key_covers_model_temperature_history_and_image(tmp_path):
+    cache = _cache(tmp_path)
+    base = cache.key_for(_request())
+    assert base != cache.key_for(_request(model="other"))
+    assert base != cache.key_for(_request(temperature=0.2))
+    assert base != cache.key_for(_request(history=[{"role": "user", "text": "earlier"}]))
+    assert base != cache.key_for(_request(image_b64="aGVsbG8=", media_type="image/png"))
+
+
+def test_hits_replay_the_stored_chunks_and_survive_a_restart(tmp_path):
+    cache = _cache(tmp_path)
+    key = cache.key_for(_request())
+    assert cache.get(key) is None
+    cache.put(key, ["def ", "f(): ", "pass"])
+    assert _cache(tmp_path).get(key) == ["def ", "f(): ", "pass"]
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(tmp_path):
+    cache = _cache(tmp_path, max_bytes=60)
+    cache.put("a", ["x" * 20])
+    cache.put("b", ["y" * 20])
+    cache.get("a")
+    cache.put("c", ["z" * 20])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["x" * 20]
+    assert cache.get("c") == ["z" * 20]
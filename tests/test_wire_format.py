@@ -0,0 +1,54 @@
+# tests/test_wire_format.py
+import json
+
+import msgpack
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from tests._loader import load_module, load_rag_server
+
+rag_server = load_rag_server()
+rag_service = load_module("ava_rag_service", "src/ava/services/rag_service.py")
+
+
+def test_numpy_matrix_round_trips_through_msgpack():
+    matrix = np.random.default_rng(0).standard_normal((3, 8)).astype(np.float32)
+    packed = msgpack.packb(rag_service.pack_float32(matrix), use_bin_type=True)
+    unpacked = rag_server._unpack_matrix(msgpack.unpackb(packed, raw=False), 8)
+    np.testing.assert_array_equal(unpacked, matrix)
+
+
+def test_nested_lists_pack_like_numpy():
+    rows = [[0.5, -1.25, 3.0], [1e-3, 2.0, -0.0]]
+    assert rag_service.pack_float32(rows) == rag_service.pack_float32(np.asarray(rows))
+
+
+def test_add_request_parses_the_same_from_msgpack_and_json():
+    embeddings = np.arange(6, dtype=np.float32).reshape(2, 3)
+    documents = [{"id": "a", "content": "alpha", "metadata": {"source": "a.py"}},
+                 {"id": "b", "content": "beta", "metadata": {"source": "b.py"}}]
+    msgpack_body = msgpack.packb({"documents": documents, "target_collection": "project",
+                                  "embeddings": rag_service.pack_float32(embeddings)}, use_bin_type=True)
+    json_body = json.dumps({"documents": documents, "target_collection": "project",
+                            "embeddings": embeddings.tolist()}).encode("utf-8")
+
+    from_msgpack = rag_server._parse_payload(msgpack_body, rag_service.MSGPACK_MEDIA_TYPE, rag_server.AddRequest)
+    from_json = rag_server._parse_payload(json_body, "application/json", rag_server.AddRequest)
+
+    assert from_msgpack.documents == from_json.documents
+    np.testing.assert_array_equal(rag_server._unpack_matrix(from_msgpack.embeddings, 3),
+                                  rag_server._unpack_matrix(from_json.embeddings, 3))
+
+
+def test_unsupported_dtype_is_rejected():
+    packed = {**rag_service.pack_float32(np.ones((1, 2))), "dtype": "float64"}
+    with pytest.raises(HTTPException) as error:
+        rag_server._unpack_matrix(packed, 2)
+    assert error.value.status_code == 400
+
+
+def test_malformed_msgpack_body_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        rag_server._parse_payload(b"\xc1", "application/msgpack", rag_server.AddRequest)
+    assert error.value.status_code == 400